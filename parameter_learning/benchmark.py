@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import importlib.util
+import torch
+import numpy as np
+
+from network import ResnetYarn, parse_backbone
+from test import OnnxModel
+
+# Backbones of ResnetYarn, see network.get_resnet_model
+BACKBONES = [18, 34, 50, 101]
+
+# (height, width) of the training crop and of the smallest render the training crop is taken from
+INPUT_SIZES = ['1200x584', '2000x612']
+
+def parse_size(value):
+    """Parses an input size 'HEIGHTxWIDTH' to (height, width)."""
+    height, width = value.lower().split('x')
+    return int(height), int(width)
+
+def available_backends():
+    """Returns the backends that can run on this host: eager, torchscript, int8 and onnx if onnxruntime is installed."""
+    backends = ['eager', 'torchscript', 'int8']
+    if importlib.util.find_spec('onnxruntime') is not None:
+        backends.append('onnx')
+    return backends
+
+def build_backend(model, backend, example, threads, tmp_dir):
+    """
+    Returns a callable running the model with the given backend.
+
+    Args:
+        model (torch.nn.Module): The eager model in eval mode on the CPU.
+        backend (str): 'eager', 'torchscript', 'int8' or 'onnx'.
+        example (torch.Tensor): Example batch with the input size to benchmark.
+        threads (int): Intra-op threads of an onnx session.
+        tmp_dir (str): Directory for the exported onnx file.
+    """
+    if backend == 'eager':
+        return model
+    if backend == 'torchscript':
+        with torch.no_grad():
+            return torch.jit.trace(model, example)
+    if backend == 'int8':
+        from quantize_model import quantize
+        with torch.no_grad():
+            return torch.jit.trace(quantize(model, [example]), example)
+    if backend == 'onnx':
+        from export_model import export_onnx
+        onnx_file = os.path.join(tmp_dir, f'model_{example.shape[2]}x{example.shape[3]}.onnx')
+        if not os.path.isfile(onnx_file):
+            export_onnx(model, onnx_file, example)
+        return OnnxModel(onnx_file, threads)
+    raise ValueError(f"Invalid backend '{backend}'.")
+
+def measure(forward, xs, warmup=2, repetitions=10):
+    """
+    Times forward passes of one batch.
+
+    Returns:
+        np.ndarray: Seconds of each timed forward pass.
+    """
+    latencies = np.zeros(repetitions)
+    with torch.no_grad():
+        for _ in range(warmup):
+            forward(xs)
+        for i in range(repetitions):
+            time_start = time.perf_counter()
+            forward(xs)
+            latencies[i] = time.perf_counter() - time_start
+    return latencies
+
+def run_suite(backbones, backends, batch_sizes, input_sizes, thread_counts, warmup=2, repetitions=10):
+    """
+    Benchmarks every combination of backbone, backend, thread count, input size and batch size.
+
+    Args:
+        backbones (list): Backbone types, e.g. [18, 34].
+        backends (list): Backends, see available_backends.
+        batch_sizes (list): Images per batch.
+        input_sizes (list): (height, width) of the images.
+        thread_counts (list): Torch (or onnx intra-op) thread counts.
+        warmup (int): Untimed forward passes per combination. Default is 2.
+        repetitions (int): Timed forward passes per combination. Default is 10.
+
+    Returns:
+        tuple: One dict per combination with the configuration, p50/p99/mean latency in ms and images per second,
+               and the backends that failed to build, with the error. A failed backend is skipped for the rest of the suite.
+    """
+    results = []
+    unavailable = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backbone in backbones:
+            model = ResnetYarn(backbone, 1, -1, pretrained=False)
+            model.eval()
+            backbone_dir = os.path.join(tmp_dir, str(backbone))
+            os.makedirs(backbone_dir)
+
+            for backend in backends:
+                for threads in thread_counts:
+                    torch.set_num_threads(threads)
+                    for height, width in input_sizes:
+                        if backend in unavailable:
+                            break
+                        example = torch.rand((1, 3, width, height))
+                        try:
+                            forward = build_backend(model, backend, example, threads, backbone_dir)
+                        except Exception as e:
+                            print(f'resnet{backbone} {backend}: unavailable, skipped for the rest of the suite ({e})')
+                            unavailable[backend] = str(e)
+                            break
+
+                        for batch_size in batch_sizes:
+                            xs = torch.rand((batch_size, 3, width, height))
+                            latencies = measure(forward, xs, warmup, repetitions)
+                            result = {
+                                'backbone': backbone, 'backend': backend, 'threads': threads,
+                                'input_size': f'{height}x{width}', 'batch_size': batch_size,
+                                'latency_p50_ms': float(np.percentile(latencies, 50) * 1000.0),
+                                'latency_p99_ms': float(np.percentile(latencies, 99) * 1000.0),
+                                'latency_mean_ms': float(latencies.mean() * 1000.0),
+                                'images_per_s': float(batch_size / latencies.mean())
+                            }
+                            results.append(result)
+                            print(f"resnet{backbone:<4} {backend:<12} threads {threads:3d} {result['input_size']:>9} batch {batch_size:3d}: "
+                                  f"p50 {result['latency_p50_ms']:9.1f} ms, p99 {result['latency_p99_ms']:9.1f} ms, {result['images_per_s']:8.2f} images/s")
+                            sys.stdout.flush()
+    return results, unavailable
+
+def environment():
+    """Describes the host and library versions, stored with the results to compare reports."""
+    return {
+        'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+        'python': platform.python_version(), 'torch': torch.__version__, 'quantized_engine': torch.backends.quantized.engine
+    }
+
+def main():
+    """
+    Example:
+        python benchmark.py --output benchmark_report.json
+        python benchmark.py --backbones 18 34 --backends eager int8 --batch-sizes 1 8 --threads 4 --output report.json
+    """
+    parser = argparse.ArgumentParser(description="Inference latency and throughput of the ResnetYarn backbones on the CPU.")
+    parser.add_argument("--backbones", type=parse_backbone, nargs='+', default=BACKBONES)
+    parser.add_argument("--backends", nargs='+', default=None, help="default: every available backend")
+    parser.add_argument("--batch-sizes", type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--input-sizes", type=parse_size, nargs='+', default=[parse_size(size) for size in INPUT_SIZES], help="HEIGHTxWIDTH")
+    parser.add_argument("--threads", type=int, nargs='+', default=sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1}))
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--output", default=None, help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    backends = args.backends or available_backends()
+    results, unavailable = run_suite(args.backbones, backends, args.batch_sizes, args.input_sizes, args.threads, args.warmup, args.repetitions)
+
+    if args.output:
+        report = {'environment': environment(), 'warmup': args.warmup, 'repetitions': args.repetitions, 'results': results,
+                  'unavailable_backends': unavailable}
+        with open(args.output, 'w') as json_file:
+            json.dump(report, json_file, indent=4, sort_keys=True)
+        print(f'report written to {args.output}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import glob
+import json
+import time
+import argparse
+import torch
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from dataloader import to_float_batch
+from network import parse_backbone
+from test import MODEL_PARAMS, MULTITASK_PARAM_NAMES, TRAINING_SHAPE, ModelRegistry, decode_images, yarn_parameters
+
+def model_cost(model):
+    """Number of parameters of a torch model, used to start the largest models first; 0 for other backends."""
+    if isinstance(model, torch.nn.Module):
+        return sum(param.numel() for param in model.parameters())
+    return 0
+
+class ConcurrentExecutor:
+    """
+    Runs the models of a registry concurrently on the CPU, each with its own share of the cores.
+
+    inter_op models run at the same time on a thread pool and every pool thread limits its
+    torch intra-op parallelism to intra_op threads (onnx sessions get it from the registry, see
+    ModelRegistry's intra_op_threads), so the models do not compete for one thread pool.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        inter_op (int): Number of models run at the same time. Default is 3.
+        intra_op (int, optional): Threads per model. Default is the CPU count divided by inter_op.
+    """
+
+    def __init__(self, registry, inter_op=3, intra_op=None):
+        self.registry = registry
+        self.inter_op = inter_op
+        self.intra_op = intra_op or max(1, (os.cpu_count() or 1) // inter_op)
+        self.pool = ThreadPoolExecutor(inter_op, initializer=torch.set_num_threads, initargs=(self.intra_op,))
+        # Largest models first, so that the small ones fill the gaps at the end
+        self.order = sorted(registry.models, key=lambda name: -model_cost(registry.models[name]))
+
+    def _run(self, model, xs):
+        with torch.no_grad():
+            return model(xs)
+
+    def predict(self, images):
+        """
+        Predicts all parameters for a batch of images, running the models concurrently.
+
+        Args:
+            images (torch.Tensor): Float batch of shape (N, 3, width, height) with values in [0, 1].
+
+        Returns:
+            dict: Parameter name to its raw network outputs of shape (N, num_params), as ModelRegistry.predict;
+                  the heads of a multi-task model are renamed with MULTITASK_PARAM_NAMES.
+        """
+        xs = torch.as_tensor(images, dtype=torch.float, device=self.registry.device)
+        futures = {name: self.pool.submit(self._run, self.registry.models[name], xs) for name in self.order}
+
+        predictions = {}
+        for name, future in futures.items():
+            outputs = future.result()
+            if isinstance(outputs, dict):
+                predictions.update({MULTITASK_PARAM_NAMES.get(head, head): output.cpu().numpy() for head, output in outputs.items()})
+            else:
+                predictions[name] = outputs.cpu().numpy()
+        return predictions
+
+    def predict_params(self, images):
+        """
+        Predicts the yarn parameters of every image of a batch.
+
+        The dependent post-processing (argmax for thickness and numplies, ellipse divided by
+        plyradius) runs after all models have finished.
+
+        Returns:
+            list: Yarn parameters per image, see yarn_parameters.
+        """
+        predictions = self.predict(images)
+        return [yarn_parameters(predictions, i) for i in range(len(images))]
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+def thread_splits(num_threads, num_models):
+    """
+    Returns the (inter_op, intra_op) splits of num_threads worth benchmarking.
+
+    Args:
+        num_threads (int): Number of cores to use.
+        num_models (int): Number of models of the registry, the largest sensible inter_op.
+
+    Returns:
+        list: (inter_op, intra_op) tuples with inter_op * intra_op <= num_threads.
+    """
+    splits = []
+    for inter_op in range(1, min(num_threads, num_models) + 1):
+        split = (inter_op, max(1, num_threads // inter_op))
+        if split not in splits:
+            splits.append(split)
+    return splits
+
+def benchmark(registry, num_threads, batch_size=1, repetitions=5, shape=(584, 1200), splits=None):
+    """
+    Measures the throughput of every thread split and returns them sorted, best first.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        num_threads (int): Number of cores to use.
+        batch_size (int): Images per batch. Default is 1.
+        repetitions (int): Timed batches per split, after one warm-up batch. Default is 5.
+        shape (tuple): (width, height) of the images. Default is the training crop.
+        splits (list, optional): (inter_op, intra_op) tuples to time. Default is thread_splits(num_threads, ...).
+
+    Returns:
+        list: Dicts with inter_op, intra_op, latency_ms (per batch) and images_per_s.
+    """
+    xs = torch.rand((batch_size, 3) + tuple(shape))
+    results = []
+    for inter_op, intra_op in splits or thread_splits(num_threads, len(registry.models)):
+        executor = ConcurrentExecutor(registry, inter_op, intra_op)
+        executor.predict(xs)
+        latencies = []
+        for _ in range(repetitions):
+            time_start = time.perf_counter()
+            executor.predict(xs)
+            latencies.append(time.perf_counter() - time_start)
+        executor.shutdown()
+
+        latency = float(np.median(latencies))
+        results.append({'inter_op': inter_op, 'intra_op': intra_op, 'latency_ms': latency * 1000.0, 'images_per_s': batch_size / latency})
+        print(f'inter_op {inter_op:2d} x intra_op {intra_op:2d}: {latency * 1000.0:9.1f} ms per batch, {batch_size / latency:8.2f} images/s')
+
+    return sorted(results, key=lambda result: -result['images_per_s'])
+
+def main():
+    """
+    Example:
+        python concurrent_inference.py --benchmark --threads 16
+        python concurrent_inference.py --dir-images ../data/Test_yarns/ --inter-op 3 --intra-op 4
+    """
+    parser = argparse.ArgumentParser(description="Run the parameter models concurrently with partitioned CPU threads.")
+    parser.add_argument("--dir-images", default="../data/Test_yarns/")
+    parser.add_argument("--multitask", default=None, help="multi-task checkpoint to use instead of the nine single-parameter models")
+    parser.add_argument("--resnet", type=parse_backbone, default=34, help="ResNet type (or mobilenet_v3_small) of the multi-task checkpoint")
+    parser.add_argument("--backend", default="torch", choices=["torch", "torchscript", "onnx", "int8"])
+    parser.add_argument("--inter-op", type=int, default=3, help="models run at the same time")
+    parser.add_argument("--intra-op", type=int, default=None, help="threads per model, default: cpu count / inter-op")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--benchmark", action="store_true", help="time every split of --threads and report the best one")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="cores used by --benchmark")
+    parser.add_argument("--report", default=None, help="write the benchmark results to this JSON file")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        # onnx sessions fix their threads when they are created, so a registry is built per split
+        if args.backend == 'onnx':
+            results = []
+            for inter_op, intra_op in thread_splits(args.threads, 1 if args.multitask else len(MODEL_PARAMS)):
+                registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend, intra_op_threads=intra_op)
+                results += benchmark(registry, args.threads, args.batch_size, splits=[(inter_op, intra_op)])
+            results.sort(key=lambda result: -result['images_per_s'])
+        else:
+            registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend)
+            results = benchmark(registry, args.threads, args.batch_size)
+
+        best = results[0]
+        print(f"best split: --inter-op {best['inter_op']} --intra-op {best['intra_op']} ({best['images_per_s']:.2f} images/s)")
+        if args.report:
+            with open(args.report, 'w') as json_file:
+                json.dump({'threads': args.threads, 'batch_size': args.batch_size, 'backend': args.backend, 'results': results}, json_file, indent=4)
+        return
+
+    # the onnx sessions get the same share of the cores as the torch threads of the executor
+    intra_op = args.intra_op or max(1, (os.cpu_count() or 1) // args.inter_op)
+    registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend, intra_op_threads=intra_op)
+    executor = ConcurrentExecutor(registry, args.inter_op, intra_op)
+
+    fnames_png = sorted(glob.glob(os.path.join(args.dir_images, '*.png')))
+    time_start = time.time()
+    for first in range(0, len(fnames_png), args.batch_size):
+        batch_files = fnames_png[first:first + args.batch_size]
+        images = torch.from_numpy(np.stack(decode_images(batch_files, TRAINING_SHAPE)))
+        for image_file, params in zip(batch_files, executor.predict_params(to_float_batch(images, registry.device))):
+            print(image_file)
+            print(json.dumps(params, indent=4))
+    time_predict = time.time() - time_start
+    executor.shutdown()
+
+    print(f'{len(fnames_png)} images in {time_predict:.2f} s, {len(fnames_png) / max(time_predict, 1e-9):.2f} images/s')
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
+import os
 import glob
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import imageio
+import torch
 from torch.utils import data
-from utils import read_file
+from utils import read_file, read_manifest
+
+# Label fields of every parameter configuration, name to the key path in the sample JSON
+PARAM_CONFIGS = {
+    'alphaply': {'alpha_ply': ['fiber', 'curve_params', 'dif_z']},
+    'num_plies': {'num_plies': ['fiber', 'placement_params', 'num_points']},
+    'flyaways': {
+        'amount': ['flyaways', 'mapping_parameters', 'amount'],
+        'loop_prob': ['flyaways', 'mapping_parameters', 'loop_prob'],
+        'hair_length_mean': ['flyaways', 'mapping_parameters', 'hair_length_mean'],
+        'hair_angle': ['flyaways', 'mapping_parameters', 'hair_angle'],
+        'hair_squeeze': ['flyaways', 'mapping_parameters', 'fuzzyness'],
+        'loop_length_mean': ['flyaways', 'mapping_parameters', 'loop_length_mean'],
+        'loop_distance_mean': ['flyaways', 'mapping_parameters', 'loop_distance_mean'],
+        'loop_distance_std': ['flyaways', 'mapping_parameters', 'loop_distance_std'],
+        'jitter_xy': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'jitter_xy'],
+        'migration': ['fiber', 'fiber_params', 'yarn', 'curve_params', 'migration']
+    },
+    'thickness': {'thickness_y': ['thickness', 'fiber_thickness_y']},
+    'numfibers': {'num_fibers': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'num_points']},
+    'plyradius': {'ply_radius': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'radius']},
+    'alpha': {'alpha': ['fiber', 'fiber_params', 'yarn', 'curve_params', 'dif_z']},
+    'plyradiusy': {'ellipse': ['fiber', 'ellipse']},
+    'yarnradius': {'yarn_radius': ['fiber', 'placement_params', 'radius']}
+}
 
 def initialize_param_storage(num_files, param_config):
     """
@@ -32,12 +61,22 @@ def read_files(folder_name):
     """
     Read and sort PNG and JSON files from the given folder.
 
+    If the folder has a manifest, only the samples it records as done are used,
+    otherwise the folder is globbed.
+
     Args:
         folder_name (str): The path to the folder containing PNG and JSON files.
 
     Returns:
         tuple: A tuple containing two lists: sorted PNG filenames and sorted JSON filenames.
     """
+    records = read_manifest(folder_name)
+    if records:
+        done = [records[i] for i in sorted(records) if records[i]['status'] == 'done']
+        fnames_png = [f"{folder_name}/{record['render']}" for record in done]
+        fnames_json = [f"{folder_name}/{record['json']}" for record in done]
+        return fnames_png, fnames_json
+
     fnames_png = sorted(glob.glob(f"{folder_name}/*.png"))
     fnames_json = sorted(glob.glob(f"{folder_name}/*.json"))
     return fnames_png, fnames_json
@@ -82,100 +121,447 @@ def process_params(yarn, param_config, param_arrays, index):
                 ply_radius = yarn['fiber']['fiber_params']['yarn']['placement_params']['radius']
                 param_arrays[param][index] *= ply_radius
 
-def read_png_yarn_folder(folder_name, param_config):
+def image_cache_files(folder_name, cache_dir=None):
+    """
+    Return the paths of the image cache of a dataset folder.
+
+    Args:
+        folder_name (str): The path to the folder containing the PNG files.
+        cache_dir (str, optional): Directory for the cache. Defaults to '<folder_name>/cache'.
+
+    Returns:
+        tuple: Path of the uint8 .npy image array and path of its JSON description.
+    """
+    cache_dir = cache_dir or os.path.join(folder_name, 'cache')
+    return os.path.join(cache_dir, 'images_uint8.npy'), os.path.join(cache_dir, 'images_uint8.json')
+
+def describe_files(fnames):
+    """
+    Describe files by name, size and modification time, to detect when a cache is outdated.
+
+    Args:
+        fnames (list): File paths.
+
+    Returns:
+        list: One [basename, size, mtime_ns] entry per file.
+    """
+    description = []
+    for fn in fnames:
+        stat = os.stat(fn)
+        description.append([os.path.basename(fn), stat.st_size, stat.st_mtime_ns])
+    return description
+
+def map_with_progress(fn, items, num_workers=None, description='Processing', interval=10.0):
+    """
+    Apply a function to every item in a thread pool, reporting progress and throughput.
+
+    Args:
+        fn (callable): Function called with one item.
+        items (list): The items.
+        num_workers (int, optional): Number of threads. Defaults to the number of CPUs.
+        description (str): Prefix of the progress lines. Default is 'Processing'.
+        interval (float): Seconds between two progress lines. Default is 10.
+
+    Returns:
+        list: The results, in the order of the items.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    results = [None] * len(items)
+    time_start = time.perf_counter()
+    time_report = time_start
+
+    with ThreadPoolExecutor(num_workers) as executor:
+        for i, result in enumerate(executor.map(fn, items)):
+            results[i] = result
+            now = time.perf_counter()
+            if now - time_report >= interval or i + 1 == len(items):
+                time_report = now
+                rate = (i + 1) / max(now - time_start, 1e-9)
+                print(f'{description} {i + 1} / {len(items)}: {rate:.1f} files/s, {now - time_start:.1f} s elapsed, '
+                      f'{(len(items) - i - 1) / rate:.0f} s left ({num_workers} threads)')
+    return results
+
+def build_image_cache(fnames_png, cache_file, meta_file, num_workers=None):
+    """
+    Decode the PNG files once into a contiguous uint8 array on disk.
+
+    The images are stored as (num_images, 3, width, height), the layout YarnDataset
+    feeds to the network, so that a crop is a plain slice of the memory map.
+
+    Args:
+        fnames_png (list): Sorted PNG file paths, all of the same size.
+        cache_file (str): Path of the .npy file to write.
+        meta_file (str): Path of the JSON file describing the cached PNG files.
+        num_workers (int, optional): Number of decoding threads. Defaults to the number of CPUs.
+    """
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    height, width = imageio.imread(fnames_png[0]).shape[:2]
+    tmp_file = cache_file + '.tmp'
+    ims = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.uint8, shape=(len(fnames_png), 3, width, height))
+
+    # every thread writes its image straight into the memory map, the PNG decoder releases the GIL
+    def cache_image(i):
+        im = imageio.imread(fnames_png[i])
+        if im.shape[:2] != (height, width):
+            raise ValueError(f"Image '{fnames_png[i]}' has size {im.shape[:2]}, expected {(height, width)}.")
+        ims[i] = np.transpose(im[:, :, :3], (2, 1, 0))
+
+    map_with_progress(cache_image, range(len(fnames_png)), num_workers, 'Caching image')
+
+    ims.flush()
+    del ims
+    os.replace(tmp_file, cache_file)
+    with open(meta_file, 'w') as json_file:
+        json.dump({'files': describe_files(fnames_png)}, json_file)
+
+def load_image_cache(fnames_png, cache_dir, num_workers=None):
+    """
+    Return the path of an up-to-date uint8 image cache for the given PNG files, building it if needed.
+
+    Args:
+        fnames_png (list): Sorted PNG file paths.
+        cache_dir (str): Directory for the cache, None for '<folder>/cache'.
+        num_workers (int, optional): Number of decoding threads when the cache is built. Defaults to the number of CPUs.
+
+    Returns:
+        str: Path of the .npy file, to be opened with np.load(..., mmap_mode='r').
+    """
+    cache_file, meta_file = image_cache_files(os.path.dirname(fnames_png[0]), cache_dir)
+    description = describe_files(fnames_png)
+    if os.path.isfile(cache_file) and os.path.isfile(meta_file):
+        if read_file(meta_file)['files'] == description:
+            return cache_file
+    build_image_cache(fnames_png, cache_file, meta_file, num_workers)
+    return cache_file
+
+def label_table_files(folder_name, cache_dir=None):
+    """
+    Return the paths of the label table of a dataset folder.
+
+    Args:
+        folder_name (str): The path to the folder containing the JSON files.
+        cache_dir (str, optional): Directory for the table. Defaults to '<folder_name>/cache'.
+
+    Returns:
+        tuple: Path of the .npz label table and path of its JSON description.
+    """
+    cache_dir = cache_dir or os.path.join(folder_name, 'cache')
+    return os.path.join(cache_dir, 'labels.npz'), os.path.join(cache_dir, 'labels.json')
+
+def extract_label_columns(yarns, param_configs=PARAM_CONFIGS):
+    """
+    Extract the label columns of several parameter configurations from parsed JSON files.
+
+    The columns are the arrays of process_params (so the thickness and ply classes are one-hot
+    columns) plus the raw value of every other field, e.g. 'thickness_y' and 'num_plies'.
+
+    Args:
+        yarns (list): Parsed JSON files.
+        param_configs (dict): Name to parameter configuration. Defaults to PARAM_CONFIGS.
+
+    Returns:
+        dict: Column name to its array of len(yarns) values.
+    """
+    columns = {}
+    for param_config in param_configs.values():
+        param_arrays = initialize_param_storage(len(yarns), param_config)
+        for i, yarn in enumerate(yarns):
+            process_params(yarn, param_config, param_arrays, i)
+        columns.update(param_arrays)
+
+    for param_config in param_configs.values():
+        for param, keys in param_config.items():
+            if param in columns:
+                continue
+            columns[param] = np.zeros(len(yarns))
+            for i, yarn in enumerate(yarns):
+                value = yarn
+                for key in keys:
+                    value = value[key]
+                columns[param][i] = value
+    return columns
+
+def load_label_table(fnames_json, cache_dir=None, num_workers=None):
+    """
+    Return the label table of the given JSON files, building or updating it if needed.
+
+    The table holds the columns of extract_label_columns for all PARAM_CONFIGS and a
+    'samples' column with the sample ids. Rows are keyed by sample id and its JSON
+    description stores the size and modification time of every file, so only new or
+    modified files are parsed again.
+
+    Args:
+        fnames_json (list): Sorted JSON file paths.
+        cache_dir (str, optional): Directory for the table. Defaults to '<folder>/cache'.
+        num_workers (int, optional): Number of threads reading the files. Defaults to the number of CPUs.
+
+    Returns:
+        dict: Column name to its array, with one row per JSON file in the given order.
+    """
+    table_file, meta_file = label_table_files(os.path.dirname(fnames_json[0]), cache_dir)
+    description = describe_files(fnames_json)
+    column_names = sorted(extract_label_columns([], PARAM_CONFIGS))
+
+    old_rows = {}
+    if os.path.isfile(table_file) and os.path.isfile(meta_file):
+        meta = read_file(meta_file)
+        if meta['columns'] == column_names:
+            with np.load(table_file) as npz:
+                old_table = {name: npz[name] for name in npz.files}
+            if meta['files'] == description:
+                return old_table
+            old_rows = {tuple(entry): row for row, entry in enumerate(meta['files'])}
+
+    rows = [old_rows.get(tuple(entry)) for entry in description]
+    changed = [i for i, row in enumerate(rows) if row is None]
+    kept = [i for i, row in enumerate(rows) if row is not None]
+    print(f'Label table: {len(kept)} rows kept, {len(changed)} files to read')
+
+    yarns = map_with_progress(read_file, [fnames_json[i] for i in changed], num_workers, 'Reading label')
+    changed_columns = extract_label_columns(yarns, PARAM_CONFIGS)
+
+    table = {'samples': np.array([os.path.splitext(entry[0])[0] for entry in description])}
+    for name in column_names:
+        table[name] = np.zeros(len(description))
+        table[name][changed] = changed_columns[name]
+        if kept:
+            table[name][kept] = old_table[name][[rows[i] for i in kept]]
+
+    os.makedirs(os.path.dirname(table_file), exist_ok=True)
+    tmp_file = table_file + '.tmp'
+    with open(tmp_file, 'wb') as npz_file:
+        np.savez(npz_file, **table)
+    os.replace(tmp_file, table_file)
+    with open(meta_file, 'w') as json_file:
+        json.dump({'columns': column_names, 'files': description}, json_file)
+    return table
+
+def table_labels(table, param_config):
+    """
+    Slice the labels of one parameter configuration from a label table.
+
+    Args:
+        table (dict): Label table, see load_label_table.
+        param_config (dict): Configuration dictionary specifying which parameters to extract.
+
+    Returns:
+        tuple: The parameter arrays and the (num_files, num_params) label array.
+    """
+    param_arrays = {param: table[param] for param in initialize_param_storage(0, param_config)}
+    return param_arrays, np.stack(list(param_arrays.values()), axis=1)
+
+def read_png_yarn_folder(folder_name, param_config, cache_dir=None, num_workers=None):
     """Read PNG and JSON files from the folder and process the images and parameters.
 
     Args:
         folder_name (str): The path to the folder containing PNG and JSON files.
         param_config (dict): Configuration dictionary specifying which parameters to extract from the JSON files.
+        cache_dir (str, optional): Directory of the uint8 image cache. Defaults to '<folder_name>/cache'.
+        num_workers (int, optional): Number of threads decoding and reading the files. Defaults to the number of CPUs.
 
     Returns:
-        tuple: A tuple containing the list of processed images and the corresponding parameter list.
+        tuple: A tuple containing the path of the uint8 image cache and the corresponding parameter list.
     """
     fnames_png, fnames_json = read_files(folder_name)
-    param_arrays = initialize_param_storage(len(fnames_png), param_config)
-    ims = []
-    
-    for i, (fn_png, fn_json) in enumerate(zip(fnames_png, fnames_json)):
-        if i % 10 == 0:
-            print(f'Reading image {i + 1} / {len(fnames_png)}')
-        
-        # Read image
-        im = imageio.imread(fn_png)
-        im = im[:, :, :-1]
-        img = np.array(im) / 255.0
-        ims.append(img)
+    assert fnames_png, f"No PNG files found in '{folder_name}'."
+    cache_file = load_image_cache(fnames_png, cache_dir, num_workers)
 
-        yarn = read_file(fn_json)
-        process_params(yarn, param_config, param_arrays, i)
-    
-    ims_params_list = np.array([param_arrays[param] for param in param_arrays.keys()]).T
+    param_arrays, ims_params_list = table_labels(load_label_table(fnames_json, cache_dir, num_workers), param_config)
 
     # Print means of parameters for debugging
     for param, array in param_arrays.items():
         print(f'mean {param}: {np.mean(array)}')
 
-    return ims, ims_params_list
+    return cache_file, ims_params_list
+
+def to_float_batch(x_batch, device):
+    """
+    Move a uint8 image batch to the device and scale it to float values in [0, 1].
+
+    Args:
+        x_batch (torch.Tensor): Batch as returned by a YarnDataset loader; the copy is asynchronous if it is pinned.
+        device (torch.device): Target device.
+
+    Returns:
+        torch.Tensor: Float batch on the device.
+    """
+    return x_batch.to(device, non_blocking=True).float().div_(255.0)
+
+class EpochSampler(data.Sampler):
+    """
+    Sampler that yields (epoch seed, index) pairs, so the crops depend only on the seed and the sample.
+
+    The order is a permutation drawn from the epoch seed (seed + epoch) if shuffle is set.
+    YarnDataset draws the crop of an index from a generator seeded with (epoch seed, index),
+    so a run gives the same batches with any number of loader workers, also with persistent workers,
+    which keep their dataset copy across epochs.
+
+    Args:
+        num_samples (int): Length of the dataset.
+        shuffle (bool): Draw a new order every epoch. Default is True.
+        seed (int): Seed of epoch 0. Default is 0.
+    """
+
+    def __init__(self, num_samples, shuffle=True, seed=0):
+        self.num_samples = num_samples
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        """Set the epoch of the next iteration."""
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        epoch_seed = self.seed + self.epoch
+        indices = np.random.default_rng(epoch_seed).permutation(self.num_samples) if self.shuffle else np.arange(self.num_samples)
+        return iter([(epoch_seed, int(index)) for index in indices])
+
+def seed_worker(worker_id):
+    """Seed the global numpy generator of a loader worker from its torch seed, which differs per worker."""
+    np.random.seed(torch.initial_seed() % 2**32)
+
+def make_data_loader(dataset, batch_size, shuffle=True, num_workers=0, prefetch_factor=2, pin_memory=None, seed=0):
+    """
+    Create a data loader of a YarnDataset with reproducible crops, see EpochSampler.
+
+    With num_workers > 0 the workers are persistent and every worker keeps prefetch_factor
+    batches ready, so decoding the crops overlaps with the training step. Call
+    loader.sampler.set_epoch(epoch) before every epoch.
+
+    Args:
+        dataset (YarnDataset): The dataset.
+        batch_size (int): Batch size.
+        shuffle (bool): Draw a new order every epoch. Default is True.
+        num_workers (int): Number of loader processes, 0 to load in the main process. Default is 0.
+        prefetch_factor (int): Batches loaded in advance by each worker. Default is 2.
+        pin_memory (bool, optional): Return batches in pinned memory. Defaults to True if a GPU is available.
+        seed (int): Seed of epoch 0. Default is 0.
+
+    Returns:
+        torch.utils.data.DataLoader: The data loader.
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    worker_args = {}
+    if num_workers > 0:
+        worker_args = {'persistent_workers': True, 'prefetch_factor': prefetch_factor, 'worker_init_fn': seed_worker}
+    sampler = EpochSampler(len(dataset), shuffle, seed)
+    return data.DataLoader(dataset, batch_size=batch_size, sampler=sampler, num_workers=num_workers, pin_memory=pin_memory, **worker_args)
 
 class YarnDataset(data.Dataset):
     """
     Dataset class for yarn images and parameters.
 
+    Images are read from a uint8 memory map (see build_image_cache) and returned as
+    uint8 crops; use to_float_batch to convert a batch to floats. The labels are sliced
+    from the label table shared by all parameter configurations (see load_label_table).
+
     Args:
         folder_path (str): Path to the folder containing the dataset.
         param_flag (str): Flag to specify which parameter configuration to use. Defaults to 'alphaply'.
+        cache_dir (str, optional): Directory of the uint8 image cache. Defaults to '<folder_path>/cache'.
+        num_workers (int, optional): Number of threads decoding and reading the files. Defaults to the number of CPUs.
 
     Attributes:
-        ims_list (list): List of processed images.
+        cache_file (str): Path of the (num_images, 3, width, height) uint8 image cache.
         ims_params_list (list): List of corresponding parameters.
         dataset_size (int): Total number of samples in the dataset.
     """
 
-    PARAM_CONFIGS = {
-        'alphaply': {'alpha_ply': ['fiber', 'curve_params', 'dif_z']},
-        'num_plies': {'num_plies': ['fiber', 'placement_params', 'num_points']},
-        'flyaways': {
-            'amount': ['flyaways', 'mapping_parameters', 'amount'],
-            'loop_prob': ['flyaways', 'mapping_parameters', 'loop_prob'],
-            'hair_length_mean': ['flyaways', 'mapping_parameters', 'hair_length_mean'],
-            'hair_angle': ['flyaways', 'mapping_parameters', 'hair_angle'],
-            'hair_squeeze': ['flyaways', 'mapping_parameters', 'fuzzyness'],
-            'loop_length_mean': ['flyaways', 'mapping_parameters', 'loop_length_mean'],
-            'loop_distance_mean': ['flyaways', 'mapping_parameters', 'loop_distance_mean'],
-            'loop_distance_std': ['flyaways', 'mapping_parameters', 'loop_distance_std'],
-            'jitter_xy': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'jitter_xy'],
-            'migration': ['fiber', 'fiber_params', 'yarn', 'curve_params', 'migration']
-        },
-        'thickness': {'thickness_y': ['thickness', 'fiber_thickness_y']},
-        'numfibers': {'num_fibers': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'num_points']},
-        'plyradius': {'ply_radius': ['fiber', 'fiber_params', 'yarn', 'placement_params', 'radius']},
-        'alpha': {'alpha': ['fiber', 'fiber_params', 'yarn', 'curve_params', 'dif_z']},
-        'plyradiusy': {'ellipse': ['fiber', 'ellipse']},
-        'yarnradius': {'yarn_radius': ['fiber', 'placement_params', 'radius']}
-    }
-
-    def __init__(self, folder_path, param_flag='alphaply'):
+    PARAM_CONFIGS = PARAM_CONFIGS
+
+    @classmethod
+    def num_outputs(cls, param_flag):
+        """Returns the number of network outputs of a parameter configuration."""
+        return len(initialize_param_storage(0, cls.PARAM_CONFIGS[param_flag]))
+
+    def __init__(self, folder_path, param_flag='alphaply', cache_dir=None, num_workers=None):
         assert param_flag in self.PARAM_CONFIGS, f"Invalid param_flag '{param_flag}'. Must be one of {list(self.PARAM_CONFIGS.keys())}"
         
         param_config = self.PARAM_CONFIGS[param_flag]
-        self.ims_list, self.ims_params_list = read_png_yarn_folder(folder_path, param_config)
-        self.dataset_size = len(self.ims_list)
+        self.cache_file, self.ims_params_list = read_png_yarn_folder(folder_path, param_config, cache_dir, num_workers)
+        self.dataset_size = len(self.ims_params_list)
+        self._ims = None
+
+    def __getstate__(self):
+        # Worker processes open their own memory map instead of receiving a copy of the images
+        state = self.__dict__.copy()
+        state['_ims'] = None
+        return state
+
+    @property
+    def ims(self):
+        if self._ims is None:
+            self._ims = np.load(self.cache_file, mmap_mode='r')
+        return self._ims
 
     def __len__(self):
         return self.dataset_size
 
-    def __getitem__(self, index):
-        inputs = self.ims_list[index]
-        
-        # Random crop
-        h, new_h, new_w = 2000, 1200, 584
-        bottom = np.random.randint(0, h - new_h)
+    @staticmethod
+    def crop_generator(item):
+        # item is an index or an (epoch seed, index) pair of EpochSampler, the crop of a pair is reproducible
+        if isinstance(item, (tuple, list)):
+            seed, index = item
+            return int(index), np.random.default_rng((seed, int(index)))
+        return int(item), np.random.default_rng()
+
+    def random_crop(self, index, rng):
+        # Random crop, read directly from the (3, width, height) memory map
+        h, new_h, new_w = self.ims.shape[3], 1200, 584
+        bottom = rng.integers(0, h - new_h)
         top = bottom + new_h
-        left = np.random.randint(8, 28)
+        left = rng.integers(8, 28)
         right = left + new_w
-        inputs = inputs[bottom:top, left:right]
-        
-        inputs = np.transpose(inputs, (2, 1, 0))
+        return np.ascontiguousarray(self.ims[index, :, left:right, bottom:top])
+
+    def __getitem__(self, item):
+        index, rng = self.crop_generator(item)
+        inputs = self.random_crop(index, rng)
         label = self.ims_params_list[index]
 
         return inputs, label, index
+
+class MultiTaskYarnDataset(YarnDataset):
+    """
+    Dataset class for yarn images with the labels of several parameter configurations.
+
+    Every JSON file is parsed once for all configurations and the images share one uint8 cache,
+    so a single training run covers all heads of a MultiTaskResnetYarn.
+
+    Args:
+        folder_path (str): Path to the folder containing the dataset.
+        param_flags (list, optional): Parameter configurations to read. Defaults to all PARAM_CONFIGS.
+        cache_dir (str, optional): Directory of the uint8 image cache. Defaults to '<folder_path>/cache'.
+        num_workers (int, optional): Number of threads decoding and reading the files. Defaults to the number of CPUs.
+
+    Attributes:
+        cache_file (str): Path of the (num_images, 3, width, height) uint8 image cache.
+        labels (dict): param_flag to its (num_images, num_params) label array.
+        dataset_size (int): Total number of samples in the dataset.
+    """
+
+    def __init__(self, folder_path, param_flags=None, cache_dir=None, num_workers=None):
+        param_flags = list(param_flags or self.PARAM_CONFIGS)
+        for param_flag in param_flags:
+            assert param_flag in self.PARAM_CONFIGS, f"Invalid param_flag '{param_flag}'. Must be one of {list(self.PARAM_CONFIGS.keys())}"
+
+        fnames_png, fnames_json = read_files(folder_path)
+        assert fnames_png, f"No PNG files found in '{folder_path}'."
+        self.cache_file = load_image_cache(fnames_png, cache_dir, num_workers)
+
+        table = load_label_table(fnames_json, cache_dir, num_workers)
+        self.labels = {param_flag: table_labels(table, self.PARAM_CONFIGS[param_flag])[1] for param_flag in param_flags}
+        self.dataset_size = len(fnames_png)
+        self._ims = None
+
+    def __getitem__(self, item):
+        index, rng = self.crop_generator(item)
+        inputs = self.random_crop(index, rng)
+        label = {param_flag: params_list[index] for param_flag, params_list in self.labels.items()}
+
+        return inputs, label, index
@@ -0,0 +1,208 @@
+import numpy as np
+import time
+import torch
+import torch.nn.functional as F
+from torch.utils.tensorboard import SummaryWriter
+import os
+
+from dataloader import YarnDataset, make_data_loader, to_float_batch
+from utils import export
+from network import MultiTaskResnetYarn
+from train import FLYAWAY_WEIGHTS, initialize_experiment, validate_directories
+from test import MODEL_PARAMS, ModelRegistry
+from quantize_model import accuracy_report, print_report
+
+# Outputs of the teachers that are class logits, distilled with a soft cross-entropy
+CLASSIFICATION_PARAMS = ('thickness', 'numplies')
+
+def setup_student(backbone, teacher_params, device_ids, weights_path=None):
+    """
+    Setup the device and a MultiTaskResnetYarn student with one head per teacher.
+
+    Args:
+        backbone (int or str): Backbone of the student, e.g. 'mobilenet_v3_small' or 18.
+        teacher_params (list): (param_name, num_params, model_file, resnet_num) tuples of the teachers.
+        device_ids (list): List of device IDs for multi-GPU setup.
+        weights_path (str, optional): Local ImageNet weight file or torch hub cache directory.
+
+    Returns:
+        tuple: Contains the student and the device.
+    """
+    heads = {param_name: num_params for param_name, num_params, _, _ in teacher_params}
+    model = MultiTaskResnetYarn(backbone, heads, -1, weights_path=weights_path)
+    device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+    model = model.to(device)
+
+    if torch.cuda.device_count() > 1:
+        model = torch.nn.DataParallel(model, device_ids=device_ids)
+
+    return model, device
+
+def distillation_loss(student_outputs, teacher_outputs, temperature, head_weights):
+    """
+    Compute the weighted sum of the per-head distillation losses.
+
+    Classification heads match the teacher distribution softened by the temperature (KL divergence,
+    scaled by temperature^2), flyaways use the weighted L1 loss of training and the other heads L1.
+
+    Args:
+        student_outputs (dict): Head name to the student outputs.
+        teacher_outputs (dict): Head name to the teacher outputs.
+        temperature (float): Softmax temperature of the classification heads.
+        head_weights (dict): Head name to the weight of its loss in the sum.
+
+    Returns:
+        tuple: The total loss and a dict of the per-head loss values.
+    """
+    total = 0.0
+    head_losses = {}
+    for name, teacher in teacher_outputs.items():
+        student = student_outputs[name]
+        if name in CLASSIFICATION_PARAMS:
+            loss = F.kl_div(F.log_softmax(student / temperature, dim=1), F.softmax(teacher / temperature, dim=1),
+                            reduction='batchmean') * temperature ** 2
+        elif name == 'flyaways':
+            weights = torch.tensor(FLYAWAY_WEIGHTS, device=student.device, dtype=torch.float).reshape(1, -1)
+            loss = F.l1_loss(student * weights, teacher * weights)
+        else:
+            loss = F.l1_loss(student, teacher)
+        head_losses[name] = loss.item()
+        total = total + head_weights.get(name, 1.0) * loss
+    return total, head_losses
+
+def evaluate_agreement(student, teachers, loader, device):
+    """
+    Compares the student with the teachers on a data loader.
+
+    Returns:
+        dict: The per-parameter report of quantize_model.accuracy_report, with the teachers as reference.
+    """
+    student_outputs, teacher_outputs = {}, {}
+    with torch.no_grad():
+        for x_batch, _, _ in loader:
+            x_batch = to_float_batch(x_batch, device)
+            for name, output in teachers.forward(x_batch).items():
+                teacher_outputs.setdefault(name, []).append(output.cpu().numpy())
+            for name, output in student(x_batch).items():
+                student_outputs.setdefault(name, []).append(output.cpu().numpy())
+
+    return accuracy_report({name: np.concatenate(values) for name, values in teacher_outputs.items()},
+                           {name: np.concatenate(values) for name, values in student_outputs.items()})
+
+def measure_speedup(student, teachers, device, batch_size=1, repetitions=5, shape=(584, 1200)):
+    """
+    Times the forward pass of the student and of all teachers on the same batch.
+
+    Returns:
+        tuple: Seconds per batch of the teachers, of the student and the speed-up factor.
+    """
+    xs = torch.rand((batch_size, 3) + tuple(shape), device=device)
+
+    def seconds(forward):
+        with torch.no_grad():
+            forward(xs)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+            time_start = time.perf_counter()
+            for _ in range(repetitions):
+                forward(xs)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+        return (time.perf_counter() - time_start) / repetitions
+
+    time_teachers = seconds(teachers.forward)
+    time_student = seconds(student)
+    return time_teachers, time_student, time_teachers / max(time_student, 1e-12)
+
+def main():
+    config, input_base_train, input_base_val, checkpoint_dir, timestamp = initialize_experiment(output_name='distill')
+
+    num_epochs = config['numEpochs']
+    learning_rate_start = config['learningRateStart']
+    batch_size = config['batchSize']
+    eval_interval = config['evalInterval']
+    checkpoint_interval = config['checkpointInterval']
+    cache_dir = config.get('cacheDir')
+    load_workers = config.get('loadWorkers')
+    num_workers = config.get('numWorkers', 0)
+    prefetch_factor = config.get('prefetchFactor', 2)
+    initial_seed = 123
+    weights_path = config.get('pretrainedWeights')
+    backbone = config.get('studentBackbone', 'mobilenet_v3_small')
+    temperature = config.get('distillTemperature', 2.0)
+    head_weights = config.get('headWeights', {})
+    device_ids = [0, 1, 2, 3]  # Example for multi-GPU setup
+
+    validate_directories([input_base_train, input_base_val])
+
+    student, device = setup_student(backbone, MODEL_PARAMS, device_ids, weights_path)
+    teachers = ModelRegistry(MODEL_PARAMS, device=device, warmup_shape=None)
+
+    # Only the images are used, the targets come from the teachers
+    train_dataset = YarnDataset(input_base_train, 'alpha', os.path.join(cache_dir, 'train') if cache_dir else None, load_workers)
+    val_dataset = YarnDataset(input_base_val, 'alpha', os.path.join(cache_dir, 'val') if cache_dir else None, load_workers)
+    train_loader = make_data_loader(train_dataset, batch_size, True, num_workers, prefetch_factor, seed=initial_seed)
+    val_loader = make_data_loader(val_dataset, batch_size, False, num_workers, prefetch_factor, seed=initial_seed)
+
+    optimizer = torch.optim.Adam(student.parameters(), lr=learning_rate_start, betas=(0.99, 0.9999), eps=1e-8, amsgrad=True, weight_decay=0.005)
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=500)
+
+    writer = SummaryWriter()
+    global_step = 0
+    iter_plot_interval = max(1, len(train_loader) // 10)
+
+    print(f'len_Dataset: {len(train_dataset)}, student: {backbone}, teachers: {[param_name for param_name, _, _, _ in MODEL_PARAMS]}')
+
+    for epoch in range(num_epochs):
+        train_loader.sampler.set_epoch(epoch)
+        val_loader.sampler.set_epoch(epoch)
+        student.train()
+
+        time_epoch_start = time.time()
+        train_losses = np.zeros(len(train_loader))
+
+        for batch_idx, (x_batch, _, _) in enumerate(train_loader):
+            x_batch = to_float_batch(x_batch, device)
+            with torch.no_grad():
+                teacher_outputs = teachers.forward(x_batch)
+            student_outputs = student(x_batch)
+
+            loss, _ = distillation_loss(student_outputs, teacher_outputs, temperature, head_weights)
+            train_losses[batch_idx] = loss.item()
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            if global_step % iter_plot_interval == 0:
+                writer.add_scalar('lossIter_distill', train_losses[batch_idx], global_step)
+            global_step += 1
+
+        time_epoch = time.time() - time_epoch_start
+        print(f'epoch {epoch:05d} / {num_epochs:05d}, {time_epoch:9.2f} s, train loss {train_losses.mean():5.5f}')
+        writer.add_scalar('training loss_distill', train_losses.mean(), epoch)
+
+        if epoch % eval_interval == 0:
+            student.eval()
+            report = evaluate_agreement(student, teachers, val_loader, device)
+            print_report(report)
+            for name, metrics in report.items():
+                for metric, value in metrics.items():
+                    writer.add_scalar(f'val {metric}_{name}', value, epoch)
+
+            if epoch % checkpoint_interval == 0:
+                export(student, checkpoint_dir, timestamp, epoch=epoch, scheduler=scheduler)
+
+        if scheduler is not None:
+            scheduler.step()
+
+    export(student, checkpoint_dir, timestamp, epoch=epoch, label='final', scheduler=scheduler)
+
+    student.eval()
+    print_report(evaluate_agreement(student, teachers, val_loader, device))
+    for speed_batch_size in (1, batch_size):
+        time_teachers, time_student, speedup = measure_speedup(student, teachers, device, speed_batch_size)
+        print(f'batch size {speed_batch_size}: teachers {time_teachers * 1000:.1f} ms, student {time_student * 1000:.1f} ms, speed-up {speedup:.1f}x')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import argparse
+import torch
+import numpy as np
+
+from dataloader import read_files, load_image_cache, to_float_batch
+from network import parse_backbone
+from test import TRAINING_SHAPE, build_eager_model, decode_image
+from utils import read_file
+
+# Files of an index directory
+EMBEDDINGS_FILE = 'embeddings.npy'
+SAMPLES_FILE = 'samples.json'
+
+def center_crop(images, shape=TRAINING_SHAPE):
+    """
+    Crops the center window of a batch in network layout.
+
+    Args:
+        images (np.ndarray): Images of shape (N, 3, width, height).
+        shape (tuple): (height, width) of the window. Default is TRAINING_SHAPE.
+
+    Returns:
+        np.ndarray: Contiguous array of shape (N, 3, window width, window height).
+    """
+    height, width = shape
+    left = max((images.shape[2] - width) // 2, 0)
+    bottom = max((images.shape[3] - height) // 2, 0)
+    return np.ascontiguousarray(images[:, :, left:left + width, bottom:bottom + height])
+
+def embed(backbone, images, device):
+    """
+    Computes L2-normalized backbone embeddings (the features before the classifier).
+
+    Args:
+        backbone (torch.nn.Module): The ResNet of a ResnetYarn or MultiTaskResnetYarn.
+        images (np.ndarray): uint8 images of shape (N, 3, width, height).
+        device (torch.device): Device of the backbone.
+
+    Returns:
+        np.ndarray: float32 embeddings of shape (N, num_features).
+    """
+    with torch.no_grad():
+        features = backbone(to_float_batch(torch.from_numpy(images), device))
+        features = torch.nn.functional.normalize(features, dim=1)
+    return features.cpu().numpy()
+
+def build_index(folder_name, index_dir, model_file, num_params, resnet_num, batch_size=32, cache_dir=None):
+    """
+    Embeds every sample of a generated dataset and writes the index.
+
+    The index directory holds the float16 embedding matrix (one row per sample) and a
+    JSON file with the model and the JSON and render path of every row.
+
+    Args:
+        folder_name (str): The dataset folder (uses its manifest if there is one).
+        index_dir (str): Output directory.
+        model_file (str): Checkpoint whose backbone computes the embeddings.
+        num_params (int): Number of outputs of the checkpoint, None for a multi-task checkpoint.
+        resnet_num (int or str): Backbone type of the checkpoint.
+        batch_size (int): Images per forward pass. Default is 32.
+        cache_dir (str, optional): Directory of the uint8 image cache. Defaults to '<folder_name>/cache'.
+    """
+    device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+    backbone = build_eager_model(model_file, num_params, resnet_num, device).resnet
+
+    fnames_png, fnames_json = read_files(folder_name)
+    assert fnames_png, f"No PNG files found in '{folder_name}'."
+    ims = np.load(load_image_cache(fnames_png, cache_dir), mmap_mode='r')
+
+    os.makedirs(index_dir, exist_ok=True)
+    embeddings = None
+    time_start = time.time()
+    for first in range(0, len(fnames_png), batch_size):
+        features = embed(backbone, center_crop(ims[first:first + batch_size]), device)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(os.path.join(index_dir, EMBEDDINGS_FILE), mode='w+', dtype=np.float16,
+                                                   shape=(len(fnames_png), features.shape[1]))
+        embeddings[first:first + len(features)] = features
+        if (first // batch_size) % 10 == 0:
+            print(f'Embedding image {first + 1} / {len(fnames_png)}')
+    embeddings.flush()
+
+    samples = {
+        'model_file': os.path.abspath(model_file), 'num_params': num_params, 'resnet_num': resnet_num,
+        'samples': [{'json': os.path.abspath(fn_json), 'render': os.path.abspath(fn_png)} for fn_png, fn_json in zip(fnames_png, fnames_json)]
+    }
+    with open(os.path.join(index_dir, SAMPLES_FILE), 'w') as json_file:
+        json.dump(samples, json_file)
+    print(f'indexed {len(fnames_png)} samples in {time.time() - time_start:.1f} s')
+
+def top_k(embeddings, queries, k=5, chunk_size=65536):
+    """
+    Exact top-k cosine similarity search.
+
+    Args:
+        embeddings (np.ndarray): Index matrix of shape (N, D), rows L2-normalized. A float16 matrix
+                                 is converted to float32 in chunks, a float32 matrix is used as is.
+        queries (np.ndarray): L2-normalized queries of shape (Q, D).
+        k (int): Number of neighbours. Default is 5.
+        chunk_size (int): Rows multiplied at once. Default is 65536.
+
+    Returns:
+        tuple: Row indices and similarities of shape (Q, k), most similar first.
+    """
+    k = min(k, len(embeddings))
+    queries = np.asarray(queries, dtype=np.float32)
+    scores = np.empty((len(queries), len(embeddings)), dtype=np.float32)
+    for first in range(0, len(embeddings), chunk_size):
+        scores[:, first:first + chunk_size] = queries @ embeddings[first:first + chunk_size].astype(np.float32, copy=False).T
+
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    similarities = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-similarities, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(similarities, order, axis=1)
+
+class EmbeddingIndex:
+    """
+    Nearest synthetic yarns of a photo, from an index written by build_index.
+
+    The embedding matrix is loaded into memory once (as float32 by default, which avoids
+    converting the float16 file on every query) and the model is kept warm, so a query
+    costs one backbone forward pass and one matrix product.
+
+    Args:
+        index_dir (str): The index directory.
+        device (torch.device, optional): Defaults to the first GPU if available, else the CPU.
+        dtype (np.dtype): In-memory type of the matrix, np.float16 halves the memory. Default is np.float32.
+    """
+
+    def __init__(self, index_dir, device=None, dtype=np.float32):
+        self.device = device or torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        self.embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE)).astype(dtype)
+        meta = read_file(os.path.join(index_dir, SAMPLES_FILE))
+        self.samples = meta['samples']
+        self.backbone = build_eager_model(meta['model_file'], meta['num_params'], meta['resnet_num'], self.device).resnet
+
+    def query(self, image_file, k=5):
+        """
+        Returns the k nearest samples of a photo with their full parameter sets.
+
+        Args:
+            image_file (str): Path to the photo.
+            k (int): Number of neighbours. Default is 5.
+
+        Returns:
+            list: Dicts with 'similarity', 'json', 'render' and 'params' (the sample JSON), most similar first.
+        """
+        image = decode_image(image_file, TRAINING_SHAPE)[np.newaxis]
+        indices, similarities = top_k(self.embeddings, embed(self.backbone, image, self.device), k)
+
+        results = []
+        for index, similarity in zip(indices[0], similarities[0]):
+            sample = self.samples[index]
+            results.append({'similarity': float(similarity), 'json': sample['json'], 'render': sample['render'],
+                            'params': read_file(sample['json'])})
+        return results
+
+def find_duplicates(embeddings, threshold=0.995, chunk_size=4096):
+    """
+    Finds pairs of near-identical samples.
+
+    The upper triangle of the similarity matrix is computed in chunk_size x chunk_size tiles,
+    so memory stays bounded by one tile; every column block is converted to float32 once
+    and only the pairs above the threshold of a tile are kept.
+
+    Args:
+        embeddings (np.ndarray): float16 index matrix of shape (N, D), rows L2-normalized.
+        threshold (float): Minimum cosine similarity of a duplicate pair. Default is 0.995.
+        chunk_size (int): Rows and columns of a tile. Default is 4096.
+
+    Returns:
+        list: (i, j, similarity) tuples with i < j, sorted by i and j.
+    """
+    pairs = []
+    for first_column in range(0, len(embeddings), chunk_size):
+        columns = embeddings[first_column:first_column + chunk_size].astype(np.float32).T
+        for first_row in range(0, first_column + chunk_size, chunk_size):
+            scores = embeddings[first_row:first_row + chunk_size].astype(np.float32, copy=False) @ columns
+            rows, cols = np.nonzero(scores >= threshold)
+            upper = first_row + rows < first_column + cols
+            rows, cols = rows[upper], cols[upper]
+            pairs.extend(zip((first_row + rows).tolist(), (first_column + cols).tolist(), scores[rows, cols].tolist()))
+    pairs.sort()
+    return pairs
+
+def main():
+    """
+    Example:
+        python embedding_index.py build ../data/Train_png_4000/ ../data/index/ --checkpoint models/alpha_resnet18.pth --num-params 1 --resnet 18
+        python embedding_index.py query ../data/index/ ../data/Test_yarns/red_random_cut.png -k 5
+        python embedding_index.py dedupe ../data/index/ --threshold 0.995
+    """
+    parser = argparse.ArgumentParser(description="Nearest-neighbour index of a generated dataset by backbone embeddings.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_build = subparsers.add_parser('build', help="embed a dataset folder")
+    parser_build.add_argument("folder")
+    parser_build.add_argument("index_dir")
+    parser_build.add_argument("--checkpoint", required=True)
+    parser_build.add_argument("--num-params", type=int, default=None, help="outputs of the checkpoint, omit for a multi-task checkpoint")
+    parser_build.add_argument("--resnet", type=parse_backbone, default=18, help="ResNet type, or mobilenet_v3_small")
+    parser_build.add_argument("--batch-size", type=int, default=32)
+    parser_build.add_argument("--cache-dir", default=None)
+
+    parser_query = subparsers.add_parser('query', help="nearest samples of photos")
+    parser_query.add_argument("index_dir")
+    parser_query.add_argument("images", nargs='+')
+    parser_query.add_argument("-k", type=int, default=5)
+
+    parser_dedupe = subparsers.add_parser('dedupe', help="list near-identical samples")
+    parser_dedupe.add_argument("index_dir")
+    parser_dedupe.add_argument("--threshold", type=float, default=0.995)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_index(args.folder, args.index_dir, args.checkpoint, args.num_params, args.resnet, args.batch_size, args.cache_dir)
+    elif args.command == 'query':
+        index = EmbeddingIndex(args.index_dir)
+        for image_file in args.images:
+            time_start = time.perf_counter()
+            results = index.query(image_file, args.k)
+            print(f'{image_file} ({(time.perf_counter() - time_start) * 1000:.1f} ms)')
+            for result in results:
+                print(f"  {result['similarity']:.4f} {result['json']}")
+    else:
+        embeddings = np.load(os.path.join(args.index_dir, EMBEDDINGS_FILE))
+        samples = read_file(os.path.join(args.index_dir, SAMPLES_FILE))['samples']
+        for i, j, similarity in find_duplicates(embeddings, args.threshold):
+            print(f"{similarity:.4f} {samples[i]['json']} {samples[j]['json']}")
+
+if __name__ == "__main__":
+    main()
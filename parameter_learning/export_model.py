@@ -0,0 +1,145 @@
+import argparse
+import torch
+import numpy as np
+
+from test import MODEL_PARAMS, TRAINING_SHAPE, build_eager_model, exported_file, load_model
+from network import parse_backbone
+
+class TupleOutputs(torch.nn.Module):
+    """Returns the head outputs of a MultiTaskResnetYarn as a tuple in head order, as needed for ONNX export."""
+
+    def __init__(self, model):
+        super(TupleOutputs, self).__init__()
+        self.model = model
+        self.head_names = list(model.heads.keys())
+
+    def forward(self, x):
+        outputs = self.model(x)
+        return tuple(outputs[name] for name in self.head_names)
+
+def export_torchscript(model, output_file, example):
+    """
+    Traces the model and saves it as TorchScript. The traced graph accepts any batch size.
+
+    Args:
+        model (torch.nn.Module): The eager model in eval mode.
+        output_file (str): Path of the .pt file.
+        example (torch.Tensor): Example input batch.
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example, strict=False)
+    traced.save(output_file)
+
+def export_onnx(model, output_file, example, opset=18):
+    """
+    Exports the model to ONNX with dynamic batch and image dimensions.
+
+    The single output of a ResnetYarn is called 'params', the outputs of a
+    MultiTaskResnetYarn are named after its heads.
+
+    Args:
+        model (torch.nn.Module): The eager model in eval mode.
+        output_file (str): Path of the .onnx file.
+        example (torch.Tensor): Example input batch.
+        opset (int): ONNX opset version. Default is 18.
+    """
+    if hasattr(model, 'heads'):
+        model = TupleOutputs(model).eval()
+        output_names = model.head_names
+    else:
+        output_names = ['params']
+
+    # The backbone ends in an adaptive pooling, so images of any size (e.g. a shape bucket of test.py) can be run
+    dynamic_axes = {'images': {0: 'batch', 2: 'width', 3: 'height'}}
+    dynamic_axes.update({name: {0: 'batch'} for name in output_names})
+    with torch.no_grad():
+        torch.onnx.export(model, (example,), output_file, input_names=['images'], output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+
+def as_dict(outputs):
+    if isinstance(outputs, dict):
+        return {name: output.detach().cpu().numpy() for name, output in outputs.items()}
+    return {'params': outputs.detach().cpu().numpy()}
+
+def check_parity(eager, exported, batch_sizes, shape, atol):
+    """
+    Compares the outputs of the exported model with the eager model on random batches of several sizes.
+
+    Args:
+        eager (torch.nn.Module): The eager model.
+        exported: The exported model, as returned by load_model.
+        batch_sizes (list): Batch sizes to test, more than one checks the dynamic batch dimension.
+        shape (tuple): (width, height) of the test images.
+        atol (float): Largest allowed absolute difference.
+
+    Returns:
+        float: The largest absolute difference of all outputs.
+    """
+    max_diff = 0.0
+    generator = torch.Generator().manual_seed(0)
+    for batch_size in batch_sizes:
+        xs = torch.rand((batch_size, 3) + tuple(shape), generator=generator)
+        with torch.no_grad():
+            expected = as_dict(eager(xs))
+            actual = as_dict(exported(xs))
+        for name, value in expected.items():
+            assert actual[name].shape == value.shape, f"Output '{name}' has shape {actual[name].shape}, expected {value.shape}."
+            max_diff = max(max_diff, float(np.abs(actual[name] - value).max()))
+    print(f'parity: max abs difference {max_diff:.3g} for batch sizes {batch_sizes}')
+    assert max_diff <= atol, f"Exported model differs from eager mode by {max_diff:.3g} > {atol:.3g}."
+    return max_diff
+
+def export_checkpoint(model_file, num_params, resnet_num, backend, atol=1e-3):
+    """
+    Exports one checkpoint next to itself (see exported_file) and checks it against eager mode on the CPU.
+
+    Args:
+        model_file (str): Path to the checkpoint file.
+        num_params (int): Number of output parameters, None for a multi-task checkpoint.
+        resnet_num (int): Type of ResNet model.
+        backend (str): 'torchscript' or 'onnx'.
+        atol (float): Largest allowed absolute difference in the parity check. Default is 1e-3.
+
+    Returns:
+        str: Path of the exported file.
+    """
+    device = torch.device('cpu')
+    model = build_eager_model(model_file, num_params, resnet_num, device)
+    width, height = TRAINING_SHAPE[1], TRAINING_SHAPE[0]
+    example = torch.zeros((1, 3, width, height))
+    output_file = exported_file(model_file, backend)
+
+    if backend == 'torchscript':
+        export_torchscript(model, output_file, example)
+    else:
+        export_onnx(model, output_file, example)
+    print(f'exported {model_file} to {output_file}')
+
+    check_parity(model, load_model(model_file, num_params, resnet_num, device, backend), [1, 3], (width, height), atol)
+    return output_file
+
+def main():
+    """
+    Exports checkpoints to TorchScript or ONNX for the inference backends of test.py.
+
+    Example:
+        python export_model.py --format onnx                                    # the nine models of MODEL_PARAMS
+        python export_model.py --format onnx --checkpoint models/alpha_resnet18.pth --num-params 1 --resnet 18
+        python export_model.py --format torchscript --checkpoint multitask.pth --resnet 34   # multi-task checkpoint
+    """
+    parser = argparse.ArgumentParser(description="Export ResnetYarn checkpoints to TorchScript or ONNX.")
+    parser.add_argument("--format", default="onnx", choices=["torchscript", "onnx"])
+    parser.add_argument("--checkpoint", default=None, help="checkpoint to export, default: all models of MODEL_PARAMS")
+    parser.add_argument("--num-params", type=int, default=None, help="outputs of the checkpoint, omit for a multi-task checkpoint")
+    parser.add_argument("--resnet", type=parse_backbone, default=18, help="ResNet type, or mobilenet_v3_small")
+    parser.add_argument("--atol", type=float, default=1e-3, help="tolerance of the parity check against eager mode")
+    args = parser.parse_args()
+
+    if args.checkpoint:
+        export_checkpoint(args.checkpoint, args.num_params, args.resnet, args.format, args.atol)
+    else:
+        for _, num_params, model_file, resnet_num in MODEL_PARAMS:
+            export_checkpoint(model_file, num_params, resnet_num, args.format, args.atol)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from network import parse_backbone
+from test import MODEL_PARAMS, TRAINING_SHAPE, ModelRegistry, predict_images, predict_tiled, yarn_parameters
+
+# flyaway_mapping and the default material of the generator do not depend on bpy
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yarn_generator_blender'))
+from Yarn_parameters import flyaway_mapping
+from Yarn_Settings_final import default_material
+
+# (fiber_thickness_x, fiber_thickness_y) of the thickness classes, as in the Yarn_Settings_final presets
+FIBER_THICKNESS = {
+    1: (0.007, 0.011),
+    2: (0.01, 0.018)
+}
+
+def build_yarn_description(params):
+    """
+    Turns predicted parameters into the arguments of Yarn_Generator.create_yarn.
+
+    Args:
+        params (dict): Yarn parameters of one image, see test.yarn_parameters.
+
+    Returns:
+        tuple: (levels_description, material, flyaways, other) in the layout of generate_yarn_parameter_sample.
+               The material is not predicted, the default material of Yarn_Settings_final is used.
+    """
+    fiber_thickness_x, fiber_thickness_y = FIBER_THICKNESS[params['thickness']]
+    flyaway_params = params['flyaways']
+
+    l1 = {
+        "name": "l1",
+        "placement_params": {
+            "type": "AREA",
+            "num_points": max(1, int(round(params['numfibers']))),
+            "radius": params['plyradius'],
+            "jitter_xy": flyaway_params['jitter_xy']
+        },
+        "curve_params": {
+            "dif_z": params['alpha'],
+            "jitter_z": 0.02,
+            "migration": flyaway_params['migration']
+        },
+        "fiber_params": {
+            "line": {
+                "length": 60.0,
+                "resolution": 4,
+            }
+        },
+        "ellipse": 1
+    }
+
+    l2 = {
+        "name": "l2",
+        "placement_params": {
+            "type": "CIRCLE",
+            "num_points": params['numplies'],
+            "radius": params['yarnradius'],
+            "middle_ply": False,
+            "jitter_xy": 0
+        },
+        "curve_params": {
+            "dif_z": params['alphaply'],
+            "jitter_z": 0,
+            "migration": 0
+        },
+        "fiber_params": {
+            "yarn": l1
+        },
+        "ellipse": params['ellipse']
+    }
+
+    flyaways = flyaway_mapping(
+        hair_length_mean=flyaway_params['hair_length_mean'],
+        hair_angle=flyaway_params['hair_angle'],
+        amount=flyaway_params['amount'],
+        loop_prob=flyaway_params['loop_prob'],
+        loop_length_mean=flyaway_params['loop_length_mean'],
+        loop_distance_mean=flyaway_params['loop_distance_mean'],
+        loop_distance_std=flyaway_params['loop_distance_std'],
+        fuzzyness=flyaway_params['hair_squeeze'],
+    )
+
+    other = {
+        "fiber_thickness_x": fiber_thickness_x,
+        "fiber_thickness_y": fiber_thickness_y,
+        "flyaway_thickness_x": fiber_thickness_x,
+        "flyaway_thickness_y": fiber_thickness_y,
+    }
+
+    return l2, default_material(), flyaways, other
+
+def write_yarn_json(output_file, description, params, image_file):
+    """
+    Writes a yarn description in the format of the generated dataset (Yarn_sampling.render_sample).
+
+    Args:
+        output_file (str): Path of the JSON file.
+        description (tuple): (levels_description, material, flyaways, other), see build_yarn_description.
+        params (dict): The predicted parameters, stored under 'prediction' for reference.
+        image_file (str): The photo the parameters were predicted from.
+    """
+    levels, material, flyaways, other = description
+    data = {"fiber": levels, "material": material, "flyaways": flyaways, "thickness": other,
+            "prediction": params, "source_image": os.path.abspath(image_file)}
+    with open(output_file, 'w') as json_file:
+        json.dump(data, json_file, indent='\t')
+
+def main():
+    """
+    Predicts create_yarn-ready parameter files for a folder of photos.
+
+    Example:
+        python inverse.py ../data/Test_yarns/ ../data/Test_yarns_params/ --fit
+        blender -b YarnGenerator_LabScene.blend --python Yarn_sampling.py -- --params-dir ../data/Test_yarns_params/ --output-dir Rerendered
+    """
+    parser = argparse.ArgumentParser(description="Predict yarn parameters for a folder of photos and write one create_yarn JSON per photo.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--multitask", default=None, help="multi-task checkpoint to use instead of the nine single-parameter models")
+    parser.add_argument("--resnet", type=parse_backbone, default=34, help="ResNet type (or mobilenet_v3_small) of the multi-task checkpoint")
+    parser.add_argument("--backend", default="torch", choices=["torch", "torchscript", "onnx", "int8"])
+    parser.add_argument("--batch-size", type=int, default=16, help="images per forward pass")
+    parser.add_argument("--workers", type=int, default=4, help="threads for decoding the photos and writing the JSON files")
+    parser.add_argument("--fit", action="store_true", help="center-crop or pad all photos to the training size")
+    parser.add_argument("--tiled", action="store_true", help="predict from training-sized windows of each photo")
+    args = parser.parse_args()
+
+    image_files = sorted(glob.glob(os.path.join(args.input_dir, '*.png')) + glob.glob(os.path.join(args.input_dir, '*.jpg')))
+    assert image_files, f"No images found in '{args.input_dir}'."
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend)
+
+    time_start = time.time()
+    if args.tiled:
+        predictions, _, _ = predict_tiled(registry, image_files, max_batch_size=args.batch_size)
+    else:
+        predictions = predict_images(registry, image_files, args.batch_size, TRAINING_SHAPE if args.fit else None, args.workers)
+
+    def write(i):
+        params = yarn_parameters(predictions, i)
+        output_file = os.path.join(args.output_dir, os.path.splitext(os.path.basename(image_files[i]))[0] + '.json')
+        write_yarn_json(output_file, build_yarn_description(params), params, image_files[i])
+        return output_file
+
+    with ThreadPoolExecutor(args.workers) as executor:
+        for output_file in executor.map(write, range(len(image_files))):
+            print(output_file)
+
+    time_total = time.time() - time_start
+    print(f'{len(image_files)} images in {time_total:.2f} s, {len(image_files) / max(time_total, 1e-9):.2f} images/s')
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,71 @@
+import os
+import torch
 import torch.nn as nn
 from torchvision import models
 
+def parse_backbone(value):
+    """Parses a --resnet command line value: a ResNet depth like 18 or a backbone name like 'mobilenet_v3_small'."""
+    return int(value) if value.isdigit() else value
+
+def get_resnet_model(resnet_type, pretrained=True, weights_path=None):
+    """
+    Returns the specified ResNet model.
+
+    Args:
+        resnet_type (int or str): Type of ResNet model (18, 34, 50, 101), or 'mobilenet_v3_small' for
+                                  a compact backbone (e.g. a distilled student, see distill.py).
+        pretrained (bool): Initialize with the ImageNet weights. Use False when a checkpoint is loaded
+                           afterwards, then only the architecture is built and nothing is downloaded.
+        weights_path (str, optional): Local ImageNet weights, either a state dict file or a torch hub
+                                      cache directory (containing checkpoints/resnetXX-*.pth) that is used
+                                      instead of the default cache. Default is None (torchvision download).
+    """
+    resnet_models = {
+        18: models.resnet18,
+        34: models.resnet34,
+        50: models.resnet50,
+        101: models.resnet101,
+        'mobilenet_v3_small': models.mobilenet_v3_small
+    }
+    if not pretrained:
+        return resnet_models[resnet_type](pretrained=False)
+
+    if weights_path is not None and os.path.isfile(weights_path):
+        resnet = resnet_models[resnet_type](pretrained=False)
+        resnet.load_state_dict(torch.load(weights_path, map_location='cpu'))
+        return resnet
+
+    if weights_path is not None:
+        torch.hub.set_dir(weights_path)
+    return resnet_models[resnet_type](pretrained=True)
+
+def freeze_resnet_blocks(resnet, freeze_blocks):
+    """Freezes the specified number of blocks in the ResNet model."""
+    if freeze_blocks >= 0:
+        for block_counter, block in enumerate(resnet.children()):
+            if block_counter <= freeze_blocks:
+                print("Freezing block nr.", block_counter)
+                for param in block.parameters():
+                    param.requires_grad = False
+
+def remove_classification_layer(resnet):
+    """Replaces the ImageNet classification layer of the backbone by nn.Identity and returns the feature size."""
+    if hasattr(resnet, 'fc'):
+        num_features = resnet.fc.in_features
+        resnet.fc = nn.Identity()
+    else:
+        num_features = resnet.classifier[0].in_features
+        resnet.classifier = nn.Identity()
+    return num_features
+
+def make_classifier(num_features, num_params):
+    """Returns the regression/classification head put on top of the ResNet features."""
+    return nn.Sequential(
+        nn.Linear(num_features, num_features),
+        nn.ELU(),
+        nn.Linear(num_features, num_params),
+    )
+
 class ResnetYarn(nn.Module):
     """
     ResnetYarn: A neural network model using pretrained ResNet as the backbone.
@@ -9,43 +74,64 @@ class ResnetYarn(nn.Module):
         resnet_type (str): Type of ResNet model ('18', '34', '50', '101'). Default is '34'.
         num_params (int): Number of output parameters. Default is 1.
         freeze_blocks (int): Number of ResNet blocks to freeze. Default is -1 (no freezing).
+        pretrained (bool): Start from the ImageNet weights. Set to False when loading a checkpoint. Default is True.
+        weights_path (str, optional): Local ImageNet weight file or cache directory, see get_resnet_model.
     """
 
-    def __init__(self, resnet_type='34', num_params=1, freeze_blocks=-1):
+    def __init__(self, resnet_type='34', num_params=1, freeze_blocks=-1, pretrained=True, weights_path=None):
         super(ResnetYarn, self).__init__()
 
-        resnet = self._get_resnet_model(resnet_type)
-        self._freeze_blocks(resnet, freeze_blocks)
+        resnet = get_resnet_model(resnet_type, pretrained, weights_path)
+        freeze_resnet_blocks(resnet, freeze_blocks)
         
-        num_features = resnet.fc.in_features
-        resnet.fc = nn.Identity()
+        num_features = remove_classification_layer(resnet)
 
         self.resnet = resnet
-        self.classifier = nn.Sequential(
-            nn.Linear(num_features, num_features),
-            nn.ELU(),
-            nn.Linear(num_features, num_params),
-        )
-
-    def _get_resnet_model(self, resnet_type):
-        """Returns the specified ResNet model."""
-        resnet_models = {
-            18: models.resnet18,
-            34: models.resnet34,
-            50: models.resnet50,
-            101: models.resnet101
-        }
-        return resnet_models[resnet_type](pretrained=True)
-
-    def _freeze_blocks(self, resnet, freeze_blocks):
-        """Freezes the specified number of blocks in the ResNet model."""
-        if freeze_blocks >= 0:
-            for block_counter, block in enumerate(resnet.children()):
-                if block_counter <= freeze_blocks:
-                    print("Freezing block nr.", block_counter)
-                    for param in block.parameters():
-                        param.requires_grad = False
+        self.classifier = make_classifier(num_features, num_params)
 
     def forward(self, x):
         x = self.resnet(x)
         return self.classifier(x)
+
+class MultiTaskResnetYarn(nn.Module):
+    """
+    MultiTaskResnetYarn: One shared ResNet backbone with a separate head per parameter group.
+
+    The heads have the same layout as the ResnetYarn classifier, so the backbone features
+    are computed once per image for all parameters.
+
+    Args:
+        resnet_type (int or str): Type of ResNet model (18, 34, 50, 101) or 'mobilenet_v3_small'. Default is 34.
+        heads (dict): Head name (a YarnDataset param_flag) to its number of outputs.
+        freeze_blocks (int): Number of ResNet blocks to freeze. Default is -1 (no freezing).
+        pretrained (bool): Start from the ImageNet weights. Set to False when loading a checkpoint. Default is True.
+        weights_path (str, optional): Local ImageNet weight file or cache directory, see get_resnet_model.
+    """
+
+    def __init__(self, resnet_type=34, heads=None, freeze_blocks=-1, pretrained=True, weights_path=None):
+        super(MultiTaskResnetYarn, self).__init__()
+        assert heads, "MultiTaskResnetYarn needs at least one head."
+
+        resnet = get_resnet_model(resnet_type, pretrained, weights_path)
+        freeze_resnet_blocks(resnet, freeze_blocks)
+
+        num_features = remove_classification_layer(resnet)
+
+        self.resnet = resnet
+        self.heads = nn.ModuleDict({name: make_classifier(num_features, num_params) for name, num_params in heads.items()})
+
+    @staticmethod
+    def heads_from_state_dict(state_dict):
+        """Returns the head name to number of outputs mapping stored in a (DataParallel) state dict."""
+        heads = {}
+        for key, value in state_dict.items():
+            parts = key.split('.')
+            if parts[0] == 'module':
+                parts = parts[1:]
+            if parts[0] == 'heads' and parts[2:] == ['2', 'weight']:
+                heads[parts[1]] = value.shape[0]
+        return heads
+
+    def forward(self, x):
+        x = self.resnet(x)
+        return {name: head(x) for name, head in self.heads.items()}
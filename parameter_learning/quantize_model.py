@@ -0,0 +1,182 @@
+import os
+import glob
+import json
+import argparse
+import torch
+import numpy as np
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from dataloader import to_float_batch
+from export_model import as_dict
+from test import MODEL_PARAMS, MULTITASK_PARAM_NAMES, FLYAWAY_NAMES, TRAINING_SHAPE, build_eager_model, decode_image, exported_file
+from network import parse_backbone
+
+def load_images(image_files, batch_size):
+    """
+    Decodes images at the training size and returns them as float batches.
+
+    Args:
+        image_files (list): Paths of the image files.
+        batch_size (int): Images per batch.
+
+    Returns:
+        list: Float tensors of shape (batch_size, 3, width, height), the last one can be smaller.
+    """
+    images = [decode_image(image_file, TRAINING_SHAPE) for image_file in image_files]
+    return [to_float_batch(torch.from_numpy(np.stack(images[first:first + batch_size])), 'cpu')
+            for first in range(0, len(images), batch_size)]
+
+def quantize(model, calibration_batches, engine='x86'):
+    """
+    Post-training static int8 quantization of a ResnetYarn or MultiTaskResnetYarn.
+
+    The convolutions of the backbone and the linear layers of the classifier heads are
+    quantized; the activation ranges are observed on the calibration batches.
+
+    Args:
+        model (torch.nn.Module): The fp32 model in eval mode on the CPU.
+        calibration_batches (list): Float image batches.
+        engine (str): Quantized kernel backend, 'x86' or 'qnnpack' (ARM). Default is 'x86'.
+
+    Returns:
+        torch.nn.Module: The int8 model.
+    """
+    torch.backends.quantized.engine = engine
+    example = calibration_batches[0][:1]
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example,))
+
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+
+    return convert_fx(prepared)
+
+def run_batches(model, batches):
+    """Runs the model on all batches and returns output name to the concatenated numpy outputs."""
+    outputs = {}
+    with torch.no_grad():
+        for batch in batches:
+            for name, output in as_dict(model(batch)).items():
+                outputs.setdefault(name, []).append(output)
+    return {name: np.concatenate(values) for name, values in outputs.items()}
+
+def accuracy_report(fp32_outputs, int8_outputs):
+    """
+    Compares the int8 with the fp32 outputs for every predicted parameter.
+
+    Args:
+        fp32_outputs (dict): Parameter name to fp32 outputs of shape (N, num_params).
+        int8_outputs (dict): Parameter name to int8 outputs of shape (N, num_params).
+
+    Returns:
+        dict: Parameter (flyaways per output) to its metrics; the share of equal classes for thickness and
+              numplies, else the mean and max absolute error and the mean absolute error relative to the mean
+              absolute fp32 value.
+    """
+    report = {}
+    for name, fp32 in fp32_outputs.items():
+        int8 = int8_outputs[name]
+        if name in ('thickness', 'numplies'):
+            report[name] = {
+                'class_agreement': float(np.mean(np.argmax(fp32, axis=1) == np.argmax(int8, axis=1))),
+                'max_abs_logit_error': float(np.abs(fp32 - int8).max())
+            }
+            continue
+
+        columns = [f'flyaways.{flyaway_name}' for flyaway_name in FLYAWAY_NAMES] if name == 'flyaways' else [name]
+        for j, column in enumerate(columns):
+            error = np.abs(fp32[:, j] - int8[:, j])
+            report[column] = {
+                'mean_abs_error': float(error.mean()),
+                'max_abs_error': float(error.max()),
+                'relative_error': float(error.mean() / max(np.abs(fp32[:, j]).mean(), 1e-12))
+            }
+    return report
+
+def print_report(report):
+    print(f"{'parameter':<32} {'agreement':>10} {'mean abs':>12} {'max abs':>12} {'relative':>10}")
+    for name, metrics in report.items():
+        if 'class_agreement' in metrics:
+            print(f"{name:<32} {metrics['class_agreement']:>10.3f} {'':>12} {metrics['max_abs_logit_error']:>12.4g} {'':>10}")
+        else:
+            print(f"{name:<32} {'':>10} {metrics['mean_abs_error']:>12.4g} {metrics['max_abs_error']:>12.4g} {metrics['relative_error']:>10.2%}")
+
+def output_names(param_name):
+    """Maps the output names of run_batches to parameter names."""
+    if param_name is None:
+        return lambda name: MULTITASK_PARAM_NAMES.get(name, name)
+    return lambda name: param_name
+
+def quantize_checkpoint(model_file, num_params, resnet_num, calibration_batches, eval_batches, param_name=None, engine='x86'):
+    """
+    Quantizes one checkpoint, saves it next to itself as TorchScript (see exported_file) and compares it with fp32.
+
+    Args:
+        model_file (str): Path to the checkpoint file.
+        num_params (int): Number of output parameters, None for a multi-task checkpoint.
+        resnet_num (int): Type of ResNet model.
+        calibration_batches (list): Float image batches for calibration.
+        eval_batches (list): Float image batches for the accuracy report.
+        param_name (str, optional): Parameter name of a single-parameter checkpoint, see MODEL_PARAMS.
+        engine (str): Quantized kernel backend. Default is 'x86'.
+
+    Returns:
+        dict: The accuracy report, see accuracy_report.
+    """
+    model = build_eager_model(model_file, num_params, resnet_num, torch.device('cpu'))
+    quantized = quantize(model, calibration_batches, engine)
+
+    output_file = exported_file(model_file, 'int8')
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, eval_batches[0][:1], strict=False)
+    traced.save(output_file)
+    print(f'quantized {model_file} to {output_file}')
+
+    rename = output_names(param_name)
+    fp32_outputs = {rename(name): value for name, value in run_batches(model, eval_batches).items()}
+    int8_outputs = {rename(name): value for name, value in run_batches(torch.jit.load(output_file), eval_batches).items()}
+    return accuracy_report(fp32_outputs, int8_outputs)
+
+def main():
+    """
+    Quantizes the inference models to int8 for the 'int8' backend of test.py.
+
+    Example:
+        python quantize_model.py --calibration-dir ../data/Val_png_345/ --eval-dir ../data/Test_yarns/
+        python quantize_model.py --calibration-dir ../data/Val_png_345/ --checkpoint multitask.pth --resnet 34
+    """
+    parser = argparse.ArgumentParser(description="Post-training int8 quantization of ResnetYarn checkpoints.")
+    parser.add_argument("--calibration-dir", required=True, help="folder of rendered or real yarn images")
+    parser.add_argument("--num-calibration", type=int, default=64, help="number of calibration images")
+    parser.add_argument("--eval-dir", default=None, help="images for the accuracy report, default: the calibration images")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint to quantize, default: all models of MODEL_PARAMS")
+    parser.add_argument("--num-params", type=int, default=None, help="outputs of the checkpoint, omit for a multi-task checkpoint")
+    parser.add_argument("--resnet", type=parse_backbone, default=18, help="ResNet type, or mobilenet_v3_small")
+    parser.add_argument("--engine", default="x86", choices=["x86", "fbgemm", "qnnpack"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--report", default=None, help="write the accuracy report to this JSON file")
+    args = parser.parse_args()
+
+    calibration_files = sorted(glob.glob(os.path.join(args.calibration_dir, '*.png')))[:args.num_calibration]
+    assert calibration_files, f"No PNG files found in '{args.calibration_dir}'."
+    eval_files = sorted(glob.glob(os.path.join(args.eval_dir, '*.png'))) if args.eval_dir else calibration_files
+    calibration_batches = load_images(calibration_files, args.batch_size)
+    eval_batches = load_images(eval_files, args.batch_size)
+
+    if args.checkpoint:
+        checkpoints = [(None if args.num_params is None else 'params', args.num_params, args.checkpoint, args.resnet)]
+    else:
+        checkpoints = MODEL_PARAMS
+
+    report = {}
+    for param_name, num_params, model_file, resnet_num in checkpoints:
+        report.update(quantize_checkpoint(model_file, num_params, resnet_num, calibration_batches, eval_batches, param_name, args.engine))
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as json_file:
+            json.dump(report, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import io
+import os
+import json
+import time
+import argparse
+import threading
+import collections
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import torch
+
+from dataloader import to_float_batch
+from test import MODEL_PARAMS, TRAINING_SHAPE, ModelRegistry, decode_image, bucket_by_shape, yarn_parameters
+from network import parse_backbone
+
+class Request:
+    """
+    One image waiting for its prediction.
+
+    Attributes:
+        image (np.ndarray): uint8 image of shape (3, width, height).
+        result (dict): Yarn parameters, set by the batcher.
+        error (Exception): Set by the batcher if the prediction failed.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.result = None
+        self.error = None
+        self.time_start = time.perf_counter()
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches and runs them through the registry on one thread.
+
+    A batch is started with the first waiting request and closed when it has max_batch_size
+    images or when window_ms have passed since then, so a lone request waits at most window_ms.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        max_batch_size (int): Maximum number of images per batch. Default is 16.
+        window_ms (float): Latency window for collecting a batch in milliseconds. Default is 10.
+        num_latencies (int): Number of recent request latencies kept for the statistics. Default is 1000.
+    """
+
+    def __init__(self, registry, max_batch_size=16, window_ms=10.0, num_latencies=1000):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.latencies = collections.deque(maxlen=num_latencies)
+        self.counters = {'requests': 0, 'errors': 0, 'batches': 0, 'images_in_batches': 0, 'max_queue_depth': 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, image):
+        """
+        Queues an image and waits for its parameters.
+
+        Args:
+            image (np.ndarray): uint8 image of shape (3, width, height).
+
+        Returns:
+            dict: Yarn parameters, see yarn_parameters.
+        """
+        request = Request(image)
+        with self.condition:
+            self.queue.append(request)
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], len(self.queue))
+            self.condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _next_batch(self):
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+            deadline = time.perf_counter() + self.window
+            while len(self.queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return [self.queue.popleft() for _ in range(min(self.max_batch_size, len(self.queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            for _, indices in bucket_by_shape([request.image for request in batch]).items():
+                requests = [batch[i] for i in indices]
+                try:
+                    images = torch.from_numpy(np.stack([request.image for request in requests]))
+                    predictions = self.registry.predict(to_float_batch(images, self.registry.device))
+                    for i, request in enumerate(requests):
+                        request.result = yarn_parameters(predictions, i)
+                except Exception as e:
+                    for request in requests:
+                        request.error = e
+
+                time_end = time.perf_counter()
+                with self.condition:
+                    self.counters['batches'] += 1
+                    self.counters['images_in_batches'] += len(requests)
+                    for request in requests:
+                        self.counters['requests'] += 1
+                        self.counters['errors'] += request.error is not None
+                        self.latencies.append(time_end - request.time_start)
+                for request in requests:
+                    request.done.set()
+
+    def stats(self):
+        """
+        Returns the request counters, the current queue depth and latency percentiles in milliseconds.
+        """
+        with self.condition:
+            stats = dict(self.counters)
+            stats['queue_depth'] = len(self.queue)
+            latencies = np.array(self.latencies) * 1000.0
+        stats['mean_batch_size'] = stats['images_in_batches'] / max(stats['batches'], 1)
+        for p in (50, 90, 99):
+            stats[f'latency_p{p}_ms'] = float(np.percentile(latencies, p)) if len(latencies) else None
+        return stats
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict with an image file as body returns the yarn parameters as JSON,
+    GET /stats returns the counters of the batcher.
+    """
+
+    batcher = None
+    fit_shape = None
+
+    def _send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.batcher.stats())
+        else:
+            self._send_json(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': f'unknown path {self.path}'})
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            image = decode_image(io.BytesIO(body), self.fit_shape)
+        except Exception as e:
+            self._send_json(400, {'error': f'cannot decode image: {e}'})
+            return
+        try:
+            self._send_json(200, self.batcher.submit(image))
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+    def address_string(self):
+        # client_address is empty for Unix sockets
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+def main():
+    """
+    Starts the inference server.
+
+    Example:
+        python server.py --port 8080
+        curl --data-binary @../data/Test_yarns/red_random_cut.png http://localhost:8080/predict
+        curl http://localhost:8080/stats
+    """
+    parser = argparse.ArgumentParser(description="Serve yarn parameter predictions over localhost HTTP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", default=None, help="listen on this Unix socket path instead of host:port")
+    parser.add_argument("--multitask", default=None, help="multi-task checkpoint to use instead of the nine single-parameter models")
+    parser.add_argument("--resnet", type=parse_backbone, default=34, help="ResNet type (or mobilenet_v3_small) of the multi-task checkpoint")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=10.0, help="latency window for collecting a batch")
+    parser.add_argument("--fit", action="store_true", help="center-crop or pad all images to the training size, so they share one batch")
+    parser.add_argument("--backend", default="torch", choices=["torch", "torchscript", "onnx", "int8"], help="run the checkpoints, their exported graphs (see export_model.py) or their int8 versions (see quantize_model.py)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend)
+    PredictionHandler.batcher = MicroBatcher(registry, args.max_batch_size, args.window_ms)
+    PredictionHandler.fit_shape = TRAINING_SHAPE if args.fit else None
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = UnixHTTPServer(args.unix_socket, PredictionHandler)
+        print(f'listening on {args.unix_socket}')
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+        print(f'listening on http://{args.host}:{args.port}')
+    server.verbose = args.verbose
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
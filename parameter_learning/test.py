@@ -1,102 +1,504 @@
 import os
 import glob
+import time
+import argparse
 import torch
+from concurrent.futures import ThreadPoolExecutor
 import imageio
 import numpy as np
-from network import ResnetYarn
+from network import ResnetYarn, MultiTaskResnetYarn, parse_backbone
+from utils import load_checkpoint
+from dataloader import to_float_batch
 
-def predict_params(num_params, model_file, image_file, resnet_num=18):
+# Parameter name, number of outputs, checkpoint and ResNet type of the single-parameter models
+MODEL_PARAMS = [
+    ('thickness', 2, 'models/thickness_resnet18.pth', 18),
+    ('numfibers', 1, 'models/numfibers_resnet18.pth', 18),
+    ('plyradius', 1, 'models/plyradius_resnet18.pth', 18),
+    ('alpha', 1, 'models/alpha_resnet18.pth', 18),
+    ('numplies', 5, 'models/numplies_resnet34.pth', 34),
+    ('yarnradius', 1, 'models/yarnradius_resnet18.pth', 18),
+    ('alphaply', 1, 'models/alphaply_resnet34.pth', 34),
+    ('ellipse', 1, 'models/plyradiusy_resnet18.pth', 18),
+    ('flyaways', 10, 'models/flyaways_resnet18.pth', 18)
+]
+
+# (height, width) of the crops the models are trained on
+TRAINING_SHAPE = (1200, 584)
+
+# Outputs of the flyaways model, in order
+FLYAWAY_NAMES = [
+    'amount', 'loop_prob', 'hair_length_mean', 'hair_angle', 'hair_squeeze',
+    'loop_length_mean', 'loop_distance_mean', 'loop_distance_std', 'jitter_xy', 'migration'
+]
+
+# Names of the MultiTaskResnetYarn heads (YarnDataset param_flags) in the output of this script
+MULTITASK_PARAM_NAMES = {
+    'thickness': 'thickness',
+    'numfibers': 'numfibers',
+    'plyradius': 'plyradius',
+    'alpha': 'alpha',
+    'num_plies': 'numplies',
+    'yarnradius': 'yarnradius',
+    'alphaply': 'alphaply',
+    'plyradiusy': 'ellipse',
+    'flyaways': 'flyaways'
+}
+
+def decode_image(image_file, fit_shape=None):
     """
-    Predicts parameters using a pretrained ResNet model on a given image.
+    Decodes an image to the uint8 network input layout.
 
     Args:
-        num_params (int): Number of output parameters.
-        model_file (str): Path to the model checkpoint file.
         image_file (str): Path to the image file.
-        resnet_num (str): Type of ResNet model. Default is '18'.
+        fit_shape (tuple, optional): (height, width) to center-crop or edge-pad the image to,
+                                     e.g. TRAINING_SHAPE. Default is None (keep the image size).
+
+    Returns:
+        np.ndarray: uint8 array of shape (3, width, height).
+    """
+    im = imageio.imread(image_file)[:, :, :3]
+
+    if fit_shape is not None:
+        for axis, size in enumerate(fit_shape):
+            if im.shape[axis] > size:
+                start = (im.shape[axis] - size) // 2
+                im = np.take(im, np.arange(start, start + size), axis=axis)
+            elif im.shape[axis] < size:
+                pad = [(0, 0)] * 3
+                pad[axis] = ((size - im.shape[axis]) // 2, size - im.shape[axis] - (size - im.shape[axis]) // 2)
+                im = np.pad(im, pad, mode='edge')
+
+    return np.ascontiguousarray(np.transpose(im, (2, 1, 0)))
+
+def decode_images(image_files, fit_shape=None, num_workers=1):
+    """
+    Decodes several images with a thread pool, see decode_image.
+
+    Args:
+        image_files (list): Paths of the image files.
+        fit_shape (tuple, optional): (height, width) all images are cropped or padded to. Default is None.
+        num_workers (int): Number of decoding threads. Default is 1.
+
+    Returns:
+        list: uint8 arrays of shape (3, width, height), in input order.
+    """
+    if num_workers <= 1:
+        return [decode_image(image_file, fit_shape) for image_file in image_files]
+    with ThreadPoolExecutor(num_workers) as executor:
+        return list(executor.map(lambda image_file: decode_image(image_file, fit_shape), image_files))
+
+def bucket_by_shape(images):
+    """
+    Groups images of the same size, so that each group can be run in batches.
+
+    Args:
+        images (list): Arrays of shape (3, width, height).
+
+    Returns:
+        dict: Image shape to the list of indices of the images with that shape, in input order.
+    """
+    buckets = {}
+    for i, image in enumerate(images):
+        buckets.setdefault(image.shape, []).append(i)
+    return buckets
+
+def predict_images(registry, image_files, batch_size=16, fit_shape=None, num_workers=1):
+    """
+    Predicts all parameters for a list of images in fixed-size batches.
+
+    The images are decoded to uint8 batch_size files at a time and collected in buckets
+    of the same size (one bucket if fit_shape is given). A bucket is run as soon as it
+    holds batch_size images, so at most one partial batch per image size is kept in
+    memory; only the last batch of a bucket can be smaller.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        image_files (list): Paths of the image files.
+        batch_size (int): Number of images per forward pass. Default is 16.
+        fit_shape (tuple, optional): (height, width) all images are cropped or padded to. Default is None.
+        num_workers (int): Number of image decoding threads. Default is 1.
+
+    Returns:
+        dict: Parameter name to its raw network outputs of shape (len(image_files), num_params), in input order.
+    """
+    predictions = {}
+    # Image shape to the indices and images of its next batch
+    buckets = {}
+
+    def run_batch(indices, images):
+        batch = torch.from_numpy(np.stack(images))
+        for name, prediction in registry.predict(to_float_batch(batch, registry.device)).items():
+            if name not in predictions:
+                predictions[name] = np.zeros((len(image_files), prediction.shape[1]), dtype=prediction.dtype)
+            predictions[name][indices] = prediction
+
+    for first in range(0, len(image_files), batch_size):
+        images = decode_images(image_files[first:first + batch_size], fit_shape, num_workers)
+        for i, image in enumerate(images, first):
+            indices, bucket = buckets.setdefault(image.shape, ([], []))
+            indices.append(i)
+            bucket.append(image)
+            if len(bucket) == batch_size:
+                run_batch(*buckets.pop(image.shape))
+
+    for indices, bucket in buckets.values():
+        run_batch(indices, bucket)
+
+    return predictions
+
+def tile_positions(size, window, stride):
+    """Returns the start offsets of windows covering [0, size), the last window ends at size."""
+    if size <= window:
+        return [0]
+    positions = list(range(0, size - window + 1, stride))
+    if positions[-1] != size - window:
+        positions.append(size - window)
+    return positions
+
+def tile_image(image, window=TRAINING_SHAPE, stride=(600, 292)):
+    """
+    Cuts an image into overlapping training-sized windows.
+
+    Args:
+        image (np.ndarray): uint8 image of shape (3, width, height), see decode_image.
+        window (tuple): (height, width) of the windows. Default is TRAINING_SHAPE.
+        stride (tuple): (height, width) step between neighbouring windows. Default is half a window.
+
+    Returns:
+        np.ndarray: Tiles of shape (num_tiles, 3, window width, window height); an image smaller than
+                    the window is edge-padded to it.
+    """
+    window_height, window_width = window
+    pad = [(0, 0), (0, max(window_width - image.shape[1], 0)), (0, max(window_height - image.shape[2], 0))]
+    if any(after for _, after in pad):
+        image = np.pad(image, pad, mode='edge')
+
+    tiles = []
+    for left in tile_positions(image.shape[1], window_width, stride[1]):
+        for bottom in tile_positions(image.shape[2], window_height, stride[0]):
+            tiles.append(image[:, left:left + window_width, bottom:bottom + window_height])
+    return np.stack(tiles)
+
+def aggregate_tiles(param_name, tile_predictions, aggregate='mean'):
+    """
+    Aggregates the predictions of the tiles of one image.
+
+    Args:
+        param_name (str): Parameter name, see MODEL_PARAMS.
+        tile_predictions (np.ndarray): Raw outputs of shape (num_tiles, num_params).
+        aggregate (str): 'mean' or 'median' for the regression outputs. The logits of the
+                         classification outputs (thickness, numplies) are always averaged.
+
+    Returns:
+        tuple: The aggregated outputs and their standard deviation across the tiles, both of shape (num_params,).
+    """
+    if param_name in ('thickness', 'numplies') or aggregate == 'mean':
+        value = tile_predictions.mean(axis=0)
+    elif aggregate == 'median':
+        value = np.median(tile_predictions, axis=0)
+    else:
+        raise ValueError(f"Invalid aggregate '{aggregate}'. Must be 'mean' or 'median'.")
+    return value, tile_predictions.std(axis=0)
+
+def predict_tiled(registry, image_files, stride=(600, 292), aggregate='mean', max_batch_size=64):
+    """
+    Predicts all parameters from training-sized windows of every image instead of the whole image.
+
+    All tiles of an image are run as one batch (split into batches of max_batch_size
+    for very large photos) and their predictions are aggregated per image.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        image_files (list): Paths of the image files.
+        stride (tuple): (height, width) step between neighbouring windows. Default is half a window.
+        aggregate (str): 'mean' or 'median' for the regression outputs, see aggregate_tiles.
+        max_batch_size (int): Maximum number of tiles per forward pass. Default is 64.
+
+    Returns:
+        tuple: Parameter name to the aggregated outputs of shape (len(image_files), num_params),
+               parameter name to their spread (standard deviation across the tiles) of the same shape,
+               and the number of tiles per image.
+    """
+    predictions, spreads, num_tiles = {}, {}, []
+
+    for i, image_file in enumerate(image_files):
+        tiles = tile_image(decode_image(image_file), TRAINING_SHAPE, stride)
+        num_tiles.append(len(tiles))
+        tile_predictions = {}
+        for first in range(0, len(tiles), max_batch_size):
+            batch = to_float_batch(torch.from_numpy(tiles[first:first + max_batch_size]), registry.device)
+            for name, prediction in registry.predict(batch).items():
+                tile_predictions.setdefault(name, []).append(prediction)
+
+        for name, values in tile_predictions.items():
+            value, spread = aggregate_tiles(name, np.concatenate(values), aggregate)
+            if name not in predictions:
+                predictions[name] = np.zeros((len(image_files), len(value)), dtype=value.dtype)
+                spreads[name] = np.zeros((len(image_files), len(value)), dtype=spread.dtype)
+            predictions[name][i] = value
+            spreads[name][i] = spread
+
+    return predictions, spreads, num_tiles
+
+# File extension of the exported models of each inference backend, see export_model.py and quantize_model.py
+BACKEND_EXTENSIONS = {'torchscript': '.pt', 'onnx': '.onnx', 'int8': '_int8.pt'}
+
+def exported_file(model_file, backend):
+    """Returns the path of the exported model of a checkpoint, e.g. models/alpha_resnet18.onnx."""
+    return os.path.splitext(model_file)[0] + BACKEND_EXTENSIONS[backend]
+
+def build_eager_model(model_file, num_params, resnet_num, device):
+    """
+    Builds a ResnetYarn (or a MultiTaskResnetYarn if num_params is None) from a checkpoint, in eval mode.
+
+    Args:
+        model_file (str): Path to the checkpoint file.
+        num_params (int): Number of output parameters, None for a multi-task checkpoint.
+        resnet_num (int): Type of ResNet model.
+        device (torch.device): Device of the model.
 
     Returns:
-        np.ndarray: Predicted parameters.
-    """
-    # Load model
-    device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
-    model = ResnetYarn(resnet_num, num_params, -1)
-    model = torch.nn.DataParallel(model)
-    dict_import = torch.load(model_file)
-    model.load_state_dict(dict_import['state_dict'])
+        torch.nn.Module: The model.
+    """
+    state_dict = load_checkpoint(model_file, device)
+    if num_params is None:
+        model = MultiTaskResnetYarn(resnet_num, MultiTaskResnetYarn.heads_from_state_dict(state_dict), -1, pretrained=False)
+    else:
+        model = ResnetYarn(resnet_num, num_params, -1, pretrained=False)
+    model.load_state_dict(state_dict)
     model = model.to(device)
     model.eval()
+    return model
+
+class OnnxModel:
+    """
+    Runs an exported ONNX model with ONNX Runtime on the CPU, called like the eager model.
+
+    Args:
+        onnx_file (str): Path to the .onnx file written by export_model.py.
+        intra_op_threads (int, optional): Threads used inside an operator. Default is None (ONNX Runtime default).
+    """
+
+    def __init__(self, onnx_file, intra_op_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(onnx_file, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def __call__(self, xs):
+        outputs = self.session.run(None, {self.input_name: xs.detach().cpu().numpy().astype(np.float32)})
+        if self.output_names == ['params']:
+            return torch.from_numpy(outputs[0])
+        return {name: torch.from_numpy(output) for name, output in zip(self.output_names, outputs)}
+
+def load_model(model_file, num_params, resnet_num, device, backend='torch', intra_op_threads=None):
+    """
+    Loads a model for inference with the given backend.
+
+    Args:
+        model_file (str): Path to the checkpoint file; the exported backends use the file next to it, see exported_file.
+        num_params (int): Number of output parameters, None for a multi-task checkpoint.
+        resnet_num (int): Type of ResNet model.
+        device (torch.device): Device of the model, ignored by the onnx and int8 backends (always CPU).
+        backend (str): 'torch' (eager checkpoint), 'torchscript', 'onnx' or 'int8' (quantized TorchScript). Default is 'torch'.
+        intra_op_threads (int, optional): Threads per operator of an onnx session. The other backends
+                                          use the torch thread setting of the calling thread.
+
+    Returns:
+        Callable mapping a float batch to the outputs (a dict of head outputs for multi-task models).
+    """
+    if backend == 'torch':
+        return build_eager_model(model_file, num_params, resnet_num, device)
+    elif backend in ('torchscript', 'int8'):
+        model = torch.jit.load(exported_file(model_file, backend), map_location=device)
+        model.eval()
+        return model
+    elif backend == 'onnx':
+        return OnnxModel(exported_file(model_file, backend), intra_op_threads)
+    raise ValueError(f"Invalid backend '{backend}'. Must be one of ['torch', 'torchscript', 'onnx', 'int8'].")
+
+class ModelRegistry:
+    """
+    Builds every model once, keeps it in eval mode on the device and predicts batches of images.
+
+    Either the nine single-parameter models of model_params are loaded, or one
+    MultiTaskResnetYarn checkpoint whose heads cover all parameters. The models are
+    built without pretrained weights, so nothing is downloaded before the checkpoints are loaded.
+    With the 'torchscript' and 'onnx' backends the graphs written by export_model.py are used instead,
+    with 'int8' the quantized models written by quantize_model.py.
+
+    Args:
+        model_params (list): (param_name, num_params, model_file, resnet_num) tuples. Default is MODEL_PARAMS.
+        multitask_file (str, optional): Multi-task checkpoint to use instead of model_params.
+        multitask_resnet (int): ResNet type of the multi-task checkpoint. Default is 34.
+        device (torch.device, optional): Defaults to the first GPU if available, else the CPU.
+        warmup_shape (tuple, optional): (width, height) of a dummy batch run once through every model,
+                                        None to skip the warm-up. Default is the training crop (584, 1200).
+        backend (str): 'torch', 'torchscript', 'onnx' (ONNX Runtime on the CPU) or 'int8' (quantized, CPU). Default is 'torch'.
+        intra_op_threads (int, optional): Threads per operator of the onnx sessions. Default is None (ONNX Runtime default).
+    """
 
-    # Load image
-    im = imageio.imread(image_file)
-    if im.shape[2] > 3:
-        im = im[:, :, :3]
+    def __init__(self, model_params=MODEL_PARAMS, multitask_file=None, multitask_resnet=34, device=None, warmup_shape=(584, 1200), backend='torch', intra_op_threads=None):
+        if backend in ('onnx', 'int8'):
+            device = torch.device('cpu')
+        self.device = device or torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        self.backend = backend
+        self.models = {}
 
-    img = np.array(im) / 255.0
-    img = np.transpose(img, (2, 1, 0))
-    img = img.reshape(1, img.shape[0], img.shape[1], img.shape[2])
-    xs = torch.Tensor(img).to(device)
+        if multitask_file:
+            self.models['multitask'] = load_model(multitask_file, None, multitask_resnet, self.device, backend, intra_op_threads)
+        else:
+            for param_name, num_params, model_file, resnet_num in model_params:
+                self.models[param_name] = load_model(model_file, num_params, resnet_num, self.device, backend, intra_op_threads)
 
-    with torch.no_grad():
-        prediction = model(xs)
-        prediction_np = prediction.cpu().numpy()
+        if warmup_shape is not None:
+            self.predict(torch.zeros((1, 3) + tuple(warmup_shape)))
 
-    return prediction_np
+    def predict(self, images):
+        """
+        Predicts all parameters for a batch of images.
+
+        Args:
+            images (torch.Tensor or np.ndarray): Batch of shape (N, 3, width, height) with values in [0, 1].
+
+        Returns:
+            dict: Parameter name to its raw network outputs of shape (N, num_params).
+        """
+        xs = torch.as_tensor(images, dtype=torch.float, device=self.device)
+
+        with torch.no_grad():
+            return {name: prediction.cpu().numpy() for name, prediction in self.forward(xs).items()}
+
+    def forward(self, xs):
+        """
+        Runs all models on a float batch on the device and keeps the outputs as tensors, e.g. as distillation targets.
+
+        Args:
+            xs (torch.Tensor): Batch of shape (N, 3, width, height) with values in [0, 1].
+
+        Returns:
+            dict: Parameter name to its raw network outputs of shape (N, num_params).
+        """
+        predictions = {}
+        for name, model in self.models.items():
+            if name == 'multitask':
+                for head, prediction in model(xs).items():
+                    predictions[MULTITASK_PARAM_NAMES.get(head, head)] = prediction
+            else:
+                predictions[name] = model(xs)
+        return predictions
+
+def postprocess_prediction(param_name, temp, plyradius=None):
+    """
+    Converts a raw network output to the value of the yarn parameter.
+
+    Args:
+        param_name (str): Parameter name, see main.
+        temp (np.ndarray): Raw network output.
+        plyradius (np.ndarray, optional): Predicted ply radius, needed for the ellipse.
+
+    Returns:
+        The parameter value: class index for thickness and number of plies, the ellipse relative to the ply radius.
+    """
+    if param_name == 'thickness':
+        temp = np.argmax(temp) + 1
+    elif param_name == 'numplies':
+        temp = np.argmax(temp) + 2
+    elif param_name == 'ellipse':
+        if plyradius is not None:
+            temp = temp / plyradius
+        else:
+            temp = "plyradius not calculated yet"
+    elif param_name == 'flyaways':
+        temp = temp.flatten()
+    return temp
+
+def print_flyaways(temp):
+    for name, value in zip(FLYAWAY_NAMES, temp):
+        print(f'{name}: {value}')
+
+def yarn_parameters(predictions, index=0):
+    """
+    Collects the postprocessed parameters of one image in a JSON-serializable dict.
+
+    Args:
+        predictions (dict): Parameter name to raw network outputs of shape (N, num_params), see ModelRegistry.predict.
+        index (int): Index of the image in the batch. Default is 0.
+
+    Returns:
+        dict: Parameter name to its value; thickness and numplies are ints, flyaways a dict keyed by FLYAWAY_NAMES.
+    """
+    params = {}
+    plyradius = None
+
+    # MODEL_PARAMS order, the ply radius is needed for the ellipse
+    for param_name, _, _, _ in MODEL_PARAMS:
+        if param_name not in predictions:
+            continue
+        temp = predictions[param_name][index:index + 1]
+        if param_name == 'plyradius':
+            plyradius = temp
+        temp = postprocess_prediction(param_name, temp, plyradius)
+
+        if param_name == 'flyaways':
+            params[param_name] = {name: float(value) for name, value in zip(FLYAWAY_NAMES, temp)}
+        elif isinstance(temp, str):
+            params[param_name] = None
+        elif param_name in ('thickness', 'numplies'):
+            params[param_name] = int(temp)
+        else:
+            params[param_name] = float(np.ravel(temp)[0])
+
+    return params
 
 def main():
     """
     Main function to predict parameters for multiple images and models.
     """
-    dir_images = "../data/Test_yarns/"
-    model_params = [
-        ('thickness', 2, 'models/thickness_resnet18.pth', 18),
-        ('numfibers', 1, 'models/numfibers_resnet18.pth', 18),
-        ('plyradius', 1, 'models/plyradius_resnet18.pth', 18),
-        ('alpha', 1, 'models/alpha_resnet18.pth', 18),
-        ('numplies', 5, 'models/numplies_resnet34.pth', 34),
-        ('yarnradius', 1, 'models/yarnradius_resnet18.pth', 18),
-        ('alphaply', 1, 'models/alphaply_resnet34.pth', 34),
-        ('ellipse', 1, 'models/plyradiusy_resnet18.pth', 18),
-        ('flyaways', 10, 'models/flyaways_resnet18.pth', 18)
-    ]
-
-    fnames_png = glob.glob(os.path.join(dir_images, '*.png'))
+    parser = argparse.ArgumentParser(description="Predict yarn parameters for the test images.")
+    parser.add_argument("--dir-images", default="../data/Test_yarns/")
+    parser.add_argument("--multitask", default=None, help="multi-task checkpoint to use instead of the nine single-parameter models")
+    parser.add_argument("--resnet", type=parse_backbone, default=34, help="ResNet type (or mobilenet_v3_small) of the multi-task checkpoint")
+    parser.add_argument("--batch-size", type=int, default=16, help="images per forward pass")
+    parser.add_argument("--fit", action="store_true", help="center-crop or pad all images to the training size, so they share one bucket")
+    parser.add_argument("--backend", default="torch", choices=["torch", "torchscript", "onnx", "int8"], help="run the checkpoints, their exported graphs (see export_model.py) or their int8 versions (see quantize_model.py)")
+    parser.add_argument("--tiled", action="store_true", help="predict from training-sized windows of each image and aggregate them")
+    parser.add_argument("--stride", type=int, nargs=2, default=[600, 292], metavar=("HEIGHT", "WIDTH"), help="step between the windows of --tiled")
+    parser.add_argument("--aggregate", default="mean", choices=["mean", "median"], help="aggregation of the regression outputs of --tiled")
+    args = parser.parse_args()
+
+    fnames_png = glob.glob(os.path.join(args.dir_images, '*.png'))
     fnames_png.sort()
-    plyradius = None
 
-    for image_file in fnames_png:
+    # Every model is loaded once and reused for all images
+    registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend)
+
+    time_start = time.time()
+    if args.tiled:
+        predictions, spreads, num_tiles = predict_tiled(registry, fnames_png, args.stride, args.aggregate, args.batch_size)
+    else:
+        predictions = predict_images(registry, fnames_png, args.batch_size, TRAINING_SHAPE if args.fit else None)
+    time_predict = time.time() - time_start
+
+    for i, image_file in enumerate(fnames_png):
         print(image_file)
+        if args.tiled:
+            print(f'{num_tiles[i]} tiles, spread: ' + ', '.join(f'{name} {np.round(spread[i], 4).tolist()}' for name, spread in spreads.items()))
 
-        for param_name, num_params, model_file, resnet_num in model_params:
+        # Only the parameters the models predict, a multi-task checkpoint may have a subset of the heads
+        for param_name, value in yarn_parameters(predictions, i).items():
             print(param_name)
-            temp = predict_params(num_params, model_file, image_file, resnet_num)
-            #print(temp)
-            if param_name == 'thickness':
-                temp = np.argmax(temp) + 1
-               # print(temp)
-            elif param_name == 'numplies':
-                temp = np.argmax(temp) + 2
-                #print(temp)
-            elif param_name == 'plyradius':
-                plyradius = temp
-            elif param_name == 'ellipse':
-                if plyradius is not None:
-                    temp = temp / plyradius
-                else:
-                    temp = "plyradius not calculated yet"
-            elif param_name == 'flyaways':
-                temp = temp.flatten()
-                print(f'amount: {temp[0]}')
-                print(f'loop_prob: {temp[1]}')
-                print(f'hair_length_mean: {temp[2]}')
-                print(f'hair_angle: {temp[3]}')
-                print(f'hair_squeeze: {temp[4]}')
-                print(f'loop_length_mean: {temp[5]}')
-                print(f'loop_distance_mean: {temp[6]}')
-                print(f'loop_distance_std: {temp[7]}')
-                print(f'jitter_xy: {temp[8]}')
-                print(f'migration: {temp[9]}')
-            print(temp)
+            if param_name == 'flyaways':
+                print_flyaways(list(value.values()))
+            else:
+                print(value)
+
+    print(f'{len(fnames_png)} images in {time_predict:.2f} s, {len(fnames_png) / max(time_predict, 1e-9):.2f} images/s')
 
 if __name__ == "__main__":
     main()
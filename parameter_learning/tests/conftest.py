@@ -0,0 +1,20 @@
+import os
+import sys
+
+# The modules of parameter_learning import each other by their flat names (from network import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from dataset_fixtures import write_sample
+
+@pytest.fixture
+def dataset_folder(tmp_path):
+    """A dataset folder with three synthetic samples."""
+    folder = tmp_path / 'dataset'
+    folder.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        write_sample(folder, i, rng)
+    return folder
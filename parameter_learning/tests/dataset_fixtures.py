@@ -0,0 +1,27 @@
+import json
+
+import imageio
+import numpy as np
+
+from dataloader import PARAM_CONFIGS
+
+# Height and width of the synthetic renders, the smallest size the training crop (1200 x 584 at a left offset below 28) fits in
+RENDER_SHAPE = (1210, 620)
+
+def write_sample(folder, i, rng):
+    """Writes Yarn_<i>.png and a Yarn_<i>.json that has every field of PARAM_CONFIGS."""
+    image = rng.integers(0, 256, size=RENDER_SHAPE + (4,), dtype=np.uint8)
+    imageio.imwrite(folder / f'Yarn_{i:04}.png', image)
+
+    yarn = {}
+    for param_config in PARAM_CONFIGS.values():
+        for param, keys in param_config.items():
+            node = yarn
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = float(rng.uniform(0.0, 1.0))
+    yarn['thickness']['fiber_thickness_y'] = float(rng.choice([0.011, 0.018]))
+    yarn['fiber']['placement_params']['num_points'] = int(rng.integers(2, 7))
+    with open(folder / f'Yarn_{i:04}.json', 'w') as json_file:
+        json.dump(yarn, json_file)
+    return image
@@ -0,0 +1,21 @@
+import benchmark
+
+def test_failed_backend_is_skipped_for_the_rest_of_the_suite(monkeypatch):
+    builds = []
+    build_backend = benchmark.build_backend
+    def failing_build_backend(model, backend, example, threads, tmp_dir):
+        builds.append(backend)
+        if backend == 'onnx':
+            raise ImportError('onnxruntime is broken')
+        return build_backend(model, backend, example, threads, tmp_dir)
+    monkeypatch.setattr(benchmark, 'build_backend', failing_build_backend)
+
+    results, unavailable = benchmark.run_suite([18, 34], ['onnx', 'eager'], [1, 2], [(64, 32), (96, 32)], [1, 2],
+                                               warmup=0, repetitions=1)
+
+    assert builds.count('onnx') == 1
+    assert builds.count('eager') == 2 * 2 * 2
+    assert unavailable == {'onnx': 'onnxruntime is broken'}
+    assert len(results) == 2 * 2 * 2 * 2 and {result['backend'] for result in results} == {'eager'}
+    assert {(result['backbone'], result['threads'], result['input_size'], result['batch_size']) for result in results} == \
+        {(backbone, threads, size, batch_size) for backbone in (18, 34) for threads in (1, 2) for size in ('64x32', '96x32') for batch_size in (1, 2)}
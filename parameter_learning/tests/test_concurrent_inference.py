@@ -0,0 +1,30 @@
+import numpy as np
+import torch
+
+from network import MultiTaskResnetYarn
+from test import ModelRegistry, yarn_parameters
+from concurrent_inference import ConcurrentExecutor
+
+def write_two_head_checkpoint(model_file):
+    model = MultiTaskResnetYarn(18, {'num_plies': 5, 'plyradiusy': 1}, pretrained=False)
+    torch.save({'state_dict': model.state_dict()}, model_file)
+
+def test_multitask_heads_are_renamed(tmp_path):
+    model_file = str(tmp_path / 'multitask.pth')
+    write_two_head_checkpoint(model_file)
+    registry = ModelRegistry(multitask_file=model_file, multitask_resnet=18, device=torch.device('cpu'), warmup_shape=None)
+    executor = ConcurrentExecutor(registry, inter_op=2, intra_op=1)
+    xs = torch.rand((2, 3, 64, 128))
+
+    try:
+        predictions = executor.predict(xs)
+        params = executor.predict_params(xs)
+    finally:
+        executor.shutdown()
+
+    expected = registry.predict(xs)
+    assert sorted(predictions) == sorted(expected) == ['ellipse', 'numplies']
+    for name in expected:
+        np.testing.assert_allclose(predictions[name], expected[name], rtol=1e-5, atol=1e-6)
+    assert params == [yarn_parameters(expected, i) for i in range(2)]
+    assert set(params[0]) == {'numplies', 'ellipse'}
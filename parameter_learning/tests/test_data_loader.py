@@ -0,0 +1,46 @@
+import numpy as np
+import torch
+
+from dataloader import EpochSampler, YarnDataset, make_data_loader
+
+def load_epochs(dataset, num_workers, epochs=(0, 1)):
+    loader = make_data_loader(dataset, batch_size=2, num_workers=num_workers, seed=3)
+    batches = []
+    for epoch in epochs:
+        loader.sampler.set_epoch(epoch)
+        batches.append([(inputs.clone(), indices.clone()) for inputs, _, indices in loader])
+    return batches
+
+def test_sampler_order_follows_the_epoch_seed():
+    sampler = EpochSampler(10, seed=3)
+    first = list(sampler)
+    assert first == list(sampler)
+    assert all(seed == 3 for seed, _ in first)
+    assert sorted(index for _, index in first) == list(range(10))
+
+    sampler.set_epoch(1)
+    second = list(sampler)
+    assert all(seed == 4 for seed, _ in second)
+    assert [index for _, index in second] != [index for _, index in first]
+
+    assert list(EpochSampler(4, shuffle=False, seed=3)) == [(3, 0), (3, 1), (3, 2), (3, 3)]
+
+def test_crops_depend_only_on_the_seed_and_the_sample(dataset_folder):
+    dataset = YarnDataset(str(dataset_folder), 'alphaply')
+    inputs, _, index = dataset[(5, 1)]
+    assert index == 1
+    np.testing.assert_array_equal(inputs, dataset[(5, 1)][0])
+    assert not np.array_equal(inputs, dataset[(6, 1)][0])
+
+def test_batches_do_not_depend_on_the_number_of_workers(dataset_folder):
+    dataset = YarnDataset(str(dataset_folder), 'alphaply')
+    expected = load_epochs(dataset, 0)
+    # Different epochs draw different crops
+    assert not all(torch.equal(a[0], b[0]) for a, b in zip(*expected))
+
+    for num_workers in (1, 2):
+        for batches, expected_batches in zip(load_epochs(dataset, num_workers), expected):
+            assert len(batches) == len(expected_batches)
+            for (inputs, indices), (expected_inputs, expected_indices) in zip(batches, expected_batches):
+                assert torch.equal(indices, expected_indices)
+                assert torch.equal(inputs, expected_inputs)
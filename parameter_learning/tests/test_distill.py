@@ -0,0 +1,44 @@
+import pytest
+import torch
+
+# distill.py logs with tensorboard, like train.py
+pytest.importorskip('tensorboard')
+
+from distill import distillation_loss
+from train import FLYAWAY_WEIGHTS
+
+@pytest.fixture
+def outputs():
+    generator = torch.Generator().manual_seed(0)
+    teacher = {'numplies': torch.randn((4, 5), generator=generator), 'alpha': torch.randn((4, 1), generator=generator),
+               'flyaways': torch.randn((4, 10), generator=generator)}
+    student = {name: torch.randn(value.shape, generator=generator, requires_grad=True) for name, value in teacher.items()}
+    return student, teacher
+
+def test_loss_is_zero_for_the_teacher_outputs(outputs):
+    _, teacher = outputs
+    total, head_losses = distillation_loss(teacher, teacher, 2.0, {})
+    assert float(total) == pytest.approx(0.0, abs=1e-6)
+    assert head_losses == pytest.approx({'numplies': 0.0, 'alpha': 0.0, 'flyaways': 0.0}, abs=1e-6)
+
+def test_per_head_losses(outputs):
+    student, teacher = outputs
+    temperature = 3.0
+    total, head_losses = distillation_loss(student, teacher, temperature, {'alpha': 0.5})
+
+    p_teacher = torch.softmax(teacher['numplies'] / temperature, dim=1)
+    log_p_student = torch.log_softmax(student['numplies'] / temperature, dim=1)
+    kl = (p_teacher * (p_teacher.log() - log_p_student)).sum(dim=1).mean() * temperature ** 2
+    weights = torch.tensor(FLYAWAY_WEIGHTS).reshape(1, -1)
+    expected = {
+        'numplies': float(kl),
+        'alpha': float((student['alpha'] - teacher['alpha']).abs().mean()),
+        'flyaways': float(((student['flyaways'] - teacher['flyaways']) * weights).abs().mean())
+    }
+    assert head_losses == pytest.approx(expected, rel=1e-5)
+    assert float(total) == pytest.approx(expected['numplies'] + 0.5 * expected['alpha'] + expected['flyaways'], rel=1e-5)
+
+    # Only the student is trained
+    total.backward()
+    assert all(student[name].grad is not None for name in student)
+    assert all(not value.requires_grad for value in teacher.values())
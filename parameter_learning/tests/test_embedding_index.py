@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from embedding_index import find_duplicates, top_k
+
+def normalized(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+@pytest.fixture
+def embeddings():
+    # 50 random rows and near copies of rows 3, 17 and 40 (twice)
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(50, 32))
+    copies = rows[[3, 17, 40, 40]] + 0.01 * rng.normal(size=(4, 32))
+    return normalized(np.concatenate([rows, copies])).astype(np.float16)
+
+def brute_force_duplicates(embeddings, threshold):
+    scores = embeddings.astype(np.float32) @ embeddings.astype(np.float32).T
+    return [(i, j) for i in range(len(scores)) for j in range(i + 1, len(scores)) if scores[i, j] >= threshold]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 16, 54, 4096])
+def test_duplicates_do_not_depend_on_the_tiling(embeddings, chunk_size):
+    pairs = find_duplicates(embeddings, 0.99, chunk_size)
+    assert [(i, j) for i, j, _ in pairs] == brute_force_duplicates(embeddings, 0.99)
+    assert [(i, j) for i, j, _ in pairs] == [(3, 50), (17, 51), (40, 52), (40, 53), (52, 53)]
+    scores = embeddings.astype(np.float32) @ embeddings.astype(np.float32).T
+    for i, j, similarity in pairs:
+        assert similarity == pytest.approx(scores[i, j], abs=1e-6)
+
+def test_top_k_is_exact(embeddings):
+    queries = normalized(np.random.default_rng(1).normal(size=(3, 32)))
+    indices, similarities = top_k(embeddings, queries, k=4, chunk_size=10)
+
+    scores = queries.astype(np.float32) @ embeddings.astype(np.float32).T
+    np.testing.assert_array_equal(indices, np.argsort(-scores, axis=1)[:, :4])
+    np.testing.assert_allclose(similarities, np.take_along_axis(scores, indices, axis=1), atol=1e-6)
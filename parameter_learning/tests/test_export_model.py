@@ -0,0 +1,50 @@
+import os
+
+import pytest
+import torch
+
+from network import MultiTaskResnetYarn, ResnetYarn
+from export_model import check_parity, export_checkpoint
+from test import build_eager_model, exported_file, load_model
+
+@pytest.fixture
+def single_checkpoint(tmp_path):
+    model_file = str(tmp_path / 'alpha_resnet18.pth')
+    torch.save({'state_dict': ResnetYarn(18, 1, -1, pretrained=False).state_dict()}, model_file)
+    return model_file
+
+@pytest.fixture
+def multitask_checkpoint(tmp_path):
+    model_file = str(tmp_path / 'multitask.pth')
+    model = MultiTaskResnetYarn(18, {'num_plies': 5, 'alpha': 1}, pretrained=False)
+    torch.save({'state_dict': model.state_dict()}, model_file)
+    return model_file
+
+@pytest.mark.parametrize('backend', ['torchscript', 'onnx'])
+def test_single_model_matches_eager_mode(single_checkpoint, backend):
+    output_file = export_checkpoint(single_checkpoint, 1, 18, backend)
+    assert output_file == exported_file(single_checkpoint, backend) and os.path.isfile(output_file)
+
+    device = torch.device('cpu')
+    eager = build_eager_model(single_checkpoint, 1, 18, device)
+    exported = load_model(single_checkpoint, 1, 18, device, backend)
+    assert check_parity(eager, exported, [1, 2, 5], (64, 128), atol=1e-4) <= 1e-4
+
+@pytest.mark.parametrize('backend', ['torchscript', 'onnx'])
+def test_multitask_model_matches_eager_mode(multitask_checkpoint, backend):
+    export_checkpoint(multitask_checkpoint, None, 18, backend)
+
+    device = torch.device('cpu')
+    eager = build_eager_model(multitask_checkpoint, None, 18, device)
+    exported = load_model(multitask_checkpoint, None, 18, device, backend)
+    outputs = exported(torch.rand((2, 3, 64, 128)))
+    assert sorted(outputs) == ['alpha', 'num_plies']
+    assert outputs['num_plies'].shape == (2, 5) and outputs['alpha'].shape == (2, 1)
+    assert check_parity(eager, exported, [1, 3], (64, 128), atol=1e-4) <= 1e-4
+
+def test_parity_check_fails_for_a_different_model(single_checkpoint):
+    device = torch.device('cpu')
+    eager = build_eager_model(single_checkpoint, 1, 18, device)
+    other = ResnetYarn(18, 1, -1, pretrained=False).eval()
+    with pytest.raises(AssertionError):
+        check_parity(eager, other, [2], (64, 128), atol=1e-4)
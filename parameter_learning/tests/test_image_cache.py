@@ -0,0 +1,48 @@
+import os
+import pickle
+
+import imageio
+import numpy as np
+
+from dataset_fixtures import write_sample
+from dataloader import YarnDataset, image_cache_files, load_image_cache, read_files
+
+def test_cache_holds_the_decoded_images(dataset_folder):
+    fnames_png, _ = read_files(str(dataset_folder))
+    cache_file = load_image_cache(fnames_png, None, num_workers=2)
+    assert cache_file == image_cache_files(str(dataset_folder))[0]
+
+    ims = np.load(cache_file, mmap_mode='r')
+    assert ims.shape == (3, 3, 620, 1210) and ims.dtype == np.uint8
+    for i, fn_png in enumerate(fnames_png):
+        np.testing.assert_array_equal(ims[i], np.transpose(imageio.imread(fn_png)[:, :, :3], (2, 1, 0)))
+
+def test_cache_is_rebuilt_only_when_a_file_changes(dataset_folder):
+    fnames_png, _ = read_files(str(dataset_folder))
+    cache_file = load_image_cache(fnames_png, None)
+    mtime = os.stat(cache_file).st_mtime_ns
+
+    assert load_image_cache(fnames_png, None) == cache_file
+    assert os.stat(cache_file).st_mtime_ns == mtime
+
+    image = write_sample(dataset_folder, 1, np.random.default_rng(1))
+    load_image_cache(fnames_png, None)
+    np.testing.assert_array_equal(np.load(cache_file, mmap_mode='r')[1], np.transpose(image[:, :, :3], (2, 1, 0)))
+
+def test_crops_are_slices_of_the_cache(dataset_folder, tmp_path):
+    dataset = YarnDataset(str(dataset_folder), 'flyaways', cache_dir=str(tmp_path / 'cache'))
+    assert dataset.cache_file == str(tmp_path / 'cache' / 'images_uint8.npy')
+
+    inputs, label, index = dataset[(5, 2)]
+    assert inputs.shape == (3, 584, 1200) and inputs.dtype == np.uint8 and inputs.flags['C_CONTIGUOUS']
+    assert index == 2 and label.shape == (10,)
+    ims = np.load(dataset.cache_file)
+    found = [(left, bottom) for left in range(8, 28) for bottom in range(0, 10)
+             if np.array_equal(ims[2, :, left:left + 584, bottom:bottom + 1200], inputs)]
+    assert len(found) == 1
+
+    # loader workers get the dataset without the open memory map and reopen it
+    _ = dataset.ims
+    copy = pickle.loads(pickle.dumps(dataset))
+    assert copy._ims is None
+    np.testing.assert_array_equal(copy[(5, 2)][0], inputs)
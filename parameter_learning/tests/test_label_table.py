@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+import dataloader
+from dataset_fixtures import write_sample
+from dataloader import PARAM_CONFIGS, initialize_param_storage, load_label_table, process_params, read_files, table_labels
+from utils import read_file
+
+def expected_labels(fnames_json, param_config):
+    param_arrays = initialize_param_storage(len(fnames_json), param_config)
+    for i, fn_json in enumerate(fnames_json):
+        process_params(read_file(fn_json), param_config, param_arrays, i)
+    return param_arrays
+
+def count_json_reads(monkeypatch):
+    """Record the sample files the label table parses."""
+    reads = []
+    def counting_read_file(fn):
+        if os.path.basename(fn) != 'labels.json':
+            reads.append(os.path.basename(fn))
+        return read_file(fn)
+    monkeypatch.setattr(dataloader, 'read_file', counting_read_file)
+    return reads
+
+def test_labels_match_process_params(dataset_folder):
+    _, fnames_json = read_files(str(dataset_folder))
+    table = load_label_table(fnames_json)
+    assert list(table['samples']) == ['Yarn_0000', 'Yarn_0001', 'Yarn_0002']
+    for param_config in PARAM_CONFIGS.values():
+        param_arrays, labels = table_labels(table, param_config)
+        expected = expected_labels(fnames_json, param_config)
+        assert list(param_arrays) == list(expected)
+        np.testing.assert_array_equal(labels, np.stack(list(expected.values()), axis=1))
+
+def test_only_modified_files_are_read_again(dataset_folder, monkeypatch):
+    _, fnames_json = read_files(str(dataset_folder))
+    load_label_table(fnames_json)
+    reads = count_json_reads(monkeypatch)
+
+    load_label_table(fnames_json)
+    assert reads == []
+
+    write_sample(dataset_folder, 1, np.random.default_rng(1))
+    stat = os.stat(fnames_json[1])
+    os.utime(fnames_json[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    table = load_label_table(fnames_json)
+    assert reads == ['Yarn_0001.json']
+    np.testing.assert_array_equal(table['amount'], expected_labels(fnames_json, PARAM_CONFIGS['flyaways'])['amount'])
+
+def test_rows_follow_added_and_removed_files(dataset_folder, monkeypatch):
+    _, fnames_json = read_files(str(dataset_folder))
+    old_table = load_label_table(fnames_json)
+    reads = count_json_reads(monkeypatch)
+
+    os.remove(dataset_folder / 'Yarn_0000.png')
+    os.remove(dataset_folder / 'Yarn_0000.json')
+    write_sample(dataset_folder, 3, np.random.default_rng(3))
+    _, fnames_json = read_files(str(dataset_folder))
+    table = load_label_table(fnames_json)
+
+    assert reads == ['Yarn_0003.json']
+    assert list(table['samples']) == ['Yarn_0001', 'Yarn_0002', 'Yarn_0003']
+    np.testing.assert_array_equal(table['alpha_ply'][:2], old_table['alpha_ply'][1:])
+    np.testing.assert_array_equal(table['alpha_ply'], expected_labels(fnames_json, PARAM_CONFIGS['alphaply'])['alpha_ply'])
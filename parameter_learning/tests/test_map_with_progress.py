@@ -0,0 +1,33 @@
+import threading
+import time
+
+import pytest
+
+from dataloader import map_with_progress
+
+def test_results_keep_the_input_order(capsys):
+    threads = set()
+    def slow_square(x):
+        # later items finish first
+        time.sleep(0.002 * (10 - x))
+        threads.add(threading.get_ident())
+        return x * x
+
+    assert map_with_progress(slow_square, list(range(10)), num_workers=4, description='Squaring') == [x * x for x in range(10)]
+    assert len(threads) > 1
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[-1].startswith('Squaring 10 / 10:') and '(4 threads)' in lines[-1]
+
+def test_progress_is_reported_at_the_interval(capsys):
+    map_with_progress(lambda x: time.sleep(0.01), list(range(5)), num_workers=1, interval=0.0)
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(':')[0] for line in lines] == [f'Processing {i} / 5' for i in range(1, 6)]
+
+def test_empty_input_and_errors():
+    assert map_with_progress(str, []) == []
+    def fail(x):
+        if x == 3:
+            raise ValueError('bad file')
+        return x
+    with pytest.raises(ValueError, match='bad file'):
+        map_with_progress(fail, list(range(6)), num_workers=2)
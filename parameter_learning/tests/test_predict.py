@@ -0,0 +1,72 @@
+import sys
+
+import imageio
+import numpy as np
+import pytest
+import torch
+
+import test
+from network import MultiTaskResnetYarn
+
+@pytest.fixture
+def photo_folder(tmp_path):
+    folder = tmp_path / 'photos'
+    folder.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        imageio.imwrite(folder / f'photo_{i}.png', rng.integers(0, 256, size=(64, 96, 3), dtype=np.uint8))
+    return folder
+
+def test_main_prints_the_heads_of_a_partial_multitask_checkpoint(photo_folder, tmp_path, monkeypatch, capsys):
+    model_file = str(tmp_path / 'multitask.pth')
+    model = MultiTaskResnetYarn(18, {'num_plies': 5, 'plyradius': 1, 'plyradiusy': 1}, pretrained=False)
+    torch.save({'state_dict': model.state_dict()}, model_file)
+
+    monkeypatch.setattr(sys, 'argv', ['test.py', '--dir-images', str(photo_folder), '--multitask', model_file, '--resnet', '18'])
+    test.main()
+    lines = capsys.readouterr().out.splitlines()
+
+    for name in ('numplies', 'plyradius', 'ellipse'):
+        assert lines.count(name) == 3
+    for name in ('thickness', 'alpha', 'flyaways'):
+        assert name not in lines
+
+class MeanRegistry:
+    """Predicts the mean of every image and logs the batch sizes."""
+
+    device = torch.device('cpu')
+
+    def __init__(self, events):
+        self.events = events
+
+    def predict(self, batch):
+        self.events.append(('predict', len(batch)))
+        return {'alpha': batch.mean(dim=(1, 2, 3)).numpy()[:, None]}
+
+def test_images_are_decoded_one_batch_at_a_time(tmp_path, monkeypatch):
+    # Seven images of two sizes, in mixed order
+    rng = np.random.default_rng(0)
+    image_files, means = [], []
+    for i, height in enumerate([64, 64, 48, 64, 48, 64, 64]):
+        image = rng.integers(0, 256, size=(height, 96, 3), dtype=np.uint8)
+        image_files.append(str(tmp_path / f'photo_{i}.png'))
+        imageio.imwrite(image_files[-1], image)
+        means.append(image.mean() / 255.0)
+
+    events = []
+    decode_image = test.decode_image
+    def logging_decode_image(image_file, fit_shape=None):
+        events.append(('decode', 1))
+        return decode_image(image_file, fit_shape)
+    monkeypatch.setattr(test, 'decode_image', logging_decode_image)
+
+    predictions = test.predict_images(MeanRegistry(events), image_files, batch_size=2)
+    np.testing.assert_allclose(predictions['alpha'][:, 0], means, rtol=1e-5)
+    # A bucket is run as soon as it is full, before the next files are decoded, and the partial batches at the end
+    decode, predict = ('decode', 1), ('predict', 2)
+    assert events == [decode, decode, predict, decode, decode, decode, decode, predict, predict, decode, ('predict', 1)]
+
+    events.clear()
+    predictions = test.predict_images(MeanRegistry(events), image_files, batch_size=3, fit_shape=(56, 96))
+    assert predictions['alpha'].shape == (7, 1)
+    assert [size for event, size in events if event == 'predict'] == [3, 3, 1]
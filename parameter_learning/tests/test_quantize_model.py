@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import torch
+
+from network import MultiTaskResnetYarn
+from quantize_model import accuracy_report, quantize_checkpoint
+from test import FLYAWAY_NAMES, exported_file, load_model
+
+def random_batches(num_batches, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.rand((2, 3, 64, 128), generator=generator) for _ in range(num_batches)]
+
+def test_accuracy_report():
+    fp32 = {'numplies': np.array([[0.0, 1.0], [1.0, 0.0]]), 'alpha': np.array([[1.0], [3.0]]),
+            'flyaways': np.ones((2, len(FLYAWAY_NAMES)))}
+    int8 = {'numplies': np.array([[0.0, 1.0], [0.0, 2.0]]), 'alpha': np.array([[1.5], [2.5]]),
+            'flyaways': np.ones((2, len(FLYAWAY_NAMES)))}
+    report = accuracy_report(fp32, int8)
+
+    assert report['numplies'] == {'class_agreement': 0.5, 'max_abs_logit_error': 2.0}
+    assert report['alpha'] == {'mean_abs_error': 0.5, 'max_abs_error': 0.5, 'relative_error': 0.25}
+    assert sorted(name for name in report if name.startswith('flyaways.')) == sorted(f'flyaways.{name}' for name in FLYAWAY_NAMES)
+    assert report['flyaways.amount']['max_abs_error'] == 0.0
+
+def test_quantized_multitask_checkpoint(tmp_path):
+    model_file = str(tmp_path / 'multitask.pth')
+    model = MultiTaskResnetYarn(18, {'num_plies': 5, 'plyradiusy': 1}, pretrained=False)
+    torch.save({'state_dict': model.state_dict()}, model_file)
+
+    report = quantize_checkpoint(model_file, None, 18, random_batches(4, 0), random_batches(2, 1))
+    assert os.path.isfile(exported_file(model_file, 'int8'))
+    assert sorted(report) == ['ellipse', 'numplies']
+    assert 0.0 <= report['numplies']['class_agreement'] <= 1.0
+    assert np.isfinite(report['ellipse']['mean_abs_error'])
+
+    # The saved int8 graph is what the 'int8' backend of test.py runs
+    quantized = load_model(model_file, None, 18, torch.device('cpu'), 'int8')
+    with torch.no_grad():
+        outputs = quantized(random_batches(1, 2)[0])
+    assert outputs['num_plies'].shape == (2, 5) and outputs['plyradiusy'].shape == (2, 1)
+    kinds = {node.kind() for node in quantized.inlined_graph.nodes()}
+    assert {'quantized::conv2d_relu', 'quantized::linear'} <= kinds
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from server import MicroBatcher
+
+class FakeRegistry:
+    """Predicts the mean of every image as 'alpha' and records the batch sizes; can be held before predicting."""
+
+    device = 'cpu'
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def predict(self, batch):
+        self.started.set()
+        self.release.wait()
+        self.batch_sizes.append(len(batch))
+        if (batch < 0).any():
+            raise ValueError('negative image')
+        return {'alpha': batch.mean(dim=(1, 2, 3)).numpy()[:, None]}
+
+def image(value, shape=(3, 8, 4)):
+    return np.full(shape, value, dtype=np.uint8)
+
+def submit_all(batcher, images):
+    results = [None] * len(images)
+    def submit(i):
+        results[i] = batcher.submit(images[i])
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def wait_for_queue(batcher, depth):
+    while batcher.stats()['queue_depth'] < depth:
+        time.sleep(0.001)
+
+def test_lone_request_waits_for_the_window():
+    registry = FakeRegistry()
+    batcher = MicroBatcher(registry, max_batch_size=4, window_ms=50.0)
+    time_start = time.perf_counter()
+    assert batcher.submit(image(51)) == pytest.approx({'alpha': 0.2})
+    assert time.perf_counter() - time_start >= 0.05
+    assert registry.batch_sizes == [1]
+
+def test_waiting_requests_are_batched_up_to_the_maximum():
+    registry = FakeRegistry()
+    batcher = MicroBatcher(registry, max_batch_size=4, window_ms=1.0)
+    # The first request occupies the batcher while six more queue up
+    registry.release.clear()
+    threads, results = submit_all(batcher, [image(0)])
+    registry.started.wait()
+    more_threads, more_results = submit_all(batcher, [image(value) for value in range(1, 7)])
+    wait_for_queue(batcher, 6)
+    registry.release.set()
+    for thread in threads + more_threads:
+        thread.join()
+
+    assert registry.batch_sizes == [1, 4, 2]
+    assert [result['alpha'] for result in results + more_results] == pytest.approx([value / 255.0 for value in range(7)])
+    stats = batcher.stats()
+    assert stats['requests'] == 7 and stats['batches'] == 3 and stats['max_queue_depth'] == 6
+    assert stats['mean_batch_size'] == pytest.approx(7 / 3)
+    assert stats['latency_p50_ms'] is not None
+
+def test_batches_are_split_by_image_shape():
+    registry = FakeRegistry()
+    batcher = MicroBatcher(registry, max_batch_size=8, window_ms=1.0)
+    registry.release.clear()
+    threads, _ = submit_all(batcher, [image(0)])
+    registry.started.wait()
+    more_threads, results = submit_all(batcher, [image(10), image(20, (3, 4, 4)), image(30)])
+    wait_for_queue(batcher, 3)
+    registry.release.set()
+    for thread in threads + more_threads:
+        thread.join()
+
+    assert sorted(registry.batch_sizes) == [1, 1, 2]
+    assert [result['alpha'] for result in results] == pytest.approx([10 / 255.0, 20 / 255.0, 30 / 255.0])
+
+def test_errors_are_raised_in_the_submitting_thread():
+    class FailingRegistry(FakeRegistry):
+        def predict(self, batch):
+            return super().predict(batch - 1.0)
+
+    batcher = MicroBatcher(FailingRegistry(), window_ms=1.0)
+    with pytest.raises(ValueError):
+        batcher.submit(image(0))
+    assert batcher.stats()['errors'] == 1
@@ -0,0 +1,72 @@
+import json
+import os
+
+import imageio
+import numpy as np
+import pytest
+import torch
+
+from watch import DirectoryWatcher, StreamingPipeline, read_done_images
+
+class MeanRegistry:
+    """Predicts the mean of every image as 'alpha'."""
+
+    device = torch.device('cpu')
+
+    def predict(self, batch):
+        return {'alpha': batch.mean(dim=(1, 2, 3)).numpy()[:, None]}
+
+def write_photo(folder, name, value, shape=(32, 48, 3)):
+    imageio.imwrite(folder / name, np.full(shape, value, dtype=np.uint8))
+
+def read_records(output_file):
+    with open(output_file) as f:
+        return [json.loads(line) for line in f]
+
+def test_images_are_reported_once_they_stop_changing(tmp_path):
+    write_photo(tmp_path, 'a.png', 0)
+    (tmp_path / 'notes.txt').write_text('not an image')
+    watcher = DirectoryWatcher(str(tmp_path), done={'done.png'})
+    write_photo(tmp_path, 'done.png', 0)
+
+    assert watcher.poll() == []
+    write_photo(tmp_path, 'b.png', 0)
+    assert watcher.poll() == [str(tmp_path / 'a.png')]
+
+    # b.png is still being written
+    stat = os.stat(tmp_path / 'b.png')
+    os.utime(tmp_path / 'b.png', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert watcher.poll() == []
+    assert watcher.poll() == [str(tmp_path / 'b.png')]
+    assert watcher.poll() == []
+
+def test_done_images_survive_a_partial_last_line(tmp_path):
+    output_file = tmp_path / 'predictions.jsonl'
+    output_file.write_text(json.dumps({'image': 'a.png'}) + '\n' + json.dumps({'image': 'b.png'}) + '\n{"image": "c.p')
+    assert read_done_images(str(output_file)) == {'a.png', 'b.png'}
+    assert read_done_images(str(tmp_path / 'missing.jsonl')) == set()
+
+def test_pipeline_predicts_every_image_once(tmp_path):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    for i in range(5):
+        write_photo(photos, f'photo_{i}.png', 50 * i, (32, 48, 3) if i % 2 else (40, 48, 3))
+    (photos / 'broken.png').write_bytes(b'not a png')
+    output_file = str(tmp_path / 'predictions.jsonl')
+
+    pipeline = StreamingPipeline(MeanRegistry(), str(photos), output_file, num_decoders=2, max_batch_size=3,
+                                 queue_size=2, interval=0.01, verbose=False)
+    pipeline.run(once=True)
+
+    records = {record['image']: record for record in read_records(output_file)}
+    assert sorted(records) == ['broken.png'] + [f'photo_{i}.png' for i in range(5)]
+    assert 'error' in records['broken.png']
+    for i in range(5):
+        assert records[f'photo_{i}.png']['params'] == pytest.approx({'alpha': 50 * i / 255.0})
+        assert records[f'photo_{i}.png']['latency_s'] >= 0
+    assert pipeline.counters['images'] == 6 and pipeline.counters['errors'] == 1
+
+    # A restarted run skips the images of the output file
+    write_photo(photos, 'photo_5.png', 250)
+    StreamingPipeline(MeanRegistry(), str(photos), output_file, interval=0.01, verbose=False).run(once=True)
+    assert [record['image'] for record in read_records(output_file)][6:] == ['photo_5.png']
@@ -2,22 +2,25 @@
 import numpy as np
 import time
 import torch
-from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 from datetime import datetime
 import socket
 import os
 
-from dataloader import YarnDataset
+from dataloader import YarnDataset, make_data_loader, to_float_batch
 from utils import export, read_file
 from network import ResnetYarn
 
-def initialize_experiment(config_file='config.json'):
+# Per-parameter weights of the flyaways L1 loss, they bring the ten parameters to a similar scale
+FLYAWAY_WEIGHTS = [0.1, 32, 7, 20, 32, 3, 3, 10, 1086, 106]
+
+def initialize_experiment(config_file='config.json', output_name=None):
     """
     Initialize experiment configuration, directories, and logging.
 
     Args:
         config_file (str): Path to the configuration file. Defaults to 'config.json'.
+        output_name (str, optional): Name of the output directory. Defaults to the paramFlag of the configuration.
 
     Returns:
         tuple: Contains configuration dictionary, training input base path, validation input base path, 
@@ -27,7 +30,7 @@ def initialize_experiment(config_file='config.json'):
 
     input_base_train = config['inputBaseTrain']
     input_base_val = config['inputBaseVal']
-    output_dir = config['outputPath'] + config['paramFlag']
+    output_dir = config['outputPath'] + (output_name or config['paramFlag'])
     checkpoint_dir = os.path.join(output_dir, 'checkpoints')
 
     # Create directories if they don't exist
@@ -55,7 +58,7 @@ def get_loss_function(param_flag):
     else:
         return torch.nn.L1Loss(reduction='mean'), 1
 
-def setup_device_and_model(resnet_num, num_params, freeze, device_ids):
+def setup_device_and_model(resnet_num, num_params, freeze, device_ids, weights_path=None):
     """
     Setup the device and model for training.
 
@@ -64,11 +67,12 @@ def setup_device_and_model(resnet_num, num_params, freeze, device_ids):
         num_params (int): Number of parameters for the model output.
         freeze (int): Number of ResNet blocks to freeze (-1 for no freezing).
         device_ids (list): List of device IDs for multi-GPU setup.
+        weights_path (str, optional): Local ImageNet weight file or torch hub cache directory.
 
     Returns:
         tuple: Contains the model and the device.
     """
-    model = ResnetYarn(resnet_num, num_params, freeze)
+    model = ResnetYarn(resnet_num, num_params, freeze, weights_path=weights_path)
     device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
     model = model.to(device)
 
@@ -77,7 +81,7 @@ def setup_device_and_model(resnet_num, num_params, freeze, device_ids):
 
     return model, device
 
-def setup_dataloaders(input_base_train, input_base_val, param_flag, batch_size):
+def setup_dataloaders(input_base_train, input_base_val, param_flag, batch_size, cache_dir=None, load_workers=None, num_workers=0, prefetch_factor=2, seed=0):
     """
     Setup training and validation data loaders.
 
@@ -86,15 +90,23 @@ def setup_dataloaders(input_base_train, input_base_val, param_flag, batch_size):
         input_base_val (str): Path to the validation dataset.
         param_flag (str): Parameter flag indicating the type of parameter.
         batch_size (int): Batch size for the data loaders.
+        cache_dir (str, optional): Directory for the uint8 image caches, one subdirectory per dataset.
+                                   Defaults to a 'cache' directory inside each dataset folder.
+        load_workers (int, optional): Threads decoding and reading the dataset files. Defaults to the number of CPUs.
+        num_workers (int): Loader processes per data loader, 0 to load in the main process. Default is 0.
+        prefetch_factor (int): Batches loaded in advance by each loader process. Default is 2.
+        seed (int): Seed of the crops and the order of epoch 0, see EpochSampler. Default is 0.
 
     Returns:
         tuple: Contains the training and validation data loaders.
     """
-    train_dataset = YarnDataset(input_base_train, param_flag)
-    val_dataset = YarnDataset(input_base_val, param_flag)
+    train_cache_dir = os.path.join(cache_dir, 'train') if cache_dir else None
+    val_cache_dir = os.path.join(cache_dir, 'val') if cache_dir else None
+    train_dataset = YarnDataset(input_base_train, param_flag, train_cache_dir, load_workers)
+    val_dataset = YarnDataset(input_base_val, param_flag, val_cache_dir, load_workers)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
+    train_loader = make_data_loader(train_dataset, batch_size, True, num_workers, prefetch_factor, seed=seed)
+    val_loader = make_data_loader(val_dataset, batch_size, True, num_workers, prefetch_factor, seed=seed)
 
     return train_loader, val_loader
 
@@ -137,6 +149,12 @@ def main():
     param_flag = config['paramFlag']
     eval_interval = config['evalInterval']
     checkpoint_interval = config['checkpointInterval']
+    cache_dir = config.get('cacheDir')
+    load_workers = config.get('loadWorkers')
+    num_workers = config.get('numWorkers', 0)
+    prefetch_factor = config.get('prefetchFactor', 2)
+    initial_seed = 123
+    weights_path = config.get('pretrainedWeights')
     device_ids = [0, 1, 2, 3]  # Example for multi-GPU setup
 
     validate_directories([input_base_train, input_base_val])
@@ -144,32 +162,33 @@ def main():
     validate_parameters(resnet_num, freeze)
 
     loss_fn, num_params = get_loss_function(param_flag)
-    model, device = setup_device_and_model(resnet_num, num_params, freeze, device_ids)
-    train_loader, val_loader = setup_dataloaders(input_base_train, input_base_val, param_flag, batch_size)
+    model, device = setup_device_and_model(resnet_num, num_params, freeze, device_ids, weights_path)
+    train_loader, val_loader = setup_dataloaders(input_base_train, input_base_val, param_flag, batch_size, cache_dir, load_workers,
+                                                 num_workers, prefetch_factor, initial_seed)
 
     optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate_start, betas=(0.99, 0.9999), eps=1e-8, amsgrad=True, weight_decay=0.005)
     scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=500)
 
     writer = SummaryWriter()
     global_step = 0
-    initial_seed = 123
     iter_plot_interval = max(1, len(train_loader) // 10)
 
     print(f'len_Dataset: {len(train_loader.dataset)}')
 
     if param_flag == 'flyaways':
-        weights = np.array([0.1, 32, 7, 20, 32, 3, 3, 10, 1086, 106]).reshape(1, num_params)
+        weights = np.array(FLYAWAY_WEIGHTS).reshape(1, num_params)
         weights = torch.from_numpy(weights).to(device, dtype=torch.float)
 
     for epoch in range(num_epochs):
-        np.random.seed(initial_seed + epoch)
+        train_loader.sampler.set_epoch(epoch)
+        val_loader.sampler.set_epoch(epoch)
         model.train()
 
         time_epoch_start = time.time()
         train_losses = np.zeros(len(train_loader))
 
         for batch_idx, (x_batch, y_batch, _) in enumerate(train_loader):
-            x_batch, y_batch = x_batch.to(device, dtype=torch.float), y_batch.to(device, dtype=torch.float)
+            x_batch, y_batch = to_float_batch(x_batch, device), y_batch.to(device, dtype=torch.float, non_blocking=True)
             y_pred = model(x_batch)
 
             if param_flag == 'flyaways':
@@ -197,7 +216,7 @@ def main():
 
             with torch.no_grad():
                 for batch_idx, (x_val, y_val, _) in enumerate(val_loader):
-                    x_val, y_val = x_val.to(device, dtype=torch.float), y_val.to(device, dtype=torch.float)
+                    x_val, y_val = to_float_batch(x_val, device), y_val.to(device, dtype=torch.float, non_blocking=True)
                     y_val_pred = model(x_val)
 
                     if param_flag == 'flyaways':
@@ -0,0 +1,193 @@
+import numpy as np
+import time
+import torch
+from torch.utils.tensorboard import SummaryWriter
+import os
+
+from dataloader import MultiTaskYarnDataset, make_data_loader, to_float_batch
+from utils import export
+from network import MultiTaskResnetYarn
+from train import FLYAWAY_WEIGHTS, initialize_experiment, get_loss_function, validate_directories, validate_parameters
+
+def setup_multitask_model(resnet_num, heads, freeze, device_ids, weights_path=None):
+    """
+    Setup the device and the multi-task model for training.
+
+    Args:
+        resnet_num (int): The ResNet model number (18, 34, 50, 101).
+        heads (dict): Head name to its number of outputs.
+        freeze (int): Number of ResNet blocks to freeze (-1 for no freezing).
+        device_ids (list): List of device IDs for multi-GPU setup.
+        weights_path (str, optional): Local ImageNet weight file or torch hub cache directory.
+
+    Returns:
+        tuple: Contains the model and the device.
+    """
+    model = MultiTaskResnetYarn(resnet_num, heads, freeze, weights_path=weights_path)
+    device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+    model = model.to(device)
+
+    if torch.cuda.device_count() > 1:
+        model = torch.nn.DataParallel(model, device_ids=device_ids)
+
+    return model, device
+
+def setup_multitask_dataloaders(input_base_train, input_base_val, param_flags, batch_size, cache_dir=None, load_workers=None, num_workers=0, prefetch_factor=2, seed=0):
+    """
+    Setup training and validation data loaders that return the labels of all heads.
+
+    Args:
+        input_base_train (str): Path to the training dataset.
+        input_base_val (str): Path to the validation dataset.
+        param_flags (list): Parameter flags of the heads.
+        batch_size (int): Batch size for the data loaders.
+        cache_dir (str, optional): Directory for the uint8 image caches, one subdirectory per dataset.
+        load_workers (int, optional): Threads decoding and reading the dataset files. Defaults to the number of CPUs.
+        num_workers (int): Loader processes per data loader, 0 to load in the main process. Default is 0.
+        prefetch_factor (int): Batches loaded in advance by each loader process. Default is 2.
+        seed (int): Seed of the crops and the order of epoch 0, see EpochSampler. Default is 0.
+
+    Returns:
+        tuple: Contains the training and validation data loaders.
+    """
+    train_cache_dir = os.path.join(cache_dir, 'train') if cache_dir else None
+    val_cache_dir = os.path.join(cache_dir, 'val') if cache_dir else None
+    train_dataset = MultiTaskYarnDataset(input_base_train, param_flags, train_cache_dir, load_workers)
+    val_dataset = MultiTaskYarnDataset(input_base_val, param_flags, val_cache_dir, load_workers)
+
+    train_loader = make_data_loader(train_dataset, batch_size, True, num_workers, prefetch_factor, seed=seed)
+    val_loader = make_data_loader(val_dataset, batch_size, True, num_workers, prefetch_factor, seed=seed)
+
+    return train_loader, val_loader
+
+def multitask_loss(loss_fns, head_weights, y_pred, y_batch, device):
+    """
+    Compute the weighted sum of the per-head losses.
+
+    Cross-entropy is used for thickness and num_plies, a weighted L1 loss for flyaways
+    and an L1 loss for the other heads (see get_loss_function).
+
+    Args:
+        loss_fns (dict): Head name to its loss function.
+        head_weights (dict): Head name to the weight of its loss in the sum.
+        y_pred (dict): Head name to its predictions.
+        y_batch (dict): Head name to its labels.
+        device (torch.device): Device of the predictions.
+
+    Returns:
+        tuple: The total loss and a dict of the per-head loss values.
+    """
+    total = 0.0
+    head_losses = {}
+    for name, loss_fn in loss_fns.items():
+        pred, target = y_pred[name], y_batch[name].to(device, dtype=torch.float, non_blocking=True)
+        if name == 'flyaways':
+            weights = torch.tensor(FLYAWAY_WEIGHTS, device=device, dtype=torch.float).reshape(1, -1)
+            pred, target = pred * weights, target * weights
+
+        loss = loss_fn(pred, target)
+        head_losses[name] = loss.item()
+        total = total + head_weights.get(name, 1.0) * loss
+    return total, head_losses
+
+def main():
+    config, input_base_train, input_base_val, checkpoint_dir, timestamp = initialize_experiment(output_name='multitask')
+
+    num_epochs = config['numEpochs']
+    learning_rate_start = config['learningRateStart']
+    batch_size = config['batchSize']
+    resnet_num = config['resnetNum']
+    freeze = config['freeze']
+    param_flags = config.get('paramFlags') or list(MultiTaskYarnDataset.PARAM_CONFIGS)
+    head_weights = config.get('headWeights', {})
+    eval_interval = config['evalInterval']
+    checkpoint_interval = config['checkpointInterval']
+    cache_dir = config.get('cacheDir')
+    load_workers = config.get('loadWorkers')
+    num_workers = config.get('numWorkers', 0)
+    prefetch_factor = config.get('prefetchFactor', 2)
+    initial_seed = 123
+    weights_path = config.get('pretrainedWeights')
+    device_ids = [0, 1, 2, 3]  # Example for multi-GPU setup
+
+    validate_directories([input_base_train, input_base_val])
+
+    validate_parameters(resnet_num, freeze)
+
+    loss_fns = {param_flag: get_loss_function(param_flag)[0] for param_flag in param_flags}
+    heads = {param_flag: MultiTaskYarnDataset.num_outputs(param_flag) for param_flag in param_flags}
+    model, device = setup_multitask_model(resnet_num, heads, freeze, device_ids, weights_path)
+    train_loader, val_loader = setup_multitask_dataloaders(input_base_train, input_base_val, param_flags, batch_size, cache_dir, load_workers,
+                                                           num_workers, prefetch_factor, initial_seed)
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate_start, betas=(0.99, 0.9999), eps=1e-8, amsgrad=True, weight_decay=0.005)
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=500)
+
+    writer = SummaryWriter()
+    global_step = 0
+    iter_plot_interval = max(1, len(train_loader) // 10)
+
+    print(f'len_Dataset: {len(train_loader.dataset)}, heads: {heads}')
+
+    for epoch in range(num_epochs):
+        train_loader.sampler.set_epoch(epoch)
+        val_loader.sampler.set_epoch(epoch)
+        model.train()
+
+        time_epoch_start = time.time()
+        train_losses = np.zeros(len(train_loader))
+        train_head_losses = {name: np.zeros(len(train_loader)) for name in heads}
+
+        for batch_idx, (x_batch, y_batch, _) in enumerate(train_loader):
+            x_batch = to_float_batch(x_batch, device)
+            y_pred = model(x_batch)
+
+            loss, head_losses = multitask_loss(loss_fns, head_weights, y_pred, y_batch, device)
+            train_losses[batch_idx] = loss.item()
+            for name, value in head_losses.items():
+                train_head_losses[name][batch_idx] = value
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            if global_step % iter_plot_interval == 0:
+                writer.add_scalar('lossIter_multitask', train_losses[batch_idx], global_step)
+            global_step += 1
+
+        time_epoch = time.time() - time_epoch_start
+        print(f'epoch {epoch:05d} / {num_epochs:05d}, {time_epoch:9.2f} s, train loss {train_losses.mean():5.5f}')
+        writer.add_scalar('training loss_multitask', train_losses.mean(), epoch)
+        for name, values in train_head_losses.items():
+            writer.add_scalar(f'training loss_{name}', values.mean(), epoch)
+
+        if epoch % eval_interval == 0:
+            model.eval()
+            val_losses = np.zeros(len(val_loader))
+            val_head_losses = {name: np.zeros(len(val_loader)) for name in heads}
+
+            with torch.no_grad():
+                for batch_idx, (x_val, y_val, _) in enumerate(val_loader):
+                    x_val = to_float_batch(x_val, device)
+                    y_val_pred = model(x_val)
+
+                    val_loss, head_losses = multitask_loss(loss_fns, head_weights, y_val_pred, y_val, device)
+                    val_losses[batch_idx] = val_loss.item()
+                    for name, value in head_losses.items():
+                        val_head_losses[name][batch_idx] = value
+
+            print(f'epoch {epoch:05d}, val loss {val_losses.mean():5.5f}, ' + ', '.join(f'{name} {values.mean():5.5f}' for name, values in val_head_losses.items()))
+            writer.add_scalar('val loss_multitask', val_losses.mean(), epoch)
+            for name, values in val_head_losses.items():
+                writer.add_scalar(f'val loss_{name}', values.mean(), epoch)
+
+            if epoch % checkpoint_interval == 0:
+                export(model, checkpoint_dir, timestamp, epoch=epoch, scheduler=scheduler)
+
+        if scheduler is not None:
+            scheduler.step()
+
+    export(model, checkpoint_dir, timestamp, epoch=epoch, label='final', scheduler=scheduler)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import json
 import os
+import sys
 import torch
 
+# The manifest of a generated dataset is read with the generator's own reader, which does not depend on bpy
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yarn_generator_blender'))
+from Yarn_manifest import read_manifest
+
 def read_file(filepath):
     """
     Reads a JSON file and returns the data.
@@ -16,6 +21,20 @@ def read_file(filepath):
         data = json.load(json_file)
     return data
 
+def load_checkpoint(model_file, device='cpu'):
+    """
+    Loads the state dict of a checkpoint written by export().
+
+    Args:
+        model_file (str): Path to the checkpoint file.
+        device (torch.device or str, optional): Device to map the tensors to. Default is 'cpu'.
+
+    Returns:
+        dict: The state dict, with the 'module.' prefix of DataParallel models removed.
+    """
+    state_dict = torch.load(model_file, map_location=device)['state_dict']
+    return {key[len('module.'):] if key.startswith('module.') else key: value for key, value in state_dict.items()}
+
 def export(model, checkpoint_dir, timestamp, optimizer=None, epoch=-1, label='', scheduler=None):
     """
     Exports the model state and optionally the optimizer and scheduler states to a file.
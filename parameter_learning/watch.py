@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+
+import numpy as np
+import torch
+
+from dataloader import to_float_batch
+from test import MODEL_PARAMS, TRAINING_SHAPE, ModelRegistry, decode_image, bucket_by_shape, yarn_parameters
+from network import parse_backbone
+
+def read_done_images(output_file):
+    """
+    Reads the images already predicted by an earlier run from its JSON lines output.
+
+    Returns:
+        set: Basenames of the predicted (or failed) images.
+    """
+    done = set()
+    if not os.path.isfile(output_file):
+        return done
+    with open(output_file, 'rt') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['image'])
+            except ValueError:
+                continue  # partially written last line of a killed run
+    return done
+
+class DirectoryWatcher:
+    """
+    Polls a directory for new images.
+
+    An image is only reported once its size and modification time were the same in
+    two consecutive polls, so files the photo station is still writing are skipped.
+
+    Args:
+        directory (str): The watched directory.
+        pattern_ext (str): File extension of the images. Default is '.png'.
+        done (set, optional): Basenames that are never reported, e.g. from read_done_images.
+    """
+
+    def __init__(self, directory, pattern_ext='.png', done=None):
+        self.directory = directory
+        self.pattern_ext = pattern_ext
+        self.seen = set(done or ())
+        self.pending = {}
+
+    def poll(self):
+        """
+        Lists the directory once.
+
+        Returns:
+            list: Paths of the new, completely written images, sorted by name.
+        """
+        ready = []
+        candidates = {}
+        for entry in os.scandir(self.directory):
+            if entry.name in self.seen or not entry.name.endswith(self.pattern_ext) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            candidates[entry.name] = (stat.st_size, stat.st_mtime_ns)
+            if self.pending.get(entry.name) == candidates[entry.name]:
+                ready.append(entry.name)
+
+        self.pending = {name: state for name, state in candidates.items() if name not in ready}
+        self.seen.update(ready)
+        return [os.path.join(self.directory, name) for name in sorted(ready)]
+
+class StreamingPipeline:
+    """
+    Watches a directory and predicts the yarn parameters of every new image.
+
+    Three stages run concurrently and are connected by bounded queues: the watcher thread
+    puts new paths into the path queue, num_decoders threads decode them (decode_image) into
+    the image queue and the calling thread runs the decoded images through the registry in
+    batches of the images that are ready, up to max_batch_size. A full queue blocks the stage
+    before it, so decoding never runs more than queue_size images ahead of the models.
+    Each result is appended to the output file as one JSON line as soon as its batch is done.
+
+    Args:
+        registry (ModelRegistry): The loaded models.
+        directory (str): The watched directory.
+        output_file (str): JSON lines file the predictions are appended to.
+        num_decoders (int): Number of decoding threads. Default is 4.
+        max_batch_size (int): Maximum number of images per forward pass. Default is 16.
+        queue_size (int): Capacity of the path and image queues. Default is 64.
+        fit_shape (tuple, optional): (height, width) all images are cropped or padded to. Default is None.
+        interval (float): Seconds between two polls of the directory. Default is 1.
+        verbose (bool): Print every result. Default is True.
+    """
+
+    def __init__(self, registry, directory, output_file, num_decoders=4, max_batch_size=16, queue_size=64,
+                 fit_shape=None, interval=1.0, verbose=True):
+        self.registry = registry
+        self.output_file = output_file
+        self.num_decoders = num_decoders
+        self.max_batch_size = max_batch_size
+        self.fit_shape = fit_shape
+        self.interval = interval
+        self.verbose = verbose
+        self.watcher = DirectoryWatcher(directory, done=read_done_images(output_file))
+        self.paths = queue.Queue(queue_size)
+        self.images = queue.Queue(queue_size)
+        self.stop_event = threading.Event()
+        self.counters = {'images': 0, 'errors': 0, 'batches': 0}
+
+    def _watch(self, once):
+        # a file is ready after two polls, so a single pass needs two of them
+        num_polls = 0
+        while not self.stop_event.is_set():
+            for path in self.watcher.poll():
+                self.paths.put((path, time.perf_counter()))
+            num_polls += 1
+            if once and num_polls >= 2:
+                break
+            time.sleep(min(self.interval, 0.1) if once else self.interval)
+        for _ in range(self.num_decoders):
+            self.paths.put(None)
+
+    def _decode(self):
+        while True:
+            item = self.paths.get()
+            if item is None:
+                self.images.put(None)
+                return
+            path, time_found = item
+            try:
+                self.images.put((path, time_found, decode_image(path, self.fit_shape), None))
+            except Exception as e:
+                self.images.put((path, time_found, None, e))
+
+    def _next_batch(self):
+        # blocks for the first image, then takes the images that are already decoded
+        batch = []
+        while len(batch) < self.max_batch_size and self.num_running > 0:
+            try:
+                item = self.images.get(block=not batch)
+            except queue.Empty:
+                break
+            if item is None:
+                self.num_running -= 1
+            else:
+                batch.append(item)
+        return batch
+
+    def _write(self, output, path, time_found, params=None, error=None):
+        record = {'image': os.path.basename(path), 'latency_s': time.perf_counter() - time_found, 'time': time.time()}
+        if error is None:
+            record['params'] = params
+        else:
+            record['error'] = str(error)
+            self.counters['errors'] += 1
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+        self.counters['images'] += 1
+        if self.verbose:
+            print(f"{record['image']}: {json.dumps(params) if error is None else 'error ' + record['error']} ({record['latency_s']:.2f} s)")
+
+    def run(self, once=False):
+        """
+        Runs the pipeline until stop is called (or, with once, until the images present at the start are done).
+        """
+        self.num_running = self.num_decoders
+        threads = [threading.Thread(target=self._watch, args=(once,), daemon=True)]
+        threads += [threading.Thread(target=self._decode, daemon=True) for _ in range(self.num_decoders)]
+        for thread in threads:
+            thread.start()
+
+        with open(self.output_file, 'at') as output:
+            while self.num_running > 0:
+                batch = self._next_batch()
+                for path, time_found, _, error in batch:
+                    if error is not None:
+                        self._write(output, path, time_found, error=error)
+                batch = [item for item in batch if item[3] is None]
+
+                for shape, indices in bucket_by_shape([image for _, _, image, _ in batch]).items():
+                    xs = torch.from_numpy(np.stack([batch[i][2] for i in indices]))
+                    try:
+                        predictions = self.registry.predict(to_float_batch(xs, self.registry.device))
+                    except Exception as e:
+                        for i in indices:
+                            self._write(output, batch[i][0], batch[i][1], error=e)
+                        continue
+                    self.counters['batches'] += 1
+                    for index, i in enumerate(indices):
+                        self._write(output, batch[i][0], batch[i][1], yarn_parameters(predictions, index))
+
+    def stop(self):
+        """Stops watching; the images already found are still predicted."""
+        self.stop_event.set()
+
+def main():
+    """
+    Example:
+        python watch.py --dir-images /mnt/photo_station --output predictions.jsonl
+    """
+    parser = argparse.ArgumentParser(description="Predict the yarn parameters of every new image in a directory.")
+    parser.add_argument("--dir-images", required=True, help="watched directory")
+    parser.add_argument("--output", default=None, help="JSON lines file of the predictions, default: <dir-images>/predictions.jsonl")
+    parser.add_argument("--multitask", default=None, help="multi-task checkpoint to use instead of the nine single-parameter models")
+    parser.add_argument("--resnet", type=parse_backbone, default=34, help="ResNet type (or mobilenet_v3_small) of the multi-task checkpoint")
+    parser.add_argument("--backend", default="torch", choices=["torch", "torchscript", "onnx", "int8"])
+    parser.add_argument("--decoders", type=int, default=4, help="image decoding threads")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--queue-size", type=int, default=64, help="capacity of the path and image queues")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between two polls of the directory")
+    parser.add_argument("--fit", action="store_true", help="center-crop or pad all images to the training size")
+    parser.add_argument("--once", action="store_true", help="predict the images in the directory and exit instead of watching it")
+    parser.add_argument("--quiet", action="store_true", help="do not print every result")
+    args = parser.parse_args()
+
+    output_file = args.output or os.path.join(args.dir_images, 'predictions.jsonl')
+    registry = ModelRegistry(MODEL_PARAMS, args.multitask, args.resnet, backend=args.backend)
+    pipeline = StreamingPipeline(registry, args.dir_images, output_file, args.decoders, args.max_batch_size, args.queue_size,
+                                 TRAINING_SHAPE if args.fit else None, args.interval, not args.quiet)
+
+    time_start = time.time()
+    try:
+        pipeline.run(args.once)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.time() - time_start
+    print(f"{pipeline.counters['images']} images ({pipeline.counters['errors']} errors) in {pipeline.counters['batches']} batches, "
+          f"{elapsed:.2f} s, {pipeline.counters['images'] / max(elapsed, 1e-9):.2f} images/s")
+
+if __name__ == "__main__":
+    main()
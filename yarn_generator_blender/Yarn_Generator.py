@@ -1,33 +1,18 @@
 import bpy
-import bmesh
 from math import pi, sin, cos, atan2, sqrt
 from mathutils import Vector
-import mathutils
 import numpy as np
 import os
 import time
 import datetime
 
-rnd = np.random.RandomState(5)
+import Yarn_Geometry
+import Yarn_telemetry
+from Yarn_parameters import flyaway_mapping
 
 m_to_mm = 1e-3 # meter to mili meter
 
 
-def flyaway_mapping(hair_length_mean, hair_angle, amount, loop_prob, loop_length_mean, loop_distance_mean, loop_distance_std, fuzzyness):
-	flyaways = {
-			"loop_prob": loop_prob,
-			"amount": amount,
-			"hair_length": (hair_length_mean, 0.05),
-			"hair_angle": hair_angle,
-			"hair_squeeze": 1 + fuzzyness*1.5,
-			"loop_length_short": (loop_length_mean, 0.01),
-			"loop_distance_factor_short": (loop_distance_mean, loop_distance_std),
-			"enable": True,
-			"mapping_parameters" : { "amount": amount, "loop_prob" : loop_prob, "hair_length_mean": hair_length_mean, "hair_angle": hair_angle, "loop_length_mean": loop_length_mean,"loop_distance_mean": loop_distance_mean, "loop_distance_std": loop_distance_std, "fuzzyness": fuzzyness} 
-		}
-	return flyaways
-
-
 def get_context():
 	# create a context that works when blender is executed from the command line.
 	# there should be a cleaner solution to this, but this copy'paste seems to work for now
@@ -74,7 +59,7 @@ def create_fiber(length=1.0, resolution=5):
 	return new_object
 
 
-def sample_points_circle(num_points, radius, middle_ply, jitter_xy, **kwargs):
+def sample_points_circle(num_points, radius, middle_ply, jitter_xy, rnd, **kwargs):
 	points = []
 	for i in range(num_points):
 		angle = float(i) / float(num_points) * 2*pi
@@ -86,7 +71,7 @@ def sample_points_circle(num_points, radius, middle_ply, jitter_xy, **kwargs):
 		points.append(Vector([0, 0, 0]))
 	return points
 
-def sample_points_area(num_points, radius, jitter_xy, **kwargs):
+def sample_points_area(num_points, radius, jitter_xy, rnd, **kwargs):
 	points = []
 	radius_scale = (num_points)**0.3 / radius
 	for i in range(1, num_points+1):
@@ -100,7 +85,7 @@ def sample_points_area(num_points, radius, jitter_xy, **kwargs):
 
 
 
-def create_spiral(location=Vector([0, 0, 0]), dif_z=1.0, jitter_z=0, migration=0):
+def create_spiral(rnd, location=Vector([0, 0, 0]), dif_z=1.0, jitter_z=0, migration=0):
 
 	override_context = get_context()
 	turns = 48 # just needs to be sufficiently long
@@ -145,13 +130,14 @@ def create_spiral(location=Vector([0, 0, 0]), dif_z=1.0, jitter_z=0, migration=0
 	return obj
 	
 
-def build(params):
+def build_operators(params, streams):
+	# reference implementation with one bpy.ops spiral and CURVE modifier per fiber, see build
 	curve_name="py_curve"
 	
 	if params["placement_params"]["type"] == "CIRCLE":
-		fiber_starts = sample_points_circle(**params["placement_params"])
+		fiber_starts = sample_points_circle(rnd=streams["placement"], **params["placement_params"])
 	elif params["placement_params"]["type"] == "AREA":
-		fiber_starts = sample_points_area(**params["placement_params"])
+		fiber_starts = sample_points_area(rnd=streams["placement"], **params["placement_params"])
 	else:
 		raise Exception("invalid placement_params type")
 	
@@ -161,7 +147,7 @@ def build(params):
 	if "line" in params["fiber_params"]:
 		fiber_obj_template = create_fiber(length = params["fiber_params"]["line"]["length"], resolution=params["fiber_params"]["line"]["resolution"])
 	elif "yarn" in params["fiber_params"]:
-		fiber_obj_template = build(params["fiber_params"]["yarn"])
+		fiber_obj_template = build_operators(params["fiber_params"]["yarn"], streams)
 	else:
 		raise Exception("invalid fiber_params")
 	
@@ -194,7 +180,7 @@ def build(params):
 
 
 		# create curve and apply it to yarn
-		curve_obj = create_spiral(location = pos, **params["curve_params"])
+		curve_obj = create_spiral(streams["curves"], location = pos, **params["curve_params"])
 		
 		# create and apply curve modifier   	
 		bpy.context.view_layer.objects.active = fiber_obj   	
@@ -231,140 +217,54 @@ def build(params):
 	return result
 
 
-
-def gen_flyaways(yarn_mesh, p, fiber_resolution, fiber_length, yarn_radius):
+def create_polyline_mesh(vertices, offsets, obj_name):
+	# one mesh with an edge chain per strand vertices[offsets[i]:offsets[i+1]]
+	edges = Yarn_Geometry.strand_edges(offsets).astype(np.int32)
 	
-	# collect edges
-	bm = bmesh.new()   # create an empty BMesh
-	bm.from_mesh(yarn_mesh.data)   # fill it in from a Mesh
-	
-	bm.verts.ensure_lookup_table()
-	bm.edges.ensure_lookup_table()
+	new_mesh = bpy.data.meshes.new(obj_name)
+	new_mesh.vertices.add(len(vertices))
+	new_mesh.vertices.foreach_set("co", vertices.ravel())
+	new_mesh.edges.add(len(edges))
+	new_mesh.edges.foreach_set("vertices", edges.ravel())
+	new_mesh.update()
+	new_object = bpy.data.objects.new(obj_name, new_mesh)
 	
-	# create object for flyaways
-	new_mesh = bpy.data.meshes.new("flyaways")
-	new_object = bpy.data.objects.new("flyaways", new_mesh)
 	bpy.context.collection.objects.link(new_object)
-	bm_f = bmesh.new() # create an empty BMesh to edit the new mesh
-	bm_f.from_mesh(new_mesh)
-	
-	
-	flyaways_created = 0
-	amount = int(p["amount"] * fiber_length)
-	for flyaway in range(amount):
+	return new_object
+
+
+def build(params, streams):
+	# same geometry as build_operators, but all fibers are computed at once by Yarn_Geometry
+	polylines = Yarn_Geometry.build_polylines(params, streams)
+	result = create_polyline_mesh(*Yarn_Geometry.strand_index(polylines), "YarnMesh")
+	bpy.context.view_layer.objects.active = result
+	return result
+
+
+
+def mesh_strand_index(mesh):
+	# (vertices, offsets) of a mesh made of vertex chains, as created by build and build_operators
+	vertices = np.zeros(len(mesh.vertices)*3, dtype=np.float32)
+	mesh.vertices.foreach_get("co", vertices)
+	edges = np.zeros(len(mesh.edges)*2, dtype=np.int32)
+	mesh.edges.foreach_get("vertices", edges)
+	edges = edges.reshape(-1, 2)
 	
-		loop = True if rnd.uniform(0, 1) < p["loop_prob"] else False
-		squeeze_factorx = 2
-		if loop:
-			long_loop = True if rnd.uniform(0, 1) < 0.04 else False 
-			
-			squeeze_factor = 1
-			
-			if long_loop:
-				flyaway_length = p["loop_length_short"][0]*2 
-				distance = rnd.normal(p["loop_distance_factor_short"][0]*2, p["loop_distance_factor_short"][1])
-			else:
-				flyaway_length = rnd.normal(p["loop_length_short"][0], p["loop_length_short"][1])
-			
-				dist = rnd.normal(p["loop_distance_factor_short"][0], p["loop_distance_factor_short"][1])
-				
-				dif = dist - p["loop_distance_factor_short"][0]
-				if dif < 0:
-					distance = p["loop_distance_factor_short"][0] - dif
-				else:
-					distance = dist
-					
-			distance = distance/10000.0
-			
-		else:
-			long_hair = True if rnd.uniform(0, 1) < 0.04 else False
+	# a strand starts at every vertex that is not linked to its predecessor
+	starts = np.ones(len(mesh.vertices), dtype=bool)
+	chained = np.abs(edges[:, 0] - edges[:, 1]) == 1
+	starts[edges[chained].max(axis=1)] = False
+	offsets = np.append(np.flatnonzero(starts), len(mesh.vertices))
+	return vertices.reshape(-1, 3), offsets
 
-			squeeze_factor = p["hair_squeeze"]
-			squeeze_factorx = -1
-			
-			if long_hair:
-				flyaway_length = rnd.normal(p["hair_length"][0]*3, p["hair_length"][1])
-			else:
-				flyaway_length = rnd.normal(p["hair_length"][0], p["hair_length"][1])
-				
-		
-		num_vertices = round(flyaway_length * fiber_resolution * 1000)
-		
-		# add vertices to make sure flyaways are properly connected to the yarn
-		if loop:
-			num_vertices += 2
-		else:
-			num_vertices += 1
-			
+
+def gen_flyaways(yarn_mesh, p, fiber_resolution, fiber_length, yarn_radius, rnd):
 	
-		# --------------- select a vertex strip to generate flyaway from --------------- 
-		last_v = bm.verts[rnd.randint(0, len(bm.verts))]
-		if len(last_v.link_edges) == 0:
-			continue
-		if len(last_v.link_edges) > 1:
-			last_edge = last_v.link_edges[0] if rnd.uniform(0,1)>0.5 else last_v.link_edges[1] # this decides, if we go up or down
-		else:
-			last_edge = last_v.link_edges[0]
-		v_list = [last_v]
-		e_list = []
-		
-		for i in range(num_vertices):
-			if len(last_v.link_edges) < 2:
-				break
-			next_edge = last_v.link_edges[0] if last_v.link_edges[0] is not last_edge else last_v.link_edges[1]
-			e_list.append(next_edge)
-			if len(next_edge.verts) < 2:
-				break
-			next_v = next_edge.verts[0] if next_edge.verts[0] is not last_v else next_edge.verts[1]
-			v_list.append(next_v)
-			last_v = next_v
-			last_edge = next_edge
-		if len(v_list) < num_vertices:
-			continue
-		#________________________________________________________________
-	
-		dir = Vector([v_list[-1].co[0], v_list[-1].co[1], 0])
-		#distance += dir.length # properly move all vertices to the outside of the yarn
-		dir = dir.normalized()
-		
-		# copy vertices to new BMesh
-		v_list_f = []
-		e_list_f = []
-		for v in v_list:
-			v_list_f.append(bm_f.verts.new(v.co))
-		for i in range(len(v_list_f)-1):
-			e_list_f.append(bm_f.edges.new((v_list_f[i], v_list_f[i+1])))
-	
-	
-		# squeeze a bit to make them more curly
-		z_ref = v_list_f[0].co[2]
-		for i, v in enumerate(v_list_f):
-			v.co[2] = z_ref + (v.co[2]-z_ref) / squeeze_factor
-			
-			
-		x_ref = v_list_f[0].co[0]
-		for i, v in enumerate(v_list_f): 
-			v.co[0] = x_ref + (v.co[0]-x_ref) / squeeze_factorx
-			
-		
-		if loop:
-			v_list = v_list_f[1:-1]
-			e_list = e_list_f[1:-1]
-			# create some sort of arc
-			for i, v in enumerate(v_list):
-				v.co += dir * sin(i * pi / len(v_list)) * distance
-		else: # open ended flyaway
-			v_list = v_list_f[1:]
-			e_list = e_list_f[1:]
-			angle = p["hair_angle"] 
-			bmesh.ops.rotate(bm_f,
-				cent = v_list[0].co,
-				matrix = mathutils.Matrix.Rotation(angle, 3, dir),
-				verts = v_list)
-		flyaways_created += 1
-	print("Created {} of {} flyaways".format(flyaways_created, amount))
-	
-	bm_f.to_mesh(new_mesh)
+	vertices, offsets = mesh_strand_index(yarn_mesh.data)
+	flyaway_vertices, flyaway_offsets = Yarn_Geometry.gen_flyaways(vertices, offsets, p, fiber_resolution, fiber_length, rnd)
+	print("Created {} of {} flyaways".format(len(flyaway_offsets)-1, int(p["amount"] * fiber_length)))
+	
+	new_object = create_polyline_mesh(flyaway_vertices, flyaway_offsets, "flyaways")
 	new_object.location = yarn_mesh.location
 	return new_object
 	
@@ -609,36 +509,56 @@ def get_fiber_length(levels_description):
 		raise Exception("unknown fiber_params")
 
 
-def create_yarn(levels_description, material_properties, flyaways, other_properties, yarn_location = None):
+def create_yarn(levels_description, material_properties, flyaways, other_properties, yarn_location = None, seed = 5, telemetry = None):
+	# seed (int or np.random.SeedSequence) fully determines the geometry, independent of earlier yarns
+	# telemetry (Yarn_telemetry.SampleTelemetry) receives the stage timings and geometry counts
 	time_start = time.time()
+	if telemetry is None:
+		telemetry = Yarn_telemetry.SampleTelemetry()
 
 	adjust_units(levels_description, material_properties, flyaways, other_properties)
+	streams = Yarn_Geometry.rng_streams(seed)
 	
-	material = create_material(**material_properties)
-	yarn = build(levels_description)
+	with telemetry.stage("material"):
+		material = create_material(**material_properties)
+	with telemetry.stage("build"):
+		yarn = build(levels_description, streams)
+	# the meshes are vertex chains, so every curve has one vertex more than edges
+	telemetry.count("yarn_vertices", len(yarn.data.vertices))
+	telemetry.count("yarn_curves", len(yarn.data.vertices) - len(yarn.data.edges))
 	
 	if flyaways["enable"]:
-		flyaways_obj = gen_flyaways(yarn,
-			flyaways,
-			fiber_resolution = get_fiber_resolution(levels_description),
-			fiber_length = get_fiber_length(levels_description),
-			yarn_radius = levels_description["placement_params"]["radius"])
-		convert_to_curve(
-			flyaways_obj,
-			ellipse_x = other_properties["flyaway_thickness_x"],
-			ellipse_y = other_properties["flyaway_thickness_y"],
-			curve_name="Flyaway_Curve"
-		)
-		apply_material(flyaways_obj, material)
+		fiber_length = get_fiber_length(levels_description)
+		with telemetry.stage("gen_flyaways"):
+			flyaways_obj = gen_flyaways(yarn,
+				flyaways,
+				fiber_resolution = get_fiber_resolution(levels_description),
+				fiber_length = fiber_length,
+				yarn_radius = levels_description["placement_params"]["radius"],
+				rnd = streams["flyaways"])
+		telemetry.count("flyaway_vertices", len(flyaways_obj.data.vertices))
+		telemetry.count("flyaways_created", len(flyaways_obj.data.vertices) - len(flyaways_obj.data.edges))
+		telemetry.count("flyaways_requested", int(flyaways["amount"] * fiber_length))
+		with telemetry.stage("convert_to_curve_flyaways"):
+			convert_to_curve(
+				flyaways_obj,
+				ellipse_x = other_properties["flyaway_thickness_x"],
+				ellipse_y = other_properties["flyaway_thickness_y"],
+				curve_name="Flyaway_Curve"
+			)
+		with telemetry.stage("material"):
+			apply_material(flyaways_obj, material)
 	else:
 		flyaways_obj = None
-	convert_to_curve(
-		yarn,
-		ellipse_x = other_properties["fiber_thickness_x"],
-		ellipse_y = other_properties["fiber_thickness_y"],
-		curve_name="Fiber_Curve"
-	)
-	apply_material(yarn, material)
+	with telemetry.stage("convert_to_curve_yarn"):
+		convert_to_curve(
+			yarn,
+			ellipse_x = other_properties["fiber_thickness_x"],
+			ellipse_y = other_properties["fiber_thickness_y"],
+			curve_name="Fiber_Curve"
+		)
+	with telemetry.stage("material"):
+		apply_material(yarn, material)
 	
 	if yarn_location is not None:
 		yarn.location = yarn_location
@@ -650,4 +570,3 @@ def create_yarn(levels_description, material_properties, flyaways, other_propert
 	
 	time_elapsed = time.time() - time_start
 	print("Generation took {:.2f} seconds".format(time_elapsed))
-
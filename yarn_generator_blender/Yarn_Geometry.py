@@ -0,0 +1,288 @@
+import numpy as np
+from math import pi, sin, cos
+
+# Blender-free fiber geometry: computes the same polylines Yarn_Generator.build_operators
+# produces with bpy.ops (copy template, ARCH spiral, CURVE modifier), for all fibers of a
+# level at once. Positions are in the (meter) units of the adjusted level description.
+
+m_to_mm = 1e-3 # meter to mili meter
+
+# settings of the bpy.ops.curve.spirals call in create_spiral
+SPIRAL_TURNS = 48 # just needs to be sufficiently long
+SPIRAL_STEPS = 16
+
+# linear samples per spiral control point used to measure the curve length
+ARC_SUBDIVISIONS = 4
+
+
+def rng_streams(seed):
+	# independent generators for the placement, curves and flyaways of one yarn. seed is an int or a
+	# SeedSequence, the children are derived without spawn() so that reusing a SeedSequence is reproducible
+	if not isinstance(seed, np.random.SeedSequence):
+		seed = np.random.SeedSequence(seed)
+	children = [np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (k,), pool_size=seed.pool_size) for k in range(3)]
+	placement, curves, flyaways = [np.random.default_rng(s) for s in children]
+	return {"placement": placement, "curves": curves, "flyaways": flyaways}
+
+
+def line_template(length=1.0, resolution=5, **kwargs):
+	# same vertices as create_fiber, as a single (1, nodes, 3) polyline
+	nodes = int(resolution * length / m_to_mm)
+	vertices = np.zeros((1, nodes, 3))
+	vertices[0, :, 2] = np.arange(nodes) * float(length) / float(nodes)
+	return vertices
+
+
+def sample_points_circle(num_points, radius, middle_ply, jitter_xy, rnd, **kwargs):
+	angle = np.arange(num_points) / float(num_points) * 2*pi
+	points = np.stack([np.sin(angle), np.cos(angle)], axis=1) * radius
+	points += rnd.normal(loc=0, scale=jitter_xy, size=(num_points, 2))
+	if middle_ply:
+		points = np.vstack([points, np.zeros((1, 2))])
+	return points
+
+
+def sample_points_area(num_points, radius, jitter_xy, rnd, **kwargs):
+	radius_scale = (num_points)**0.3 / radius
+	i = np.arange(1, num_points+1, dtype=float)
+	a = i * 0.137 * 2*pi
+	r = i**0.3 / radius_scale
+	points = np.stack([np.sin(a)*r, np.cos(a)*r], axis=1)
+	points += rnd.normal(loc=0, scale=jitter_xy, size=(num_points, 2))
+	return points
+
+
+def spiral_num_vertices(turns=SPIRAL_TURNS, steps=SPIRAL_STEPS):
+	# the ARCH spiral of "Add Curve Extra Objects" accumulates phi in a while loop,
+	# replicate it to get the exact number of bezier points
+	max_phi = pi * 360 * turns / 180
+	step_phi = max_phi / (steps * turns)
+	cur_phi = 0
+	n = 1
+	while abs(cur_phi) <= abs(max_phi):
+		cur_phi += step_phi
+		n += 1
+	return n
+
+
+def sample_spiral_params(starts, dif_z=1.0, jitter_z=0, migration=0, rnd=None, turns=SPIRAL_TURNS, steps=SPIRAL_STEPS):
+	# one spiral per start position, drawing from rnd in the same order as create_spiral
+	num_curves = len(starts)
+	num_vertices = spiral_num_vertices(turns, steps)
+
+	# CLOCKWISE for positive dif_z
+	direction = 1 if dif_z < 0 else -1
+	dif_z = abs(dif_z)
+	max_phi = pi * 360 * turns / 180
+
+	phase_offset = np.zeros(num_curves)
+	phase_speed = np.zeros(num_curves)
+	migration_strength = np.zeros(num_curves)
+	jitter = np.zeros((num_curves, num_vertices))
+	for i in range(num_curves):
+		phase_offset[i] = rnd.uniform(0, 2*pi)
+		phase_speed[i] = rnd.uniform(0.0, 2)
+		migration_strength[i] = max(0, rnd.normal(loc=0.0, scale=migration))
+		jitter[i] = (rnd.random(num_vertices)-0.5) * dif_z * jitter_z
+
+	return {
+		"radius": np.sqrt(starts[:, 0]**2 + starts[:, 1]**2),
+		"rotation": np.arctan2(starts[:, 1], starts[:, 0]),
+		"step_phi": direction * max_phi / (steps * turns),
+		"step_z": dif_z * turns / (steps * turns - 1),
+		"dif_z": dif_z,
+		"jitter_z": jitter_z,
+		"phase_offset": phase_offset,
+		"phase_speed": phase_speed,
+		"migration_strength": migration_strength,
+		"jitter": jitter,
+	}
+
+
+def spiral_points(curves, u):
+	# centre line of every spiral at (continuous) bezier point indices u of shape (curves, n)
+	jitter = curves["jitter"]
+	i0 = np.clip(np.floor(u).astype(np.int64), 0, jitter.shape[1]-2)
+	f = u - i0
+	dz = np.take_along_axis(jitter, i0, axis=1)*(1-f) + np.take_along_axis(jitter, i0+1, axis=1)*f
+
+	phi = u * curves["step_phi"]
+	z = u * curves["step_z"]
+	xy_scale = 1 + curves["migration_strength"][:, None] * np.cos(curves["phase_offset"][:, None] + z*curves["phase_speed"][:, None] / m_to_mm)
+	r = curves["radius"][:, None] * xy_scale
+	return phi, r*np.cos(phi), r*np.sin(phi), z + dz
+
+
+def arc_length_to_index(curves, s):
+	# map arc lengths s (curves, n) to bezier point indices, all curves in one interpolation
+	num_curves = len(curves["radius"])
+	num_vertices = curves["jitter"].shape[1]
+
+	# jitter can shorten the curve by at most dif_z*jitter_z
+	s_max = max(float(np.max(s)), 0.0)
+	u_max = int(np.ceil((s_max + curves["dif_z"]*curves["jitter_z"]) / curves["step_z"])) + 2
+	u_max = min(u_max, num_vertices-1)
+
+	u = np.linspace(0, u_max, u_max*ARC_SUBDIVISIONS+1)
+	u = np.broadcast_to(u, (num_curves, len(u)))
+	_, x, y, z = spiral_points(curves, u)
+	seg = np.sqrt(np.diff(x, axis=1)**2 + np.diff(y, axis=1)**2 + np.diff(z, axis=1)**2)
+	length = np.concatenate([np.zeros((num_curves, 1)), np.cumsum(seg, axis=1)], axis=1)
+
+	# shift each curve into its own disjoint range, so that a single np.interp handles all of them
+	offset = (np.arange(num_curves) * (length[:, -1].max() + 1.0))[:, None]
+	s = np.clip(s, 0, length[:, -1:])
+	return np.interp(s + offset, (length + offset).ravel(), u.ravel()).reshape(s.shape)
+
+
+def deform_along_spirals(template, starts, curves, ellipse):
+	# copy the template (fibers, nodes, 3) onto every spiral, like the CURVE modifier with deform_axis POS_Z
+	num_curves = len(starts)
+	tx = template[..., 0].reshape(1, -1)
+	ty = template[..., 1].reshape(1, -1)
+	tz = template[..., 2].reshape(1, -1)
+
+	# don't apply ellipse to middle ply
+	scale_x = np.where(np.any(starts != 0, axis=1), ellipse, 1.0)[:, None]
+
+	u = arc_length_to_index(curves, np.broadcast_to(tz, (num_curves, tz.shape[1])))
+	phi, cx, cy, cz = spiral_points(curves, u)
+
+	# Z_UP twist: the cross section is carried by the horizontal radial direction
+	# and the direction perpendicular to it and the tangent
+	a = curves["step_phi"] * curves["radius"][:, None]
+	b = curves["step_z"]
+	norm = np.sqrt(a**2 + b**2)
+	sin_phi = np.sin(phi)
+	cos_phi = np.cos(phi)
+	ex = tx * scale_x
+	x = cx + ex*cos_phi - ty*b/norm*sin_phi
+	y = cy + ex*sin_phi + ty*b/norm*cos_phi
+	z = cz - ty*a/norm
+
+	# rotate the spiral so that it starts at its placement position
+	rot = curves["rotation"][:, None]
+	vertices = np.stack([
+		np.cos(rot)*x - np.sin(rot)*y,
+		np.sin(rot)*x + np.cos(rot)*y,
+		z], axis=-1)
+	return vertices.reshape(num_curves*template.shape[0], template.shape[1], 3)
+
+
+def build_level(params, streams):
+	if params["placement_params"]["type"] == "CIRCLE":
+		fiber_starts = sample_points_circle(rnd=streams["placement"], **params["placement_params"])
+	elif params["placement_params"]["type"] == "AREA":
+		fiber_starts = sample_points_area(rnd=streams["placement"], **params["placement_params"])
+	else:
+		raise Exception("invalid placement_params type")
+
+	if "line" in params["fiber_params"]:
+		template = line_template(**params["fiber_params"]["line"])
+	elif "yarn" in params["fiber_params"]:
+		template = build_level(params["fiber_params"]["yarn"], streams)
+	else:
+		raise Exception("invalid fiber_params")
+
+	curves = sample_spiral_params(fiber_starts, rnd=streams["curves"], **params["curve_params"])
+	return deform_along_spirals(template, fiber_starts, curves, params["ellipse"])
+
+
+def build_polylines(params, streams):
+	# all fibers of the (unit adjusted) level description as a float32 array (fibers, nodes, 3)
+	return build_level(params, streams).astype(np.float32)
+
+
+def strand_index(polylines):
+	# compact form of a (lines, nodes, 3) array: strand i is vertices[offsets[i]:offsets[i+1]]
+	num_lines, nodes = polylines.shape[:2]
+	return polylines.reshape(-1, 3), np.arange(num_lines+1, dtype=np.int64) * nodes
+
+
+def strand_edges(offsets):
+	# (edges, 2) vertex indices connecting consecutive vertices of every strand
+	linked = np.ones(max(offsets[-1]-1, 0), dtype=bool)
+	ends = offsets[1:-1]
+	linked[ends[ends > 0]-1] = False
+	first = np.flatnonzero(linked)
+	return np.stack([first, first+1], axis=1)
+
+
+def sample_strips(offsets, strip_length, rnd):
+	# first vertex of a window of strip_length consecutive vertices per entry, drawn uniformly
+	# from the positions whose strand is long enough to hold the whole window
+	lengths = np.diff(offsets)
+	strip_length = np.minimum(strip_length, lengths.max())
+	first = np.zeros(len(strip_length), dtype=np.int64)
+	for m in np.unique(strip_length):
+		selected = np.flatnonzero(strip_length == m)
+		num_starts = np.maximum(lengths - m + 1, 0)
+		cum_starts = np.cumsum(num_starts)
+		k = rnd.integers(0, cum_starts[-1], size=len(selected))
+		strand = np.searchsorted(cum_starts, k, side="right")
+		first[selected] = offsets[strand] + k - (cum_starts[strand] - num_starts[strand])
+	return first, strip_length
+
+
+def gen_flyaways(vertices, offsets, p, fiber_resolution, fiber_length, rnd):
+	# flyaways cut from strips of the yarn strands, returned in the same (vertices, offsets) form
+	amount = int(p["amount"] * fiber_length)
+	
+	loop = rnd.uniform(0, 1, size=amount) < p["loop_prob"]
+	long = rnd.uniform(0, 1, size=amount) < 0.04
+	length_noise = rnd.normal(size=amount)
+	distance_noise = rnd.normal(size=amount)
+	upwards = rnd.uniform(0, 1, size=amount) > 0.5 # this decides, if we go up or down
+	
+	hair_length = np.where(long, p["hair_length"][0]*3, p["hair_length"][0]) + length_noise*p["hair_length"][1]
+	loop_length = np.where(long, p["loop_length_short"][0]*2, p["loop_length_short"][0] + length_noise*p["loop_length_short"][1])
+	flyaway_length = np.where(loop, loop_length, hair_length)
+	
+	# short loops are folded to lie at least the mean distance away
+	distance_mean, distance_std = p["loop_distance_factor_short"]
+	distance = np.where(long, distance_mean*2 + distance_noise*distance_std, distance_mean + np.abs(distance_noise*distance_std))
+	distance = distance/10000.0
+	
+	# add vertices to make sure flyaways are properly connected to the yarn
+	num_vertices = np.maximum(np.round(flyaway_length * fiber_resolution * 1000), 0).astype(np.int64)
+	num_vertices += np.where(loop, 2, 1)
+	
+	# --------------- select vertex strips to generate flyaways from ---------------
+	first, strip_length = sample_strips(offsets, num_vertices+1, rnd)
+	strip_offsets = np.concatenate([[0], np.cumsum(strip_length)])
+	local = np.arange(strip_offsets[-1]) - np.repeat(strip_offsets[:-1], strip_length)
+	m = np.repeat(strip_length, strip_length)
+	source = np.where(np.repeat(upwards, strip_length), local, m-1-local)
+	strip = vertices[np.repeat(first, strip_length) + source].astype(np.float64)
+	#________________________________________________________________
+	
+	last = strip[strip_offsets[1:]-1]
+	dir = np.stack([last[:, 0], last[:, 1], np.zeros(len(last))], axis=1)
+	dir_length = np.linalg.norm(dir, axis=1, keepdims=True)
+	dir = np.divide(dir, dir_length, out=np.zeros_like(dir), where=dir_length > 0)
+	
+	# squeeze a bit to make them more curly
+	ref = np.repeat(strip[strip_offsets[:-1]], strip_length, axis=0)
+	squeeze_factor = np.repeat(np.where(loop, 1, p["hair_squeeze"]), strip_length)
+	squeeze_factorx = np.repeat(np.where(loop, 2, -1), strip_length)
+	strip[:, 2] = ref[:, 2] + (strip[:, 2]-ref[:, 2]) / squeeze_factor
+	strip[:, 0] = ref[:, 0] + (strip[:, 0]-ref[:, 0]) / squeeze_factorx
+	
+	vertex_loop = np.repeat(loop, strip_length)
+	vertex_dir = np.repeat(dir, strip_length, axis=0)
+	
+	# loops: create some sort of arc from all but the first and last vertex
+	inner = vertex_loop & (local > 0) & (local < m-1)
+	arc = np.sin((local-1) * pi / np.maximum(m-2, 1)) * np.repeat(distance, strip_length)
+	strip[inner] += vertex_dir[inner] * arc[inner, None]
+	
+	# open ended flyaways: rotate all but the first vertex by hair_angle around dir
+	hair = ~vertex_loop & (local > 0)
+	center = np.repeat(strip[strip_offsets[:-1]+1], strip_length, axis=0)
+	v = strip[hair] - center[hair]
+	k = vertex_dir[hair]
+	angle = p["hair_angle"]
+	rotated = v*cos(angle) + np.cross(k, v)*sin(angle) + k*np.sum(k*v, axis=1, keepdims=True)*(1-cos(angle))
+	strip[hair] = center[hair] + rotated
+	
+	return strip.astype(np.float32), strip_offsets
@@ -0,0 +1,96 @@
+import json
+import os
+import socket
+import time
+
+# Append-only manifest of an output directory. Every process appends one JSON line per finished or
+# failed sample to its own file manifest/<writer>.jsonl (one file per writer, as O_APPEND is not
+# atomic on network filesystems). Reading all files once gives the state of every sample, so resuming
+# never has to probe the output directory file by file. This module does not depend on bpy.
+
+def manifest_dir(output_dir):
+	return os.path.join(output_dir, "manifest")
+
+
+def writer_name(prefix):
+	# unique per process, also when processes on several hosts share one output directory
+	return "{}_{}_{}".format(prefix, socket.gethostname(), os.getpid())
+
+
+def sample_files(i):
+	return "Yarn_{:04}.json".format(i), "Yarn_{:04}.png".format(i)
+
+
+def make_record(i, status, seed=None, error=None):
+	# status is "done" or "failed", paths are relative to the output directory
+	fn_json, fn_render = sample_files(i)
+	record = {"sample": i, "seed": i if seed is None else seed, "json": fn_json, "render": fn_render, "status": status, "time": time.time()}
+	if error is not None:
+		record["error"] = error
+	return record
+
+
+def append_records(output_dir, writer, records):
+	os.makedirs(manifest_dir(output_dir), exist_ok=True)
+	with open(os.path.join(manifest_dir(output_dir), writer + ".jsonl"), "at") as f:
+		f.write("".join(json.dumps(record) + "\n" for record in records))
+		f.flush()
+
+
+def append_record(output_dir, writer, i, status, seed=None, error=None):
+	append_records(output_dir, writer, [make_record(i, status, seed, error)])
+
+
+def read_manifest(output_dir):
+	# sample index -> latest record, a later "done" overrides an earlier "failed"
+	records = {}
+	if not os.path.isdir(manifest_dir(output_dir)):
+		return records
+	for name in sorted(os.listdir(manifest_dir(output_dir))):
+		if not name.endswith(".jsonl"):
+			continue
+		with open(os.path.join(manifest_dir(output_dir), name), "rt") as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					continue # partially written last line of a killed writer
+				previous = records.get(record["sample"])
+				if previous is None or previous["status"] != "done" or record["status"] == "done":
+					records[record["sample"]] = record
+	return records
+
+
+def index_existing_files(output_dir, writer="existing"):
+	# one-time migration of an output directory generated without a manifest, needs a single listdir
+	names = set(os.listdir(output_dir)) if os.path.isdir(output_dir) else set()
+	records = []
+	for name in sorted(names):
+		if name.startswith("Yarn_") and name.endswith(".json"):
+			i = int(name[len("Yarn_"):-len(".json")])
+			if sample_files(i)[1] in names:
+				records.append(make_record(i, "done"))
+	if records:
+		append_records(output_dir, writer, records)
+	return len(records)
+
+
+def load_manifest(output_dir, writer):
+	records = read_manifest(output_dir)
+	if not records and index_existing_files(output_dir, "existing_" + writer):
+		records = read_manifest(output_dir)
+	return records
+
+
+def summarize(records, start, amount):
+	# done, failed and missing sample indices of the range start..start+amount-1
+	done, failed, missing = [], [], []
+	for i in range(start, start+amount):
+		record = records.get(i)
+		if record is None:
+			missing.append(i)
+		elif record["status"] == "done":
+			done.append(i)
+		else:
+			failed.append(i)
+	return done, failed, missing
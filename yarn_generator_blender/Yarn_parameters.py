@@ -0,0 +1,378 @@
+import numpy as np
+from math import pi
+
+# Yarn parameter sampling, independent of bpy. generate_yarn_parameter_sample draws the parameters of
+# one sample, sample_parameter_table draws the same values for many seeds at once as one column per
+# parameter, and expand_row turns a row of that table back into the create_yarn arguments.
+
+
+def flyaway_mapping(hair_length_mean, hair_angle, amount, loop_prob, loop_length_mean, loop_distance_mean, loop_distance_std, fuzzyness):
+	flyaways = {
+			"loop_prob": loop_prob,
+			"amount": amount,
+			"hair_length": (hair_length_mean, 0.05),
+			"hair_angle": hair_angle,
+			"hair_squeeze": 1 + fuzzyness*1.5,
+			"loop_length_short": (loop_length_mean, 0.01),
+			"loop_distance_factor_short": (loop_distance_mean, loop_distance_std),
+			"enable": True,
+			"mapping_parameters" : { "amount": amount, "loop_prob" : loop_prob, "hair_length_mean": hair_length_mean, "hair_angle": hair_angle, "loop_length_mean": loop_length_mean,"loop_distance_mean": loop_distance_mean, "loop_distance_std": loop_distance_std, "fuzzyness": fuzzyness} 
+		}
+	return flyaways
+
+
+def generate_yarn_parameter_sample(sample_seed):
+	rnd = np.random.RandomState(seed=sample_seed)
+	
+	curve_jitter_z = 0.02
+	
+	#-------------
+	#params
+	
+	curve_jitter_xy = rnd.uniform(0, 0.03)
+	curve_jitter_xy_l2 = rnd.uniform(0, 0.02)
+	migration = rnd.uniform(0, 0.3)
+	fiber_thickness_x = rnd.uniform(0.006, 0.01) 
+	fiber_thickness_y = min(rnd.uniform(fiber_thickness_x, fiber_thickness_x*2.5), 0.02)
+	num_plys = rnd.randint(2, 7)
+	middle_ply = False
+	#cw = [-1, 1]
+	#clockwise = rnd.choice(cw)
+	
+	num_fibers = rnd.randint(40, 200)
+	
+	if num_plys == 2:
+		r_fraction = rnd.uniform(0.67, 0.9)
+	elif num_plys == 3:
+		r_fraction = rnd.uniform(0.72, 0.91)
+	elif num_plys > 3:
+		r_fraction = rnd.uniform(0.85, 0.95)
+	
+	gangwinkel_ply = rnd.uniform(50, 81)*(np.pi/180) # all angles are radians
+	area_frac_ply = rnd.uniform(0.035, 0.215)
+	rx = np.sqrt(num_fibers * fiber_thickness_x * fiber_thickness_y/ area_frac_ply / r_fraction)
+	if num_plys > 4:
+		area_frac_yarn = rnd.uniform(0.65, 0.82)
+	else:
+		area_frac_yarn = rnd.uniform(0.55, 0.82) 
+	ex_2 = rx / np.sin(gangwinkel_ply)
+	ey_2 = r_fraction * ex_2
+	yarn_radius = np.sqrt(num_plys * ex_2 * ey_2 / area_frac_yarn) - ey_2
+	alpha_ply = 2 * np.pi * yarn_radius * np.tan(gangwinkel_ply) #*clockwise
+	gangwinkel = rnd.uniform(50, 81)*(np.pi/180)
+	alpha = -1 * 2 * np.pi * rx * np.tan(gangwinkel)
+
+	#-------------
+
+	l1  = {
+	"name": "l1",
+	"placement_params": {
+		"type": "AREA",
+		"num_points" : num_fibers, 
+		"radius": rx, 
+		"jitter_xy" : curve_jitter_xy
+		},
+	"curve_params" : {
+		"dif_z" : alpha, 
+		"jitter_z" : curve_jitter_z,
+		"migration": migration
+		},
+	"fiber_params" : {
+		"line": {
+			"length": 60.0,
+			"resolution": 4,
+			}
+		},
+	"ellipse": 1
+	}
+	
+	l2  = {
+	"name": "l2",
+	"placement_params": {
+		"type": "CIRCLE",
+		"num_points" : num_plys, 
+		"radius": yarn_radius, 
+		"middle_ply": middle_ply, 
+		"jitter_xy" : curve_jitter_xy_l2
+		},
+	"curve_params" : {
+		"dif_z" : alpha_ply,
+		"jitter_z" : 0,
+		"migration": 0
+		},
+	"fiber_params" : {
+		"yarn" : l1
+		},
+	"ellipse": r_fraction, 
+	}
+	
+	
+	material_type = "direct"	#rnd.choice(["direct", "melanin"])
+	if "direct" == material_type:
+		material_props = {
+			"type": material_type,
+			"roughness": rnd.uniform(0.001, 0.6),#(0.10, 0.25),
+			"radial_roughness": rnd.uniform(0.2, 0.99),#(0.15, 0.40),
+			"ior": rnd.uniform(1.4, 1.62),
+			"color" : (*rnd.uniform(0, 1, size=3), 1),
+			"random_roughness": rnd.uniform(0, 1)
+		}
+	elif "melanin" == material_type:
+		material_props = {
+			"type": material_type,
+			"melanin": rnd.uniform(0.0, 0.7),#(0.0, 0.3),
+			"melanin_redness": rnd.uniform(0, 1),#(0.1, 0.5),
+			"tint": (*rnd.uniform(0, 1, size=3), 1),
+			"roughness": rnd.uniform(0.05, 0.6),#(0.10, 0.25),
+			"radial_roughness": rnd.uniform(0.1, 0.9),#(0.15, 0.40),
+			"ior": rnd.uniform(1.4, 1.62),
+			"random_color" : rnd.uniform(0, 0.75),
+			"random_roughness" : rnd.uniform(0, 0.75),
+		}
+	
+	loop_length_short = abs(l2["curve_params"]["dif_z"])
+	whole_radius = yarn_radius + rx * r_fraction
+	ldm = rnd.uniform(whole_radius*3, whole_radius*20)
+	t = whole_radius*20 - ldm
+	bound = min(5, t)
+	bound_amount = min(num_fibers * num_plys*2, 300)
+	lds = rnd.uniform(0.01, bound)
+	flyaways = flyaway_mapping(
+		hair_length_mean = rnd.uniform(whole_radius*1.5, whole_radius*8),
+		hair_angle = rnd.uniform(0.05, pi/2),
+		amount = rnd.uniform(30, bound_amount), 
+		loop_prob = rnd.uniform(0.35,0.65), 
+		loop_length_mean = rnd.uniform(loop_length_short*0.6, loop_length_short*1.3),
+		loop_distance_mean = ldm,  
+		loop_distance_std = lds,
+		fuzzyness = rnd.uniform(0, 1),
+		)
+	
+	other = {
+		"fiber_thickness_x" : fiber_thickness_x,
+		"fiber_thickness_y" : fiber_thickness_y,
+		"flyaway_thickness_x" : fiber_thickness_x,
+		"flyaway_thickness_y" : fiber_thickness_y,
+		}
+		
+	return l2, material_props, flyaways, other
+
+
+#-------------
+# batched sampling
+
+# np.random.RandomState(seed) is MT19937 seeded with init_genrand, the state of many seeds is
+# computed at once below so that every row gets exactly the values of generate_yarn_parameter_sample
+MT_N = 624
+MT_M = 397
+MT_MATRIX_A = 0x9908b0df
+MT_UPPER_MASK = 0x80000000
+MT_LOWER_MASK = 0x7fffffff
+
+# outputs needed per seed: generate_yarn_parameter_sample uses 52 words for uniform draws plus 2 or
+# more for the rejection sampling in randint
+MT_WORDS = 128
+
+
+def mt19937_words(seeds, num_words=MT_WORDS):
+	# first num_words (at most MT_N-MT_M) outputs of RandomState(seed) per seed, shape (num_words, seeds)
+	assert num_words <= MT_N - MT_M
+	seeds = np.asarray(seeds)
+	
+	# only the part of the initial state read by the first num_words outputs, uint32 arithmetic wraps
+	key = np.empty((MT_M + num_words, len(seeds)), dtype=np.uint32)
+	key[0] = seeds & 0xffffffff
+	tmp = np.empty(len(seeds), dtype=np.uint32)
+	for pos in range(1, len(key)):
+		# key[pos] = 1812433253 * (key[pos-1] ^ (key[pos-1] >> 30)) + pos, without temporaries
+		np.right_shift(key[pos-1], 30, out=tmp)
+		np.bitwise_xor(key[pos-1], tmp, out=tmp)
+		np.multiply(tmp, np.uint32(1812433253), out=tmp)
+		np.add(tmp, np.uint32(pos), out=key[pos])
+	
+	y = (key[:num_words] & MT_UPPER_MASK) | (key[1:num_words+1] & MT_LOWER_MASK)
+	y = key[MT_M:MT_M+num_words] ^ (y >> 1) ^ ((y & 1) * np.uint32(MT_MATRIX_A))
+	
+	# tempering
+	y ^= y >> 11
+	y ^= (y << 7) & 0x9d2c5680
+	y ^= (y << 15) & 0xefc60000
+	y ^= y >> 18
+	return y
+
+
+class BatchRandomState:
+	# the scalar RandomState calls used by generate_yarn_parameter_sample, for many seeds in lockstep
+
+	def __init__(self, seeds):
+		self.words = mt19937_words(seeds)
+		self.pos = np.zeros(self.words.shape[1], dtype=np.int64)
+		self.columns = np.arange(self.words.shape[1])
+
+	def next_uint32(self, selected=None):
+		columns = self.columns if selected is None else self.columns[selected]
+		if np.any(self.pos[columns] >= len(self.words)):
+			raise Exception("BatchRandomState supports at most {} words per seed".format(len(self.words)))
+		words = self.words.ravel()[self.pos[columns] * self.words.shape[1] + columns].astype(np.uint64)
+		self.pos[columns] += 1
+		return words
+
+	def random_sample(self):
+		a = self.next_uint32() >> 5
+		b = self.next_uint32() >> 6
+		return (a * 67108864.0 + b) / 9007199254740992.0
+
+	def uniform(self, low, high):
+		low = np.asarray(low, dtype=np.float64)
+		return low + (high - low) * self.random_sample()
+
+	def randint(self, low, high):
+		# masked rejection sampling, as the legacy RandomState
+		rng = high - low - 1
+		mask = (1 << int(rng).bit_length()) - 1
+		value = self.next_uint32() & mask
+		rejected = value > rng
+		while np.any(rejected):
+			value[rejected] = self.next_uint32(rejected) & mask
+			rejected = value > rng
+		return low + value.astype(np.int64)
+
+
+def sample_parameter_block(seeds):
+	# same draws and arithmetic as generate_yarn_parameter_sample, one array element per seed
+	rnd = BatchRandomState(seeds)
+	t = {"seed": np.asarray(seeds, dtype=np.int64)}
+	
+	curve_jitter_z = 0.02
+	t["curve_jitter_xy"] = rnd.uniform(0, 0.03)
+	t["curve_jitter_xy_l2"] = rnd.uniform(0, 0.02)
+	t["migration"] = rnd.uniform(0, 0.3)
+	fiber_thickness_x = t["fiber_thickness_x"] = rnd.uniform(0.006, 0.01)
+	fiber_thickness_y = t["fiber_thickness_y"] = np.minimum(rnd.uniform(fiber_thickness_x, fiber_thickness_x*2.5), 0.02)
+	num_plys = t["num_plys"] = rnd.randint(2, 7)
+	num_fibers = t["num_fibers"] = rnd.randint(40, 200)
+	
+	r_low = np.select([num_plys == 2, num_plys == 3], [0.67, 0.72], 0.85)
+	r_high = np.select([num_plys == 2, num_plys == 3], [0.9, 0.91], 0.95)
+	r_fraction = t["r_fraction"] = rnd.uniform(r_low, r_high)
+	
+	gangwinkel_ply = t["gangwinkel_ply"] = rnd.uniform(50, 81)*(np.pi/180) # all angles are radians
+	area_frac_ply = t["area_frac_ply"] = rnd.uniform(0.035, 0.215)
+	rx = t["ply_radius"] = np.sqrt(num_fibers * fiber_thickness_x * fiber_thickness_y/ area_frac_ply / r_fraction)
+	area_frac_yarn = t["area_frac_yarn"] = rnd.uniform(np.where(num_plys > 4, 0.65, 0.55), 0.82)
+	ex_2 = rx / np.sin(gangwinkel_ply)
+	ey_2 = r_fraction * ex_2
+	yarn_radius = t["yarn_radius"] = np.sqrt(num_plys * ex_2 * ey_2 / area_frac_yarn) - ey_2
+	t["alpha_ply"] = 2 * np.pi * yarn_radius * np.tan(gangwinkel_ply)
+	gangwinkel = t["gangwinkel"] = rnd.uniform(50, 81)*(np.pi/180)
+	t["alpha"] = -1 * 2 * np.pi * rx * np.tan(gangwinkel)
+	
+	# "direct" material
+	t["roughness"] = rnd.uniform(0.001, 0.6)
+	t["radial_roughness"] = rnd.uniform(0.2, 0.99)
+	t["ior"] = rnd.uniform(1.4, 1.62)
+	t["color_r"] = rnd.uniform(0, 1)
+	t["color_g"] = rnd.uniform(0, 1)
+	t["color_b"] = rnd.uniform(0, 1)
+	t["random_roughness"] = rnd.uniform(0, 1)
+	
+	loop_length_short = np.abs(t["alpha_ply"])
+	whole_radius = yarn_radius + rx * r_fraction
+	ldm = t["loop_distance_mean"] = rnd.uniform(whole_radius*3, whole_radius*20)
+	bound = np.minimum(5, whole_radius*20 - ldm)
+	bound_amount = np.minimum(num_fibers * num_plys*2, 300)
+	t["loop_distance_std"] = rnd.uniform(0.01, bound)
+	t["hair_length_mean"] = rnd.uniform(whole_radius*1.5, whole_radius*8)
+	t["hair_angle"] = rnd.uniform(0.05, pi/2)
+	t["amount"] = rnd.uniform(30, bound_amount)
+	t["loop_prob"] = rnd.uniform(0.35, 0.65)
+	t["loop_length_mean"] = rnd.uniform(loop_length_short*0.6, loop_length_short*1.3)
+	t["fuzzyness"] = rnd.uniform(0, 1)
+	
+	t["curve_jitter_z"] = np.full(len(t["seed"]), curve_jitter_z)
+	return t
+
+
+def sample_parameter_table(seeds, block_size=16384):
+	# column per parameter for all seeds, with the exact values of generate_yarn_parameter_sample(seed)
+	seeds = np.asarray(seeds, dtype=np.int64)
+	blocks = [sample_parameter_block(seeds[i:i+block_size]) for i in range(0, len(seeds), block_size)]
+	if not blocks:
+		blocks = [sample_parameter_block(seeds)]
+	return {key: np.concatenate([b[key] for b in blocks]) for key in blocks[0]}
+
+
+def expand_row(table, k):
+	# (l2, material, flyaways, other) of row k, as generate_yarn_parameter_sample(table["seed"][k]) returns it
+	v = {key: column[k].item() for key, column in table.items()}
+	
+	l1  = {
+	"name": "l1",
+	"placement_params": {
+		"type": "AREA",
+		"num_points" : v["num_fibers"], 
+		"radius": v["ply_radius"], 
+		"jitter_xy" : v["curve_jitter_xy"]
+		},
+	"curve_params" : {
+		"dif_z" : v["alpha"], 
+		"jitter_z" : v["curve_jitter_z"],
+		"migration": v["migration"]
+		},
+	"fiber_params" : {
+		"line": {
+			"length": 60.0,
+			"resolution": 4,
+			}
+		},
+	"ellipse": 1
+	}
+	
+	l2  = {
+	"name": "l2",
+	"placement_params": {
+		"type": "CIRCLE",
+		"num_points" : v["num_plys"], 
+		"radius": v["yarn_radius"], 
+		"middle_ply": False, 
+		"jitter_xy" : v["curve_jitter_xy_l2"]
+		},
+	"curve_params" : {
+		"dif_z" : v["alpha_ply"],
+		"jitter_z" : 0,
+		"migration": 0
+		},
+	"fiber_params" : {
+		"yarn" : l1
+		},
+	"ellipse": v["r_fraction"], 
+	}
+	
+	material_props = {
+		"type": "direct",
+		"roughness": v["roughness"],
+		"radial_roughness": v["radial_roughness"],
+		"ior": v["ior"],
+		"color" : (v["color_r"], v["color_g"], v["color_b"], 1),
+		"random_roughness": v["random_roughness"]
+	}
+	
+	flyaways = flyaway_mapping(
+		hair_length_mean = v["hair_length_mean"],
+		hair_angle = v["hair_angle"],
+		amount = v["amount"], 
+		loop_prob = v["loop_prob"], 
+		loop_length_mean = v["loop_length_mean"],
+		loop_distance_mean = v["loop_distance_mean"],  
+		loop_distance_std = v["loop_distance_std"],
+		fuzzyness = v["fuzzyness"],
+		)
+	
+	other = {
+		"fiber_thickness_x" : v["fiber_thickness_x"],
+		"fiber_thickness_y" : v["fiber_thickness_y"],
+		"flyaway_thickness_x" : v["fiber_thickness_x"],
+		"flyaway_thickness_y" : v["fiber_thickness_y"],
+		}
+		
+	return l2, material_props, flyaways, other
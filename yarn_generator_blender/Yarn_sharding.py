@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Sharded dataset generation: several headless Blender processes render into one output directory.
+# The sample range is split into chunks and a worker claims a chunk by atomically creating its claim
+# file (O_CREAT | O_EXCL), so no two workers ever render the same sample. A finished chunk gets a
+# done file with its render statistics, which the supervisor uses to report the throughput.
+#
+# This module does not depend on bpy. Run it with plain python to start the workers:
+#   python Yarn_sharding.py --output-dir Generated --amount 100000 --workers 16 --threads 4
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def claim_dir(output_dir):
+	return os.path.join(output_dir, "claims")
+
+def claim_file(output_dir, first):
+	return os.path.join(claim_dir(output_dir), "chunk_{:08}.claim".format(first))
+
+def done_file(output_dir, first):
+	return os.path.join(claim_dir(output_dir), "chunk_{:08}.done".format(first))
+
+
+def chunk_starts(start, amount, chunk_size, worker=0, num_workers=1):
+	# first sample of every chunk, rotated so that every worker begins at its own part of the range
+	firsts = list(range(start, start+amount, chunk_size))
+	offset = (len(firsts) * worker) // max(num_workers, 1)
+	return firsts[offset:] + firsts[:offset]
+
+
+def claim_chunk(output_dir, first, worker=0):
+	# returns True if this process now owns the chunk, False if another worker claimed it before
+	os.makedirs(claim_dir(output_dir), exist_ok=True)
+	try:
+		fd = os.open(claim_file(output_dir, first), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+	except FileExistsError:
+		return False
+	with os.fdopen(fd, "wt") as f:
+		json.dump({"worker": worker, "host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}, f)
+	return True
+
+
+def finish_chunk(output_dir, first, rendered, seconds, worker=0):
+	# written to a temporary file first, so readers never see a partial done file
+	tmp = done_file(output_dir, first) + ".tmp{}".format(os.getpid())
+	with open(tmp, "wt") as f:
+		json.dump({"first": first, "rendered": rendered, "seconds": seconds, "worker": worker}, f)
+	os.replace(tmp, done_file(output_dir, first))
+
+
+def release_claim(output_dir, first):
+	# gives an unfinished chunk back, the next worker reaching it renders its missing samples
+	try:
+		os.remove(claim_file(output_dir, first))
+	except FileNotFoundError:
+		pass
+
+
+def render_chunks(output_dir, start, amount, chunk_size, render, is_done, worker=0, num_workers=1):
+	# claims chunks and renders their samples with render(i), which returns False for a failed sample;
+	# a chunk with failed samples is released instead of finished, so its failures are retried
+	for first in chunk_starts(start, amount, chunk_size, worker, num_workers):
+		if not claim_chunk(output_dir, first, worker):
+			continue
+		time_start = time.time()
+		rendered = 0
+		failed = 0
+		for i in range(first, min(first+chunk_size, start+amount)):
+			# chunks of a killed worker are claimed again, keep what it finished
+			if is_done(i):
+				continue
+			if render(i):
+				rendered += 1
+			else:
+				failed += 1
+			touch_claim(output_dir, first)
+		if failed:
+			print("chunk {}: {} samples failed, released for a retry".format(first, failed))
+			release_claim(output_dir, first)
+		else:
+			finish_chunk(output_dir, first, rendered, time.time() - time_start, worker)
+
+
+def touch_claim(output_dir, first):
+	# heartbeat of the worker owning the chunk, see claim_is_stale
+	os.utime(claim_file(output_dir, first))
+
+
+def pid_alive(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	return True
+
+
+def claim_is_stale(output_dir, first, timeout):
+	# a claim of this host is stale once its worker process is gone, processes of other hosts (and
+	# on Windows, where os.kill can not probe) can not be checked, so their claims expire when the
+	# worker has not touched them for timeout seconds
+	try:
+		with open(claim_file(output_dir, first), "rt") as f:
+			claim = json.load(f)
+	except ValueError:
+		claim = {} # partially written claim
+	if os.name != "nt" and claim.get("host") == socket.gethostname() and "pid" in claim:
+		return not pid_alive(claim["pid"])
+	return time.time() - os.path.getmtime(claim_file(output_dir, first)) > timeout
+
+
+def release_stale_claims(output_dir, timeout=3600):
+	# remove the claims of unfinished chunks whose worker is gone (e.g. killed in an earlier run),
+	# the claims of running workers, also of other supervisors on output_dir, are kept
+	if not os.path.isdir(claim_dir(output_dir)):
+		return 0
+	released = 0
+	for name in os.listdir(claim_dir(output_dir)):
+		if not name.endswith(".claim"):
+			continue
+		first = int(name[len("chunk_"):-len(".claim")])
+		if os.path.isfile(done_file(output_dir, first)):
+			continue
+		try:
+			if claim_is_stale(output_dir, first, timeout):
+				os.remove(claim_file(output_dir, first))
+				released += 1
+		except FileNotFoundError:
+			continue # released or finished by another supervisor in the meantime
+	return released
+
+
+def read_done_chunks(output_dir):
+	done = {}
+	if not os.path.isdir(claim_dir(output_dir)):
+		return done
+	for name in os.listdir(claim_dir(output_dir)):
+		if name.endswith(".done"):
+			with open(os.path.join(claim_dir(output_dir), name), "rt") as f:
+				d = json.load(f)
+			done[d["first"]] = d
+	return done
+
+
+def worker_command(args, worker):
+	# blender -b scene.blend -t THREADS --python Yarn_sampling.py -- <worker arguments>
+	return [
+		args.blender, "-b", args.blend_file,
+		"-t", str(args.threads),
+		"--python", os.path.join(script_dir, "Yarn_sampling.py"),
+		"--",
+		"--scene", args.scene,
+		"--output-dir", args.output_dir,
+		"--amount", str(args.amount),
+		"--start", str(args.start),
+		"--chunk-size", str(args.chunk_size),
+		"--worker", str(worker),
+		"--num-workers", str(args.workers),
+	]
+
+
+def report(output_dir, done_before, time_start, total_chunks):
+	done = read_done_chunks(output_dir)
+	new = [d for first, d in done.items() if first not in done_before]
+	rendered = sum(d["rendered"] for d in new)
+	render_seconds = sum(d["seconds"] for d in new)
+	elapsed = time.time() - time_start
+	print("{}/{} chunks done, {} samples rendered in {:.0f} s: {:.2f} samples/min aggregate, {:.1f} s/sample per worker".format(
+		len(done), total_chunks, rendered, elapsed,
+		60.0 * rendered / max(elapsed, 1e-9),
+		render_seconds / max(rendered, 1)))
+	sys.stdout.flush()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Render a yarn dataset with several headless Blender workers.")
+	parser.add_argument("--blender", default="blender", help="blender executable")
+	parser.add_argument("--blend-file", default=os.path.join(script_dir, "YarnGenerator_LabScene.blend"))
+	parser.add_argument("--scene", default="lab_01")
+	parser.add_argument("--output-dir", required=True, help="output directory, relative paths are relative to the blend file")
+	parser.add_argument("--amount", type=int, default=100)
+	parser.add_argument("--start", type=int, default=0)
+	parser.add_argument("--chunk-size", type=int, default=10, help="samples per claim")
+	parser.add_argument("--threads", type=int, default=4, help="render threads per worker")
+	parser.add_argument("--workers", type=int, default=None, help="default: cpu count / threads")
+	parser.add_argument("--interval", type=float, default=30, help="seconds between throughput reports")
+	parser.add_argument("--stale-timeout", type=float, default=3600, help="seconds after which an untouched claim of another host is released")
+	args = parser.parse_args()
+
+	if args.workers is None:
+		args.workers = max(1, (os.cpu_count() or 1) // args.threads)
+	output_dir = os.path.join(os.path.dirname(os.path.abspath(args.blend_file)), args.output_dir)
+	os.makedirs(os.path.join(output_dir, "logs"), exist_ok=True)
+
+	released = release_stale_claims(output_dir, args.stale_timeout)
+	if released:
+		print("released {} unfinished claims".format(released))
+	done_before = read_done_chunks(output_dir)
+	total_chunks = len(chunk_starts(args.start, args.amount, args.chunk_size))
+
+	time_start = time.time()
+	processes = []
+	for worker in range(args.workers):
+		log = open(os.path.join(output_dir, "logs", "worker_{:03}.log".format(worker)), "at")
+		processes.append((subprocess.Popen(worker_command(args, worker), stdout=log, stderr=subprocess.STDOUT), log))
+	print("started {} workers with {} threads each".format(args.workers, args.threads))
+
+	while any(p.poll() is None for p, _ in processes):
+		time.sleep(args.interval)
+		report(output_dir, done_before, time_start, total_chunks)
+
+	for worker, (p, log) in enumerate(processes):
+		log.close()
+		if p.returncode != 0:
+			print("worker {} exited with code {}".format(worker, p.returncode))
+	report(output_dir, done_before, time_start, total_chunks)
+	unfinished = total_chunks - len(read_done_chunks(output_dir))
+	if unfinished:
+		print("{} chunks have failed samples, run again to retry them".format(unfinished))
+	else:
+		print("all done")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+	import resource
+except ImportError: # not available on Windows
+	resource = None
+
+# Per-sample telemetry of the generator: wall time of every stage, geometry counts and memory use.
+# rss_mb is the resident memory after the sample, rss_delta_mb its growth during the sample and
+# worker_peak_rss_mb the peak of the whole worker process so far (it never decreases).
+# Each process appends one JSON line per sample to <output_dir>/telemetry/<writer>.jsonl.
+# Run this module with plain python to aggregate the logs of an output directory:
+#   python Yarn_telemetry.py Generated_flyawaymodel
+
+def telemetry_dir(output_dir):
+	return os.path.join(output_dir, "telemetry")
+
+
+def current_rss_mb():
+	# resident set size right now, only available on Linux
+	try:
+		with open("/proc/self/statm", "rt") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+	except (OSError, ValueError, AttributeError):
+		return None
+
+
+def peak_rss_mb():
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes on Linux, bytes on macOS
+	return peak / (1024.0 * 1024.0) if os.uname().sysname == "Darwin" else peak / 1024.0
+
+
+class SampleTelemetry:
+	# collects the record of one sample, stages that run several times are summed up
+
+	def __init__(self, sample=None):
+		self.record = {"sample": sample, "stages": {}, "counts": {}}
+		self.rss_start = current_rss_mb()
+
+	@contextmanager
+	def stage(self, name):
+		time_start = time.perf_counter()
+		try:
+			yield
+		finally:
+			elapsed = time.perf_counter() - time_start
+			self.record["stages"][name] = self.record["stages"].get(name, 0.0) + elapsed
+
+	def count(self, name, value):
+		self.record["counts"][name] = value
+
+	def write(self, output_dir, writer):
+		os.makedirs(telemetry_dir(output_dir), exist_ok=True)
+		self.record["time"] = time.time()
+		self.record["rss_mb"] = current_rss_mb()
+		if self.record["rss_mb"] is not None and self.rss_start is not None:
+			self.record["rss_delta_mb"] = self.record["rss_mb"] - self.rss_start
+		self.record["worker_peak_rss_mb"] = peak_rss_mb()
+		with open(os.path.join(telemetry_dir(output_dir), writer + ".jsonl"), "at") as f:
+			f.write(json.dumps(self.record) + "\n")
+
+
+def read_telemetry(output_dir):
+	records = []
+	if not os.path.isdir(telemetry_dir(output_dir)):
+		return records
+	for name in sorted(os.listdir(telemetry_dir(output_dir))):
+		if not name.endswith(".jsonl"):
+			continue
+		with open(os.path.join(telemetry_dir(output_dir), name), "rt") as f:
+			for line in f:
+				try:
+					records.append(json.loads(line))
+				except ValueError:
+					continue # partially written last line of a killed writer
+	return records
+
+
+def summarize(records, percentiles=(50, 90, 99)):
+	# stage (or count) name -> {"n", "mean", "total", "p50", ...}, "total" is the sum of all stages of a sample,
+	# the worker peak only grows within a worker, so only its maximum is reported
+	columns = {}
+	worker_peaks = []
+	for record in records:
+		for name, value in record["stages"].items():
+			columns.setdefault(name, []).append(value)
+		columns.setdefault("total", []).append(sum(record["stages"].values()))
+		for name, value in record["counts"].items():
+			columns.setdefault("count:" + name, []).append(value)
+		for name in ("rss_mb", "rss_delta_mb"):
+			if record.get(name) is not None:
+				columns.setdefault(name, []).append(record[name])
+		# peak_rss_mb in logs written before rss_mb was added
+		peak = record.get("worker_peak_rss_mb", record.get("peak_rss_mb"))
+		if peak is not None:
+			worker_peaks.append(peak)
+
+	summary = {}
+	for name, values in columns.items():
+		values = np.asarray(values, dtype=np.float64)
+		summary[name] = {"n": len(values), "mean": float(values.mean()), "total": float(values.sum())}
+		for p in percentiles:
+			summary[name]["p{}".format(p)] = float(np.percentile(values, p))
+	if worker_peaks:
+		summary["worker_peak_rss_mb"] = {"n": len(worker_peaks), "max": float(max(worker_peaks))}
+	return summary
+
+
+def print_summary(summary, percentiles=(50, 90, 99)):
+	total = summary.get("total", {}).get("total", 0.0)
+	memory = ("rss_mb", "rss_delta_mb")
+	header = "{:<28} {:>7} {:>10}".format("stage", "n", "mean") + "".join(" {:>10}".format("p{}".format(p)) for p in percentiles) + " {:>7}".format("share")
+	print(header)
+	print("-" * len(header))
+	for name in sorted((n for n in summary if n != "worker_peak_rss_mb"), key=lambda n: (n.startswith("count:") or n in memory, -summary[n]["total"])):
+		s = summary[name]
+		share = "" if name == "total" or name.startswith("count:") or name in memory else "{:6.1f}%".format(100.0 * s["total"] / max(total, 1e-12))
+		print("{:<28} {:>7} {:>10.3f}".format(name, s["n"], s["mean"]) + "".join(" {:>10.3f}".format(s["p{}".format(p)]) for p in percentiles) + " {:>7}".format(share))
+	if "worker_peak_rss_mb" in summary:
+		print("worker peak RSS: {:.1f} MB".format(summary["worker_peak_rss_mb"]["max"]))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Aggregate the generator telemetry of an output directory.")
+	parser.add_argument("output_dir")
+	parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+	args = parser.parse_args()
+
+	records = read_telemetry(args.output_dir)
+	if not records:
+		print("no telemetry in", telemetry_dir(args.output_dir))
+		return
+	summary = summarize(records)
+	if args.json:
+		print(json.dumps(summary, indent="\t"))
+	else:
+		print_summary(summary)
+
+
+if __name__ == "__main__":
+	main()
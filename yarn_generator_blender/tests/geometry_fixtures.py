@@ -0,0 +1,24 @@
+import os
+
+# Shared by the tests and by record_build_operators.py, which runs inside Blender
+
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "build_operators.npz")
+SEED = 7
+
+
+def small_description(num_plys=3, num_fibers=12, length=0.01, middle_ply=False):
+	# two-level yarn in the units create_yarn passes to build (after adjust_level_units), small enough for a quick test
+	l1 = {
+	"name": "l1",
+	"placement_params": {"type": "AREA", "num_points": num_fibers, "radius": 0.00035, "jitter_xy": 0.00002},
+	"curve_params": {"dif_z": -0.005, "jitter_z": 0.02, "migration": 0.15},
+	"fiber_params": {"line": {"length": length, "resolution": 4}},
+	"ellipse": 1
+	}
+	return {
+	"name": "l2",
+	"placement_params": {"type": "CIRCLE", "num_points": num_plys, "radius": 0.0005, "middle_ply": middle_ply, "jitter_xy": 0.00001},
+	"curve_params": {"dif_z": 0.0065, "jitter_z": 0, "migration": 0},
+	"fiber_params": {"yarn": l1},
+	"ellipse": 0.85
+	}
@@ -0,0 +1,41 @@
+import bpy
+import os
+import sys
+import json
+import numpy as np
+from mathutils import Vector
+
+# Records the fibers of the bpy.ops implementation (Yarn_Generator.build_operators) for test_geometry.py:
+#   blender -b ../YarnGenerator_LabScene.blend --python record_build_operators.py
+# needs the "Add Curve Extra Objects" add-on, like the generator itself
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+for d in (tests_dir, os.path.dirname(tests_dir)):
+	if d not in sys.path:
+		sys.path.append(d)
+
+import Yarn_Generator
+import Yarn_Geometry
+from geometry_fixtures import FIXTURE_FILE, SEED, small_description
+
+
+def count_arch_points():
+	# bezier points of one spiral as created by create_spiral
+	obj = Yarn_Generator.create_spiral(np.random.default_rng(0), location=Vector([0.0005, 0, 0]), dif_z=0.0065)
+	n = len(obj.data.splines[0].bezier_points)
+	bpy.ops.object.select_all(action='DESELECT')
+	obj.select_set(True)
+	bpy.ops.object.delete()
+	return n
+
+
+if __name__ == "__main__":
+	Yarn_Generator.clear_collection()
+	params = small_description()
+	arch_points = count_arch_points()
+	yarn = Yarn_Generator.build_operators(json.loads(json.dumps(params)), Yarn_Geometry.rng_streams(SEED))
+	vertices, offsets = Yarn_Generator.mesh_strand_index(yarn.data)
+
+	os.makedirs(os.path.dirname(FIXTURE_FILE), exist_ok=True)
+	np.savez(FIXTURE_FILE, params=json.dumps(params), seed=SEED, vertices=vertices, offsets=offsets, arch_points=arch_points, blender=bpy.app.version_string)
+	print("wrote {} strands to {}".format(len(offsets)-1, FIXTURE_FILE))
@@ -0,0 +1,58 @@
+import numpy as np
+
+import Yarn_Geometry
+from Yarn_parameters import flyaway_mapping
+from geometry_fixtures import SEED, small_description
+
+
+def flyaway_params(amount=2000, loop_prob=0.3):
+	# flyaway description with the lengths in the units of adjust_units
+	p = flyaway_mapping(hair_length_mean=1.5, hair_angle=0.4, amount=amount, loop_prob=loop_prob, loop_length_mean=2.0, loop_distance_mean=3.0, loop_distance_std=1.0, fuzzyness=0.5)
+	p["hair_length"] = [x*1e-3 for x in p["hair_length"]]
+	p["loop_length_short"] = [x*1e-3 for x in p["loop_length_short"]]
+	return p
+
+
+def yarn_strands():
+	return Yarn_Geometry.strand_index(Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(SEED)))
+
+
+def test_strand_index_and_edges():
+	vertices, offsets = yarn_strands()
+	assert vertices.shape == (36*40, 3)
+	np.testing.assert_array_equal(offsets, np.arange(37) * 40)
+
+	np.testing.assert_array_equal(Yarn_Geometry.strand_edges(np.array([0, 3, 5])), [[0, 1], [1, 2], [3, 4]])
+	# an empty strand adds no edge
+	np.testing.assert_array_equal(Yarn_Geometry.strand_edges(np.array([0, 0, 2])), [[0, 1]])
+	assert len(Yarn_Geometry.strand_edges(offsets)) == len(vertices) - 36
+
+
+def test_strips_stay_inside_one_strand():
+	offsets = np.array([0, 5, 7, 20])
+	strip_length = np.array([3, 6, 13, 20, 1] * 40)
+	first, length = Yarn_Geometry.sample_strips(offsets, strip_length, np.random.default_rng(SEED))
+	# windows longer than every strand are cut to the longest strand
+	np.testing.assert_array_equal(length, np.minimum(strip_length, 13))
+	strand = np.searchsorted(offsets, first, side="right") - 1
+	assert np.all(first + length <= offsets[strand+1])
+
+
+def test_gen_flyaways():
+	vertices, offsets = yarn_strands()
+	p = flyaway_params()
+	flyaway_vertices, flyaway_offsets = Yarn_Geometry.gen_flyaways(vertices, offsets, p, 4, 0.01, np.random.default_rng(SEED))
+
+	# every requested flyaway is created, as one strand of flyaway_offsets
+	assert len(flyaway_offsets)-1 == int(p["amount"] * 0.01)
+	assert flyaway_offsets[0] == 0 and flyaway_offsets[-1] == len(flyaway_vertices)
+	assert np.all(np.diff(flyaway_offsets) >= 2)
+	assert flyaway_vertices.dtype == np.float32 and np.all(np.isfinite(flyaway_vertices))
+
+	# the first vertex of every flyaway stays on the yarn
+	roots = flyaway_vertices[flyaway_offsets[:-1]]
+	assert np.all(np.min(np.abs(roots[:, None] - vertices[None]).max(axis=-1), axis=1) < 1e-7)
+
+	again = Yarn_Geometry.gen_flyaways(vertices, offsets, p, 4, 0.01, np.random.default_rng(SEED))
+	np.testing.assert_array_equal(flyaway_vertices, again[0])
+	np.testing.assert_array_equal(flyaway_offsets, again[1])
@@ -0,0 +1,78 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+import Yarn_Geometry
+from geometry_fixtures import FIXTURE_FILE, SEED, small_description
+
+
+def test_polyline_shapes():
+	polylines = Yarn_Geometry.build_polylines(small_description(num_plys=3, num_fibers=12, length=0.01), Yarn_Geometry.rng_streams(SEED))
+	# plies x fibers strands of resolution * length / 1 mm nodes
+	assert polylines.shape == (3*12, 40, 3)
+	assert polylines.dtype == np.float32
+	assert np.all(np.isfinite(polylines))
+
+	polylines = Yarn_Geometry.build_polylines(small_description(num_plys=3, num_fibers=12, middle_ply=True), Yarn_Geometry.rng_streams(SEED))
+	assert polylines.shape == (4*12, 40, 3)
+
+
+def test_arch_point_count():
+	# the ARCH spiral of create_spiral (48 turns, 16 steps) accumulates phi in floating point and ends one short of 48*16+2
+	assert Yarn_Geometry.spiral_num_vertices() == 769
+	starts = np.array([[0.0005, 0.0], [0.0, 0.0005]])
+	curves = Yarn_Geometry.sample_spiral_params(starts, dif_z=0.0065, jitter_z=0.02, rnd=np.random.default_rng(0))
+	assert curves["jitter"].shape == (2, 769)
+
+
+def test_deterministic_for_a_fixed_seed():
+	a = Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(SEED))
+	b = Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(SEED))
+	np.testing.assert_array_equal(a, b)
+
+	seed = np.random.SeedSequence(SEED)
+	c = Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(seed))
+	d = Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(seed))
+	np.testing.assert_array_equal(c, d)
+
+	e = Yarn_Geometry.build_polylines(small_description(), Yarn_Geometry.rng_streams(SEED+1))
+	assert not np.array_equal(a, e)
+
+
+def test_fiber_follows_its_spiral():
+	# a line on the axis deformed along one spiral without jitter lies on the helix and keeps its length
+	radius, length = 0.0005, 0.01
+	params = {
+	"placement_params": {"type": "CIRCLE", "num_points": 1, "radius": radius, "middle_ply": False, "jitter_xy": 0},
+	"curve_params": {"dif_z": 0.0065, "jitter_z": 0, "migration": 0},
+	"fiber_params": {"line": {"length": length, "resolution": 4}},
+	"ellipse": 1
+	}
+	fiber = Yarn_Geometry.build_polylines(params, Yarn_Geometry.rng_streams(SEED))[0].astype(np.float64)
+	np.testing.assert_allclose(np.hypot(fiber[:, 0], fiber[:, 1]), radius, rtol=1e-5)
+	arc_length = np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(fiber, axis=0), axis=1))])
+	template = Yarn_Geometry.line_template(length, 4)[0, :, 2]
+	np.testing.assert_allclose(arc_length, template, atol=length*1e-3)
+
+
+@pytest.mark.skipif(not os.path.isfile(FIXTURE_FILE), reason="record the fixture with: blender -b ../YarnGenerator_LabScene.blend --python record_build_operators.py")
+def test_matches_build_operators():
+	fixture = np.load(FIXTURE_FILE)
+	assert Yarn_Geometry.spiral_num_vertices() == int(fixture["arch_points"])
+
+	params = json.loads(str(fixture["params"]))
+	polylines = Yarn_Geometry.build_polylines(params, Yarn_Geometry.rng_streams(int(fixture["seed"])))
+	offsets = fixture["offsets"]
+	assert len(offsets)-1 == len(polylines)
+	assert np.all(np.diff(offsets) == polylines.shape[1])
+	expected = fixture["vertices"].reshape(polylines.shape)
+
+	# bpy.ops.object.join does not keep the order of the plies, so every recorded strand is matched
+	# to its closest strand; the tolerance covers the linear interpolation between the bezier points
+	distance = np.sqrt(((expected[:, None] - polylines[None])**2).sum(axis=-1)).max(axis=-1)
+	match = distance.argmin(axis=1)
+	assert len(np.unique(match)) == len(match)
+	atol = 0.02 * params["placement_params"]["radius"]
+	assert distance[np.arange(len(match)), match].max() < atol
@@ -0,0 +1,21 @@
+import numpy as np
+
+import Yarn_parameters
+
+
+SEEDS = np.concatenate([np.arange(5000), [2**31, 2**32-1]])
+
+
+def test_mt19937_words_match_random_state():
+	words = Yarn_parameters.mt19937_words(SEEDS[[0, 1, 4999, -2, -1]])
+	for column, seed in enumerate(SEEDS[[0, 1, 4999, -2, -1]]):
+		# a full range uint32 randint returns the raw outputs of the generator
+		expected = np.random.RandomState(seed).randint(0, 2**32, size=Yarn_parameters.MT_WORDS, dtype=np.uint32)
+		np.testing.assert_array_equal(words[:, column], expected)
+
+
+def test_table_rows_equal_the_per_seed_samples():
+	table = Yarn_parameters.sample_parameter_table(SEEDS, block_size=1024)
+	assert len(table["seed"]) == len(SEEDS)
+	for k, seed in enumerate(SEEDS):
+		assert Yarn_parameters.expand_row(table, k) == Yarn_parameters.generate_yarn_parameter_sample(seed), "seed {}".format(seed)
@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import socket
+import subprocess
+import sys
+
+import Yarn_sharding
+
+
+def write_claim(output_dir, first, host, pid, age=0):
+	os.makedirs(Yarn_sharding.claim_dir(output_dir), exist_ok=True)
+	fn = Yarn_sharding.claim_file(output_dir, first)
+	with open(fn, "wt") as f:
+		json.dump({"worker": 0, "host": host, "pid": pid, "time": time.time()}, f)
+	os.utime(fn, (time.time() - age, time.time() - age))
+
+
+def finished_pid():
+	p = subprocess.Popen([sys.executable, "-c", "pass"])
+	p.wait()
+	return p.pid
+
+
+def test_only_stale_claims_are_released(tmp_path):
+	output_dir = str(tmp_path)
+	host = socket.gethostname()
+	write_claim(output_dir, 0, host, os.getpid()) # running worker of this host
+	write_claim(output_dir, 10, host, finished_pid()) # killed worker of this host
+	write_claim(output_dir, 20, "other-host", 1, age=10) # recently touched by another host
+	write_claim(output_dir, 30, "other-host", 1, age=7200) # abandoned by another host
+	write_claim(output_dir, 40, host, finished_pid())
+	Yarn_sharding.finish_chunk(output_dir, 40, 10, 1.0) # finished chunks keep their claim
+
+	assert Yarn_sharding.release_stale_claims(output_dir, timeout=3600) == 2
+	remaining = sorted(name for name in os.listdir(Yarn_sharding.claim_dir(output_dir)) if name.endswith(".claim"))
+	assert remaining == ["chunk_00000000.claim", "chunk_00000020.claim", "chunk_00000040.claim"]
+
+	# a second supervisor starting on the same directory keeps the claims of the running workers
+	assert Yarn_sharding.release_stale_claims(output_dir, timeout=3600) == 0
+	assert not Yarn_sharding.claim_chunk(output_dir, 0)
+
+
+def test_chunks_with_failed_samples_are_retried(tmp_path):
+	output_dir = str(tmp_path)
+	done = set()
+	attempts = []
+
+	def render(i):
+		attempts.append(i)
+		if i == 3 and attempts.count(3) == 1: # fails on the first attempt only
+			return False
+		done.add(i)
+		return True
+
+	Yarn_sharding.render_chunks(output_dir, 0, 10, 5, render, lambda i: i in done)
+	assert attempts == list(range(10))
+	assert sorted(Yarn_sharding.read_done_chunks(output_dir)) == [5]
+	assert not os.path.exists(Yarn_sharding.claim_file(output_dir, 0))
+
+	# the next run only renders the failed sample and finishes its chunk
+	Yarn_sharding.render_chunks(output_dir, 0, 10, 5, render, lambda i: i in done)
+	assert attempts == list(range(10)) + [3]
+	chunks = Yarn_sharding.read_done_chunks(output_dir)
+	assert sorted(chunks) == [0, 5] and chunks[0]["rendered"] == 1
+	assert done == set(range(10))
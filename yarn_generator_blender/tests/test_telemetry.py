@@ -0,0 +1,42 @@
+import json
+
+import Yarn_telemetry
+
+
+def test_memory_fields(tmp_path, monkeypatch):
+	# resident memory at the start and at the end of each sample
+	rss = iter([100.0, 150.0, 150.0, 160.0, 160.0, 140.0])
+	monkeypatch.setattr(Yarn_telemetry, "current_rss_mb", lambda: next(rss))
+	output_dir = str(tmp_path)
+	for sample in range(3):
+		telemetry = Yarn_telemetry.SampleTelemetry(sample)
+		with telemetry.stage("build"):
+			pass
+		telemetry.write(output_dir, "worker")
+
+	records = Yarn_telemetry.read_telemetry(output_dir)
+	assert [record["rss_mb"] for record in records] == [150.0, 160.0, 140.0]
+	assert [record["rss_delta_mb"] for record in records] == [50.0, 10.0, -20.0]
+	# the process peak never decreases within a worker
+	peaks = [record["worker_peak_rss_mb"] for record in records]
+	assert peaks == sorted(peaks)
+
+	summary = Yarn_telemetry.summarize(records)
+	assert summary["rss_delta_mb"]["n"] == 3 and summary["rss_delta_mb"]["p50"] == 10.0
+	assert summary["worker_peak_rss_mb"] == {"n": 3, "max": max(peaks)}
+	assert "peak_rss_mb" not in summary
+	Yarn_telemetry.print_summary(summary)
+
+
+def test_current_rss():
+	rss = Yarn_telemetry.current_rss_mb()
+	if rss is not None: # Linux only
+		assert 0 < rss
+
+
+def test_logs_with_the_old_peak_field(tmp_path):
+	(tmp_path / "telemetry").mkdir()
+	record = {"sample": 0, "stages": {"build": 1.0}, "counts": {}, "peak_rss_mb": 100.0}
+	(tmp_path / "telemetry" / "old.jsonl").write_text(json.dumps(record) + "\n")
+	summary = Yarn_telemetry.summarize(Yarn_telemetry.read_telemetry(str(tmp_path)))
+	assert summary["worker_peak_rss_mb"]["max"] == 100.0